@@ -0,0 +1,47 @@
+import json
+import re
+from typing import Any, Dict, List, Union
+
+__all__ = [
+            "sanitize_escapes",
+            "decode_acjson"
+]
+
+# A valid JSON escape is kept, any other backslash (e.g. Baidu's \' or \&) is dropped
+_ESCAPE = re.compile(r'\\(["\\/bfnrt]|u[0-9a-fA-F]{4})?')
+# Damage the escape pass cannot repair is removed one character at a time, but only this often
+MAX_REPAIRS = 100
+
+
+def _keep_valid_escape(match: "re.Match") -> str:
+    return match.group(0) if match.group(1) else ""
+
+
+def sanitize_escapes(text: str) -> str:
+    """Remove the backslash of every invalid escape sequence in one left-to-right pass."""
+    if "\\" not in text:
+        return text
+    return _ESCAPE.sub(_keep_valid_escape, text)
+
+
+def decode_acjson(body: Union[bytes, str]) -> List[Dict[str, Any]]:
+    """
+    Return the ``data`` list of a Baidu image search (acjson) response.
+
+    Baidu returns invalid escapes and raw control characters inside strings. Control
+    characters are accepted by a non-strict decode, and invalid escapes are stripped by
+    one regex pass over the body, so a damaged page costs two parses instead of one
+    parse per bad character.
+    """
+    text = body.decode("utf-8", "replace") if isinstance(body, bytes) else body
+    try:
+        return json.loads(text, strict=False)["data"]
+    except json.JSONDecodeError:
+        text = sanitize_escapes(text)
+    for _ in range(MAX_REPAIRS):
+        try:
+            return json.loads(text, strict=False)["data"]
+        except json.JSONDecodeError as e:
+            print(f"JSON解码错误在位置{e.pos}：{e}")
+            text = text[:e.pos] + text[e.pos + 1:]
+    return json.loads(text, strict=False)["data"]
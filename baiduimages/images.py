@@ -1,181 +1,130 @@
-import json
 import os
 import re
 import traceback
 from requests_html import HTMLSession
+from baiduimages.acjson import decode_acjson
+from crawler import DEFAULT_CONCURRENCY
+from crawler.engine import FetchEngine
+from crawler.frontier import FRONTIER_FILENAME, UrlFrontier
 import urllib3
 from concurrent.futures import ThreadPoolExecutor
 
 
 class Spider:
     def __init__(
-            self, base_url, *, headers=None, proxy=None, cookies=None, proxy_url=None
+            self, base_url, *, headers=None, proxy=None, cookies=None, proxy_url=None,
+            concurrency=DEFAULT_CONCURRENCY
     ):
         self.base_url = base_url
-        self.session = HTMLSession()
-        self.headers = headers
-        self.initial_proxy = proxy
-        self.proxy = proxy
-        self.cookies = cookies
-        self.proxy_url = proxy_url
+        self.concurrency = concurrency
+        self.engine = FetchEngine(
+            headers=headers,
+            cookies=cookies,
+            proxy=proxy,
+            proxy_url=proxy_url,
+            concurrency=concurrency,
+            session_class=HTMLSession,
+        )
         self.excel_saver = None
         self.counter = 0
         self.key = None
         self.numbers = None
+        self.frontier = None
 
-    def fetch(self, url, max_outer_retries=10, params=None):
-        """Makes an HTTP request and returns the HTML response."""
-
-        def _make_request(proxies):
-            """Helper function to make a request using provided proxy settings."""
+    def fetch_image(self, url, fallback_url=None):
+        """Return the response of an image, or None after releasing its claim if it could not be fetched."""
+        try:
             try:
-                r = self.session.get(
-                    url,
-                    headers=self.headers,
-                    proxies=proxies,
-                    cookies=self.cookies,
-                    params=params,
-                    timeout=6,
-                )
+                r = self.engine.get(url, headers={
+                    "Referer": "https://image.baidu.com/"
+                }, verify=False)
                 r.raise_for_status()
+                # GIFs are replaced by the static middle-size image
+                if fallback_url and r.headers.get("Content-Type") == "image/gif":
+                    raise Exception("GIF")
                 return r
             except Exception as e:
-                print(
-                    f"Error fetching {url} with params:{params} using {self.proxy}. Error: {e}"
-                )
+                if not fallback_url:
+                    raise
+                print(f"Error fetching {url}. Error: {e}")
                 traceback.print_exc()
-                return None
-
-        outer_retry_count = 0
-
-        while outer_retry_count <= max_outer_retries:
-            # Try fetching with the current proxy
-            response = _make_request(self.proxy)
-            if response:
-                return response
-
-            # If failed, try updating the proxy and fetching the response 5 times
-            for _ in range(1):
-                print(f"Error fetching {url} with params:{params} using {self.proxy}.")
-                if self.proxy_url:
-                    self._update_proxy()
-                response = _make_request(self.proxy)
-                if response:
-                    return response
-
-            # If all 5 tries failed, revert to the initial proxy
-            self.proxy = self.initial_proxy
-            print("Reverting to initial proxy")
-            outer_retry_count += 1
-
-        raise Exception(
-            f"Reached maximum retry attempts for URL: {url} with params:{params}."
-        )
+                r = self.engine.get(fallback_url)
+                r.raise_for_status()
+                return r
+        except Exception as e:
+            print(f"Error fetching {fallback_url or url}. Error: {e}")
+            # Not saved, so a later run tries it again
+            self.frontier.release(url)
+            return None
 
     def task(self, item):
         ret = {"data": []}
         base_name = re.sub(r'[\\/:*?"<>|]', "", item["fromPageTitleEnc"])
         ret["name"] = base_name
         if "setList" in item:
-            for sub_item in item["setList"]:
-                url = sub_item["objURL"]
-                r = self.session.get(url, headers={
-                    "Referer": "https://image.baidu.com/"
-                }, timeout=6, verify=False)
-                ret["data"].append(r)
-
+            images = [(sub_item["objURL"], None) for sub_item in item["setList"]]
         else:
-            url = item["replaceUrl"][0]["ObjURL"].replace("\\", "")
-            try:
-                r = self.session.get(url, headers={
-                    "Referer": "https://image.baidu.com/"
-                }, timeout=6, verify=False)
-                r.raise_for_status()
-                if r.headers["Content-Type"] == "image/gif":
-                    raise Exception("GIF")
-                ret["data"].append(r)
-            except Exception as e:
-                print(f"Error fetching {url}. Error: {e}")
-                traceback.print_exc()
-                url = item["middleURL"]
-                r = self.session.get(url)
-                ret["data"].append(r)
+            images = [(item["replaceUrl"][0]["ObjURL"].replace("\\", ""), item["middleURL"])]
+        for url, fallback_url in images:
+            # Images saved before (in this run or an earlier one) are not downloaded again
+            if not self.frontier.claim(url):
+                continue
+            r = self.fetch_image(url, fallback_url)
+            if r is not None:
+                ret["data"].append((url, r))
         return ret
 
     def parse(self, response):
-        data1 = response.text
-        while True:
-            try:
-                data = json.loads(data1)
-            except json.JSONDecodeError as e:
-                error_position = e.pos  # 这给出了错误发生的位置
-                print(f"JSON解码错误在位置{error_position}：{e}")
-                data1 = data1[:error_position] + data1[error_position + 1:]
-            else:
-                break
-        if not data["data"][0]:
+        data = decode_acjson(response.text)
+        if not data[0]:
             print("只有这么多图片了")
             input("按任意键退出")
             exit()
         future_list = []
-        with ThreadPoolExecutor(max_workers=10) as executor:
-            for item in data["data"][:-1]:
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            for item in data[:-1]:
                 future = executor.submit(self.task, item)
                 future_list.append(future)
             for future in future_list:
                 ret = future.result()
-                for r in ret["data"]:
-                    self.save(r, f"{ret['name']}.jpg")
+                for url, r in ret["data"]:
+                    self.save(r, f"{ret['name']}.jpg", url)
 
-    def save(self, data, filename):
+    def save(self, data, filename, url):
         self.counter += 1
         path = f"{self.key}/{self.counter}_{filename}"
         with open(path, "wb") as f:
             f.write(data.content)
+        self.frontier.done(url)
         print(f"第{self.counter}张图片下载完成")
         if self.counter == self.numbers:
             print("下载完成")
             input("按任意键退出")
             exit()
 
-    def _update_proxy(self):
-        count = 0
-        while count <= 2:
-            try:
-                response = self.session.get(self.proxy_url).json()
-                print(response)
-                ip = response["RESULT"][0]["ip"]
-                port = response["RESULT"][0]["port"]
-            except Exception as e:
-                print(f"Error fetching proxy. Error: {e}")
-                print("." * 30 + "Attempting to update proxy" + "." * 30)
-                traceback.print_exc()
-                count += 1
-            else:
-                self.proxy = dict(
-                    http=f"http://{ip}:{port}", https=f"http://{ip}:{port}"
-                )
-                print("=" * 30 + "Proxy updated" + "=" * 30)
-                break
-
     def run(self):
         urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
         self.key = input("请输入图片关键字：")
         self.numbers = int(input("请输入图片数量："))
         if not os.path.exists(self.key):
             os.mkdir(self.key)
+        self.frontier = UrlFrontier(os.path.join(self.key, FRONTIER_FILENAME))
         each = 30
         page = 0
-        while self.counter < self.numbers:
-            query = dict(
-                word=self.key,
-                queryWord=self.key,
-                pn=page * each,
-                rn=each,
-            )
-            page += 1
-            response = self.fetch(self.base_url, params=query)
-            self.parse(response)
+        try:
+            while self.counter < self.numbers:
+                query = dict(
+                    word=self.key,
+                    queryWord=self.key,
+                    pn=page * each,
+                    rn=each,
+                )
+                page += 1
+                response = self.engine.fetch(self.base_url, params=query)
+                self.parse(response)
+        finally:
+            # Also reached through the exit() calls once enough images are saved
+            self.frontier.close()
 
 
 if __name__ == "__main__":
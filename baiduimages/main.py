@@ -1,180 +1,143 @@
 import os
 import re
-import threading
 import traceback
-from requests_html import HTMLSession
-import urllib3
+import uuid
 import asyncio
-from functools import partial
+from baiduimages.acjson import decode_acjson
+from crawler.aio import DEFAULT_ASYNC_CONCURRENCY, AsyncFetchEngine
+from crawler.frontier import FRONTIER_FILENAME, UrlFrontier
+
+IMAGE_HEADERS = {"Referer": "https://image.baidu.com/"}
 
 
 class Spider:
     def __init__(
-        self, base_url, *, headers=None, proxy=None, cookies=None, proxy_url=None
+        self, base_url, *, headers=None, proxy=None, cookies=None, proxy_url=None,
+        concurrency=DEFAULT_ASYNC_CONCURRENCY
     ):
         self.base_url = base_url
-        self.session = HTMLSession()
-        self.headers = headers
-        self.initial_proxy = proxy
-        self.proxy = proxy
-        self.cookies = cookies
-        self.proxy_url = proxy_url
-        self.excel_saver = None
+        # aiohttp takes the proxy as a URL rather than a requests-style mapping
+        if isinstance(proxy, dict):
+            proxy = proxy.get("http")
+        self.engine_options = dict(
+            headers=headers,
+            cookies=cookies,
+            proxy=proxy,
+            proxy_url=proxy_url,
+            concurrency=concurrency,
+            ssl=False,
+        )
+        self.engine = None
+        self.frontier = None
+        self.finished = None
         self.counter = 0
         self.key = None
         self.numbers = None
-
-    def fetch(self, url, max_outer_retries=10, params=None):
-        """Makes an HTTP request and returns the HTML response."""
-
-        def _make_request(proxies):
-            """Helper function to make a request using provided proxy settings."""
-            try:
-                r = self.session.get(
-                    url,
-                    headers=self.headers,
-                    proxies=proxies,
-                    cookies=self.cookies,
-                    params=params,
-                    timeout=6,
-                )
-                r.raise_for_status()
-                return r
-            except Exception as e:
-                print(
-                    f"Error fetching {url} with params:{params} using {self.proxy}. Error: {e}"
-                )
-                traceback.print_exc()
-                return None
-
-        outer_retry_count = 0
-
-        while outer_retry_count <= max_outer_retries:
-            # Try fetching with the current proxy
-            response = _make_request(self.proxy)
-            if response:
-                return response
-
-            # If failed, try updating the proxy and fetching the response 5 times
-            for _ in range(1):
-                print(f"Error fetching {url} with params:{params} using {self.proxy}.")
-                if self.proxy_url:
-                    self._update_proxy()
-                response = _make_request(self.proxy)
-                if response:
-                    return response
-
-            # If all 5 tries failed, revert to the initial proxy
-            self.proxy = self.initial_proxy
-            print("Reverting to initial proxy")
-            outer_retry_count += 1
-
-        raise Exception(
-            f"Reached maximum retry attempts for URL: {url} with params:{params}."
+        self.each = 30
+
+    async def fetch_page(self, page):
+        query = dict(
+            word=self.key,
+            queryWord=self.key,
+            pn=page * self.each,
+            rn=self.each,
         )
-
-    async def parse(self, response):
-        """Parses the HTML response and saves the data to an Excel file."""
-        try:
-            data = response.json()
-            tasks = []
-            for item in data["data"][:-1]:
-                loop = asyncio.get_event_loop()
-                base_name = re.sub(r'[\\/:*?"<>|]', "",  item["fromPageTitleEnc"])
-                if "setList" in item:
-                    for sub_item in item["setList"]:
-                        url = sub_item["objURL"]
-                        task = asyncio.create_task(self.fetch_and_save(url, base_name))
-                        tasks.append(task)
-                else:
-                    url = item["replaceUrl"][0]["ObjURL"].replace("\\", "")
-                    urls = item["middleURL"]
-                    task = asyncio.create_task(self.fetch_and_save(url, base_name, urls))
-                    tasks.append(task)
-            await asyncio.gather(*tasks)
-        except Exception as e:
-            print(f"Error parsing data. Error: {e}")
-            traceback.print_exc()
-
-    async def fetch_and_save(self, url, base_name, urls=None):
-        loop = asyncio.get_event_loop()
+        body = await self.engine.fetch(self.base_url, params=query)
+        return decode_acjson(body)
+
+    @staticmethod
+    def parse(data):
+        """Yields (url, base_name, fallback_url) for every image in the data list of a result page."""
+        for item in data[:-1]:
+            base_name = re.sub(r'[\\/:*?"<>|]', "", item["fromPageTitleEnc"])
+            if "setList" in item:
+                for sub_item in item["setList"]:
+                    yield sub_item["objURL"], base_name, None
+            else:
+                url = item["replaceUrl"][0]["ObjURL"].replace("\\", "")
+                yield url, base_name, item["middleURL"]
+
+    async def fetch_and_save(self, url, base_name, fallback_url=None):
+        # Images saved before (in this run or an earlier one) are not downloaded again
+        if self.finished.is_set() or not self.frontier.claim(url):
+            return
+        temp_path = os.path.join(self.key, f".{uuid.uuid4().hex}")
         try:
-            partial_func = partial(
-                self.session.get,
-                url,
-                headers={"Referer": "https://image.baidu.com/"},
-                timeout=6,
-                verify=False
-            )
-            r = await loop.run_in_executor(None, partial_func)
-            if r.headers["Content-Type"] == "image/gif":
-                raise Exception("GIF")
-            r.raise_for_status()
-        except Exception as e:
-            print(f"Error fetching {url}. Error: {e}")
-            traceback.print_exc()
-            url = urls
-            partial_func = partial(
-                self.session.get,
-                url,
-                headers={"Referer": "https://image.baidu.com/"},
-                timeout=6,
-                verify=False
-            )
-            r = await loop.run_in_executor(None, partial_func)
-        partials = partial(self.save, r, f"{base_name}.jpg")
-        await loop.run_in_executor(None, partials)
-
-    def save(self, data, filename):
-        with threading.Lock():
-            self.counter += 1
-            path = f"{self.key}/{self.counter}_{filename}"
-            with open(path, "wb") as f:
-                f.write(data.content)
-            print(f"第{self.counter}张图片下载完成")
-            if self.counter == self.numbers:
-                print("下载完成")
-                os._exit(0)
-
-    def _update_proxy(self):
-        count = 0
-        while count <= 2:
             try:
-                response = self.session.get(self.proxy_url).json()
-                print(response)
-                ip = response["RESULT"][0]["ip"]
-                port = response["RESULT"][0]["port"]
+                # GIFs are replaced by the static middle-size image
+                reject = ("image/gif",) if fallback_url else ()
+                await self.engine.download(url, temp_path, IMAGE_HEADERS, reject_content_types=reject)
             except Exception as e:
-                print(f"Error fetching proxy. Error: {e}")
-                print("." * 30 + "Attempting to update proxy" + "." * 30)
-                traceback.print_exc()
-                count += 1
-            else:
-                self.proxy = dict(
-                    http=f"http://{ip}:{port}", https=f"http://{ip}:{port}"
-                )
-                print("=" * 30 + "Proxy updated" + "=" * 30)
-                break
+                print(f"Error fetching {url}. Error: {e!r}")
+                if not fallback_url or self.finished.is_set():
+                    return
+                try:
+                    await self.engine.download(fallback_url, temp_path, IMAGE_HEADERS)
+                except Exception as e:
+                    print(f"Error fetching {fallback_url}. Error: {e!r}")
+                    return
+            self.save(temp_path, f"{base_name}.jpg", url)
+        finally:
+            # No-op once the image was saved
+            self.frontier.release(url)
+
+    def save(self, temp_path, filename, url):
+        # Runs on the event loop thread only, no lock needed
+        if self.finished.is_set():
+            os.remove(temp_path)
+            return
+        self.counter += 1
+        os.replace(temp_path, f"{self.key}/{self.counter}_{filename}")
+        self.frontier.done(url)
+        print(f"第{self.counter}张图片下载完成")
+        if self.counter == self.numbers:
+            print("下载完成")
+            self.finished.set()
+
+    async def crawl(self):
+        """Fetch result pages ahead of the downloads and keep enough downloads in flight to reach numbers."""
+        self.finished = asyncio.Event()
+        self.frontier = UrlFrontier(os.path.join(self.key, FRONTIER_FILENAME))
+        async with AsyncFetchEngine(**self.engine_options) as self.engine:
+            downloads = set()
+            page = 0
+            next_page = asyncio.create_task(self.fetch_page(page))
+            exhausted = False
+            try:
+                while not self.finished.is_set():
+                    downloads = {task for task in downloads if not task.done()}
+                    if downloads and (exhausted or len(downloads) >= self.numbers - self.counter):
+                        await asyncio.wait(downloads, return_when=asyncio.FIRST_COMPLETED)
+                        continue
+                    if exhausted:
+                        break
+                    data = await next_page
+                    if not data[0]:
+                        print("只有这么多图片了")
+                        exhausted = True
+                        continue
+                    page += 1
+                    # The next page is fetched while this page's images download
+                    next_page = asyncio.create_task(self.fetch_page(page))
+                    for url, base_name, fallback_url in self.parse(data):
+                        downloads.add(asyncio.create_task(self.fetch_and_save(url, base_name, fallback_url)))
+            finally:
+                for task in downloads | {next_page}:
+                    task.cancel()
+                await asyncio.gather(*downloads, next_page, return_exceptions=True)
+                self.frontier.close()
 
     def run(self):
-        loop = asyncio.get_event_loop()
-        urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
         self.key = input("请输入图片关键字：")
         self.numbers = int(input("请输入图片数量："))
         if not os.path.exists(self.key):
             os.mkdir(self.key)
-        each = 30
-        page = 0
-        while self.counter < self.numbers:
-            query = dict(
-                word=self.key,
-                queryWord=self.key,
-                pn=page * each,
-                rn=each,
-            )
-            page += 1
-            response = self.fetch(self.base_url, params=query)
-            loop.run_until_complete(self.parse(response))
+        try:
+            asyncio.run(self.crawl())
+        except Exception as e:
+            print(f"异常: {e}")
+            traceback.print_exc()
+        input("按任意键退出")
 
 
 if __name__ == "__main__":
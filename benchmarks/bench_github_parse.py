@@ -0,0 +1,137 @@
+"""
+Benchmark the GitHub search page parsers on saved or synthetic result pages.
+
+Compares the compiled-selector SearchPageParser with the per-field XPath calls it
+replaced, run through requests_html when it is installed and through plain lxml
+otherwise, checks that all of them return the same rows and prints pages per second.
+Save real pages with e.g. ``curl 'https://github.com/search?q=python&type=repositories'``.
+
+Usage:
+    python benchmarks/bench_github_parse.py --pages 'saved/*.html' --repeat 20
+    python benchmarks/bench_github_parse.py --results 10 --synthetic-pages 50
+"""
+import argparse
+import glob
+import html
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Sequence
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from lxml import html as lxml_html  # noqa: E402
+
+from github.searchpage import SearchPageParser  # noqa: E402
+
+# Saved and synthetic pages are UTF-8, which lxml does not assume without a <meta charset>
+UTF8_PARSER = lxml_html.HTMLParser(encoding="utf-8")
+
+
+def synthetic_page(results: int, seed: int = 0) -> bytes:
+    """A search result page with the markup the selectors expect."""
+    rng = random.Random(seed)
+    divs = []
+    for i in range(results):
+        topics = "".join(f"<a href='/topics/t{t}'> topic{t} </a>" for t in range(rng.randint(0, 5)))
+        # Some results carry a second list, the parsers must pick the same fields from it
+        extra = "<ul><li>sponsor</li><li>a</li><li>b</li><li>c</li></ul>" if i % 3 == 0 else ""
+        divs.append(f"""
+        <div><div class="Box-sc-g0xbh4-0 bBwPjs">
+          <h3><div><a href="/user{i}/repo{i}"><span>user{i}/</span><em>repo</em>{i}</a></div></h3>
+          <div class="Box-sc-g0xbh4-0 LjnbQ"><span> {html.escape("A repository " * rng.randint(1, 12))} </span></div>
+          <div class="Box-sc-g0xbh4-0 frRVAS">{topics}</div>{extra}
+          <ul><li><span>Python</span></li><li><a><span>{rng.randint(1, 99)}.{rng.randint(0, 9)}k</span></a></li>
+              <li><span> Updated </span><div>on Oct {rng.randint(1, 28)}, 2023</div></li></ul>
+        </div></div>""")
+    return f"""<html><head><title>Search</title></head><body><div class="application-main"><main>
+    <div data-testid="results-list">{"".join(divs)}</div>
+    <nav aria-label="Pagination"><a>1</a><a>2</a><a>100</a><a>Next</a></nav>
+    </main></div></body></html>""".encode("utf-8")
+
+
+def _legacy_rows(root: Any) -> List[List[Any]]:
+    """The parse that concurrence.Spider used before SearchPageParser, one uncompiled XPath per field."""
+    data = []
+    for div in root.xpath("//div[@data-testid='results-list']/div"):
+        title = "".join(div.xpath(".//h3//a//text()"))
+        site = "https://github.com" + div.xpath(".//h3//a/@href")[0]
+        description = "".join(d.strip() for d in div.xpath('.//div[@class="Box-sc-g0xbh4-0 LjnbQ"]//text()'))
+        topics = [topic.strip() for topic in div.xpath(".//div[@class = 'Box-sc-g0xbh4-0 frRVAS']//text()")]
+        topics = str(topics) if topics else "无"
+        language = div.xpath(".//ul/li[last()-2]//text()")
+        language = language[0] if language else "无"
+        stars = div.xpath(".//ul/li[last()-1]//text()")[0]
+        update = " ".join(u.strip() for u in div.xpath(".//ul/li[last()]//text()"))
+        data.append([title, site, description, topics, language, stars, update])
+    return data
+
+
+def parse_requests_html(content: bytes) -> List[List[Any]]:
+    from requests_html import HTML
+    return _legacy_rows(HTML(html=content))
+
+
+def parse_lxml_uncompiled(content: bytes) -> List[List[Any]]:
+    return _legacy_rows(lxml_html.fromstring(content, parser=UTF8_PARSER))
+
+
+def make_compiled() -> Callable[[bytes], List[Sequence[Any]]]:
+    parser = SearchPageParser()
+    return lambda content: parser.parse(parser.tree(content, "utf-8"))
+
+
+def build_parsers() -> Dict[str, Callable[[bytes], List[Sequence[Any]]]]:
+    parsers = {}
+    try:
+        import requests_html  # noqa: F401
+        parsers["requests_html"] = parse_requests_html
+    except ImportError:
+        print("requests_html is not installed, skipping it", file=sys.stderr)
+    parsers["lxml.uncompiled"] = parse_lxml_uncompiled
+    parsers["SearchPageParser"] = make_compiled()
+    return parsers
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", default=None, help="glob of saved search result pages")
+    parser.add_argument("--results", type=int, default=10, help="results per synthetic page")
+    parser.add_argument("--synthetic-pages", type=int, default=20, help="synthetic pages when --pages is not given")
+    parser.add_argument("--repeat", type=int, default=10, help="passes over all pages per parser")
+    args = parser.parse_args()
+
+    if args.pages:
+        pages = [Path(path).read_bytes() for path in sorted(glob.glob(args.pages))]
+    else:
+        pages = [synthetic_page(args.results, seed) for seed in range(args.synthetic_pages)]
+    if not pages:
+        sys.exit(f"No pages match {args.pages}")
+
+    parsers = build_parsers()
+    expected = None
+    timings = {}
+    for name, parse in parsers.items():
+        # SearchPageParser returns SearchResult tuples, compare them as plain rows
+        rows = [[list(row) for row in parse(content)] for content in pages]
+        if expected is None:
+            expected = rows
+        elif rows != expected:
+            print(f"{name} returns different rows than {next(iter(parsers))}", file=sys.stderr)
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            for content in pages:
+                parse(content)
+        timings[name] = time.perf_counter() - start
+
+    count = len(pages) * args.repeat
+    slowest = max(timings.values())
+    print(f"{len(pages)} pages, {sum(map(len, expected))} results, {args.repeat} passes")
+    print(f"{'parser':<20}{'pages/s':>12}{'ms/page':>12}{'speedup':>10}")
+    for name, elapsed in timings.items():
+        print(f"{name:<20}{count / elapsed:>12.1f}{elapsed / count * 1000:>12.3f}{slowest / elapsed:>9.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,284 @@
+"""
+Benchmark the saveexcel writers on synthetic Tencent- and GitHub-shaped data.
+
+Every (dataset, rows, writer, format, sheet split) case runs in its own subprocess so
+that peak RSS is measured per case. Results are printed as a table and stored as JSON;
+pass --baseline with an earlier result file to see the throughput ratio per case.
+
+Usage:
+    python benchmarks/bench_saveexcel.py --rows 1000,100000 --chinese-ratio 0.5
+    python benchmarks/bench_saveexcel.py --writers ExcelSaver.write_rows,csv --baseline old.json
+"""
+import argparse
+import contextlib
+import glob
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+DEFAULT_ROWS = "1000,100000,1000000"
+DEFAULT_SHEET_ROWS = "5000,none"
+# The per-item module function re-reads the workbook on every call, it is quadratic
+LEGACY_MAX_ROWS = 5000
+
+TENCENT_HEADERS = ["PostId", "RecruitPostId", "RecruitPostNam", "CountryName", "LocationName", "CategoryName",
+                   "Responsibility", "LastUpdateTime", "PostURL", "SourceID", "IsCollect", "IsValid"]
+GITHUB_HEADERS = ["项目名称", "项目地址", "项目描述", "项目标签", "项目语言", "项目stars", "项目更新时间"]
+
+_CJK = [chr(code) for code in range(0x4e00, 0x4e00 + 2000)]
+_ASCII = "abcdefghijklmnopqrstuvwxyz0123456789     "
+
+
+def _text(rng: random.Random, length: int, chinese_ratio: float) -> str:
+    return "".join(rng.choice(_CJK) if rng.random() < chinese_ratio else rng.choice(_ASCII)
+                   for _ in range(length))
+
+
+def tencent_rows(count: int, chinese_ratio: float, seed: int = 0) -> List[List[Any]]:
+    rng = random.Random(seed)
+    rows = []
+    for i in range(count):
+        rows.append([
+            str(1700000000000000000 + i), 50000 + i, _text(rng, 12, chinese_ratio),
+            "中国", _text(rng, 2, chinese_ratio), _text(rng, 2, chinese_ratio),
+            _text(rng, rng.randint(80, 400), chinese_ratio), f"2023年10月{rng.randint(1, 28):02d}日",
+            f"http://careers.tencent.com/jobdesc.html?postId={i}", 1, False, True,
+        ])
+    return rows
+
+
+def github_rows(count: int, chinese_ratio: float, seed: int = 0) -> List[List[Any]]:
+    rng = random.Random(seed)
+    rows = []
+    for i in range(count):
+        name = f"user{i % 997}/repo{i}"
+        topics = [_text(rng, 6, chinese_ratio) for _ in range(rng.randint(0, 5))]
+        rows.append([
+            name, f"https://github.com/{name}", _text(rng, rng.randint(20, 120), chinese_ratio),
+            str(topics) if topics else "无",
+            rng.choice(["Python", "Go", "Rust", "JavaScript", "无"]), f"{rng.randint(0, 999)}.{rng.randint(0, 9)}k",
+            f"Updated {rng.randint(1, 28)} days ago",
+        ])
+    return rows
+
+
+DATASETS = {
+    "tencent": (TENCENT_HEADERS, tencent_rows),
+    "github": (GITHUB_HEADERS, github_rows),
+}
+
+
+def _write_saveitem_function(headers, rows, path, max_rows):
+    from saveexcel.saveitem import save_to_excel
+    for row in rows:
+        save_to_excel(row, headers, output_filename=path, max_rows_per_sheet=max_rows)
+
+
+def _write_saveitem_batch(headers, rows, path, max_rows):
+    from saveexcel.saveitem import save_to_excel
+    save_to_excel(rows, headers, output_filename=path, max_rows_per_sheet=max_rows)
+
+
+def _write_excel_saver_items(headers, rows, path, max_rows):
+    from saveexcel.saveitem import ExcelSaver
+    saver = ExcelSaver(headers, output_filename=path, max_rows_per_sheet=max_rows)
+    for row in rows:
+        saver.save_data_item(row)
+    saver.close()
+
+
+def _write_excel_saver_rows(headers, rows, path, max_rows):
+    from saveexcel.saveitem import ExcelSaver
+    saver = ExcelSaver(headers, output_filename=path, max_rows_per_sheet=max_rows)
+    saver.write_rows(rows)
+    saver.close()
+
+
+def _write_saveitems_function(headers, rows, path, max_rows):
+    from saveexcel.saveitems import save_to_excel
+    save_to_excel(rows, headers, output_filename=path, max_rows_per_sheet=max_rows)
+
+
+def _write_excel_writer(headers, rows, path, max_rows):
+    from saveexcel.saveitems import ExcelWriter
+    ExcelWriter(headers, output_filename=path, max_rows_per_sheet=max_rows).save_data(rows)
+
+
+def _write_parallel(headers, rows, path, max_rows):
+    from saveexcel.parallel import ParallelExcelWriter
+    ParallelExcelWriter(headers, output_filename=path, max_rows_per_sheet=max_rows,
+                        sharded=not path.endswith(".xlsx")).save_data(rows)
+
+
+def _write_sink(headers, rows, path, max_rows):
+    from saveexcel.sinks import open_saver
+    saver = open_saver(headers, path)
+    saver.write_rows(rows)
+    saver.close()
+
+
+# name -> (writer, output formats, uses the sheet split setting)
+WRITERS: Dict[str, Any] = {
+    "saveitem.save_to_excel[per-item]": (_write_saveitem_function, [".xls"], True),
+    "saveitem.save_to_excel": (_write_saveitem_batch, [".xls"], True),
+    "ExcelSaver.save_data_item": (_write_excel_saver_items, [".xls", ".xlsx"], True),
+    "ExcelSaver.write_rows": (_write_excel_saver_rows, [".xls", ".xlsx"], True),
+    "saveitems.save_to_excel": (_write_saveitems_function, [".xls", ".xlsx"], True),
+    "saveitems.ExcelWriter": (_write_excel_writer, [".xls", ".xlsx"], True),
+    "parallel.ParallelExcelWriter": (_write_parallel, [".xls", ".xlsx"], True),
+    "csv": (_write_sink, [".csv"], False),
+    "jsonl": (_write_sink, [".jsonl"], False),
+    "sqlite": (_write_sink, [".db"], False),
+    # Needs pyarrow, reported as an error without it
+    "parquet": (_write_sink, [".parquet"], False),
+}
+
+
+def _peak_rss_kb() -> Optional[int]:
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+        except ImportError:
+            return None
+        return psutil.Process().memory_info().peak_wset // 1024
+    # Worker processes of the parallel writer count as well
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def _output_size(path: str) -> int:
+    size = 0
+    stem, suffix = os.path.splitext(path)
+    # Sharded writers leave stem.partNNNN.suffix files instead of path
+    for candidate in [path, f"{path}-wal"] + glob.glob(f"{glob.escape(stem)}.part*{suffix}"):
+        if os.path.exists(candidate):
+            size += os.path.getsize(candidate)
+    return size
+
+
+def run_case(case: Dict[str, Any]) -> Dict[str, Any]:
+    """Run one case in the current process and return its measurements."""
+    headers, generate = DATASETS[case["dataset"]]
+    rows = generate(case["rows"], case["chinese_ratio"])
+    writer: Callable = WRITERS[case["writer"]][0]
+    rss_before = _peak_rss_kb()
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, f"bench{case['format']}")
+        # Keep any progress output off the terminal
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            start = time.perf_counter()
+            writer(headers, rows, path, case["max_rows_per_sheet"])
+            elapsed = time.perf_counter() - start
+        size = _output_size(path)
+    return dict(case, seconds=round(elapsed, 4), rows_per_second=round(case["rows"] / elapsed, 1),
+                output_bytes=size, peak_rss_before_write_kb=rss_before, peak_rss_kb=_peak_rss_kb())
+
+
+def run_case_in_subprocess(case: Dict[str, Any], timeout: Optional[float]) -> Dict[str, Any]:
+    with tempfile.NamedTemporaryFile("r", suffix=".json", delete=False) as result_file:
+        result_path = result_file.name
+    try:
+        completed = subprocess.run([sys.executable, __file__, "--run-case", json.dumps(case), "--result", result_path],
+                                   capture_output=True, text=True, timeout=timeout)
+        if completed.returncode != 0:
+            return dict(case, error=completed.stderr.strip().splitlines()[-1] if completed.stderr else "failed")
+        with open(result_path, "r", encoding="utf-8") as file:
+            return json.load(file)
+    except subprocess.TimeoutExpired:
+        return dict(case, error=f"timeout after {timeout}s")
+    finally:
+        os.remove(result_path)
+
+
+def build_cases(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    sheet_splits = [None if value.lower() == "none" else int(value) for value in args.sheet_rows.split(",")]
+    writers = args.writers.split(",") if args.writers else list(WRITERS)
+    cases = []
+    for dataset in args.datasets.split(","):
+        for rows in (int(value) for value in args.rows.split(",")):
+            for writer in writers:
+                _, formats, uses_split = WRITERS[writer]
+                if writer.endswith("[per-item]") and rows > args.legacy_max_rows:
+                    continue
+                for output_format in formats:
+                    for max_rows in (sheet_splits if uses_split else [None]):
+                        cases.append(dict(dataset=dataset, rows=rows, writer=writer, format=output_format,
+                                          max_rows_per_sheet=max_rows, chinese_ratio=args.chinese_ratio))
+    return cases
+
+
+def case_key(case: Dict[str, Any]) -> str:
+    return (f"{case['dataset']}/{case['rows']}/{case['writer']}/{case['format']}/"
+            f"{case['max_rows_per_sheet']}/{case['chinese_ratio']}")
+
+
+def print_report(results: List[Dict[str, Any]], baseline: Dict[str, Dict[str, Any]]) -> None:
+    print(f"{'case':<78} {'rows/s':>12} {'peak RSS MB':>12} {'size MB':>9} {'vs base':>8}")
+    for result in results:
+        key = case_key(result)
+        if "error" in result:
+            print(f"{key:<78} {'error: ' + result['error']}")
+            continue
+        previous = baseline.get(key)
+        ratio = (f"{result['rows_per_second'] / previous['rows_per_second']:.2f}x"
+                 if previous and previous.get("rows_per_second") else "")
+        rss = f"{result['peak_rss_kb'] / 1024:.1f}" if result["peak_rss_kb"] is not None else "n/a"
+        print(f"{key:<78} {result['rows_per_second']:>12.0f} {rss:>12} "
+              f"{result['output_bytes'] / 1048576:>9.2f} {ratio:>8}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--datasets", default="tencent,github", help="comma separated: tencent,github")
+    parser.add_argument("--rows", default=DEFAULT_ROWS, help="comma separated row counts")
+    parser.add_argument("--chinese-ratio", type=float, default=0.5, help="share of CJK characters in text fields")
+    parser.add_argument("--sheet-rows", default=DEFAULT_SHEET_ROWS, help="max_rows_per_sheet values, 'none' = limit")
+    parser.add_argument("--writers", default="", help=f"comma separated subset of: {', '.join(WRITERS)}")
+    parser.add_argument("--legacy-max-rows", type=int, default=LEGACY_MAX_ROWS,
+                        help="skip the per-item save_to_excel case above this many rows")
+    parser.add_argument("--timeout", type=float, default=None, help="seconds allowed per case")
+    parser.add_argument("--output", default="bench_saveexcel.json", help="where to store the JSON results")
+    parser.add_argument("--baseline", default=None, help="earlier JSON results to compare against")
+    parser.add_argument("--run-case", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--result", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_case:
+        result = run_case(json.loads(args.run_case))
+        with open(args.result, "w", encoding="utf-8") as file:
+            json.dump(result, file)
+        return
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as file:
+            baseline = {case_key(result): result for result in json.load(file)["results"]}
+
+    results = []
+    for case in build_cases(args):
+        result = run_case_in_subprocess(case, args.timeout)
+        results.append(result)
+        print(f"{case_key(result)}: {result.get('rows_per_second', result.get('error'))}", file=sys.stderr)
+
+    print_report(results, baseline)
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(dict(created=time.strftime("%Y-%m-%dT%H:%M:%S"), python=platform.python_version(),
+                       platform=platform.platform(), results=results), file, ensure_ascii=False, indent=2)
+    print(f"Results saved to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,25 @@
+from typing import Dict, Optional
+
+__all__ = [
+            "DEFAULT_CONCURRENCY",
+            "DEFAULT_CONNECT_TIMEOUT",
+            "DEFAULT_READ_TIMEOUT",
+            "DEFAULT_POOL_HOSTS",
+            "DEFAULT_MAX_RETRIES",
+            "proxy_dict"
+]
+
+# Worker threads per spider, the connection pools are sized to match
+DEFAULT_CONCURRENCY = 10
+DEFAULT_CONNECT_TIMEOUT = 3.05
+DEFAULT_READ_TIMEOUT = 6
+# Hosts whose connection pools are kept alive at the same time (image downloads hit many)
+DEFAULT_POOL_HOSTS = 32
+DEFAULT_MAX_RETRIES = 10
+
+
+def proxy_dict(address: Optional[str]) -> Optional[Dict[str, str]]:
+    """Turn "ip:port" into the proxies mapping taken by requests."""
+    if not address:
+        return None
+    return dict(http=f"http://{address}", https=f"http://{address}")
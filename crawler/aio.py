@@ -0,0 +1,182 @@
+import asyncio
+import os
+import time
+from typing import Any, Dict, Hashable, Optional
+from urllib.parse import urlsplit
+
+from crawler import *
+from crawler.proxypool import DEFAULT_PROXY_POOL_SIZE, ProxyPool
+from crawler.retry import PROXY_ERRORS, RetryBudget, RetryPolicy
+from crawler.telemetry import Telemetry
+
+__all__ = [
+            "DEFAULT_ASYNC_CONCURRENCY",
+            "DOWNLOAD_CHUNK_SIZE",
+            "AsyncFetchEngine"
+]
+
+# Downloads in flight at once; they all share one thread
+DEFAULT_ASYNC_CONCURRENCY = 200
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+
+class AsyncFetchEngine:
+    """
+    asyncio counterpart of FetchEngine built on aiohttp (``pip install aiohttp``).
+
+    Use it as ``async with AsyncFetchEngine(...) as engine``. One connector keeps up to
+    ``concurrency`` keep-alive connections (``per_host`` per host) and a semaphore caps the
+    requests in flight, so thousands of downloads can be scheduled on one thread without
+    one thread per request. ``fetch`` retries with the same RetryPolicy as FetchEngine.fetch
+    and, with a ``proxy_url``, takes its proxies from a ProxyPool like FetchEngine: each
+    ``fetch`` call holds its own proxy and reports every attempt's outcome and latency, so
+    a failing proxy only moves the request that hit it. ``download`` streams a body to disk
+    chunk by chunk. Requests, retries and proxy swaps are recorded on ``telemetry``.
+    """
+
+    def __init__(self,
+                 *,
+                 headers: Optional[Dict[str, str]] = None,
+                 cookies: Optional[Dict[str, str]] = None,
+                 proxy: Optional[str] = None,
+                 proxy_url: Optional[str] = None,
+                 concurrency: int = DEFAULT_ASYNC_CONCURRENCY,
+                 per_host: int = DEFAULT_CONCURRENCY,
+                 connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout: float = DEFAULT_READ_TIMEOUT,
+                 max_retries: int = DEFAULT_MAX_RETRIES,
+                 retry_policy: Optional[RetryPolicy] = None,
+                 telemetry: Optional[Telemetry] = None,
+                 proxy_pool_size: int = DEFAULT_PROXY_POOL_SIZE,
+                 proxy_retry_delay: float = 1,
+                 ssl: bool = True):
+        try:
+            import aiohttp
+        except ImportError as e:
+            raise ImportError("AsyncFetchEngine requires aiohttp, install it with `pip install aiohttp`") from e
+        self.aiohttp = aiohttp
+        self.headers = headers
+        self.cookies = cookies
+        self.proxy = proxy
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.timeout = aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+        self.retry_policy = retry_policy or RetryPolicy(max_retries, budget=RetryBudget())
+        self.telemetry = telemetry if telemetry is not None else Telemetry()
+        self.ssl = ssl
+        self.session = None
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.proxy_pool: Optional[ProxyPool] = None
+        if proxy_url:
+            self.proxy_pool = ProxyPool(proxy_url, size=proxy_pool_size, refill_delay=proxy_retry_delay,
+                                        acquire_timeout=connect_timeout + read_timeout, timeout=read_timeout,
+                                        telemetry=self.telemetry)
+
+    async def __aenter__(self) -> "AsyncFetchEngine":
+        connector = self.aiohttp.TCPConnector(limit=self.concurrency, limit_per_host=self.per_host, ssl=self.ssl)
+        self.session = self.aiohttp.ClientSession(connector=connector, timeout=self.timeout,
+                                                  headers=self.headers, cookies=self.cookies)
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def _acquire_proxy(self, worker: Hashable) -> Optional[str]:
+        # A stocked pool answers at once; only wait for a refill off the event loop
+        address = self.proxy_pool.acquire(worker, timeout=0)
+        if address is None:
+            address = await asyncio.to_thread(self.proxy_pool.acquire, worker)
+        return address
+
+    async def fetch(self, url: str, params: Optional[Dict[str, Any]] = None,
+                    max_retries: Optional[int] = None) -> bytes:
+        """Fetch url and return the body, retrying failures with backoff like FetchEngine.fetch."""
+        policy = self.retry_policy
+        policy.record_request()
+        retries = 0
+        # Each call is a pool worker of its own, so a proxy failure only moves this request
+        worker = object()
+        try:
+            while True:
+                address = await self._acquire_proxy(worker) if self.proxy_pool is not None else None
+                proxy = f"http://{address}" if address else self.proxy
+                start = time.monotonic()
+                try:
+                    async with self.semaphore:
+                        # Waiting for the semaphore is not part of the request latency
+                        start = time.monotonic()
+                        async with self.session.get(url, params=params, proxy=proxy) as r:
+                            r.raise_for_status()
+                            body = await r.read()
+                except Exception as e:
+                    kind = policy.classify(e)
+                    status = getattr(e, "status", None) or kind
+                    self.telemetry.observe_request(url, status, time.monotonic() - start)
+                    if address:
+                        # A failure moves this request to another proxy unless the origin is to blame
+                        self.proxy_pool.report(address, kind not in PROXY_ERRORS, time.monotonic() - start, worker)
+                        if kind in PROXY_ERRORS:
+                            self.telemetry.inc("proxy_swaps_total")
+                    print(f"Error fetching {url} with params:{params} using {proxy}. Error: {e!r}")
+                    host = urlsplit(url).netloc
+                    if not policy.should_retry(kind, retries, max_retries):
+                        self.telemetry.inc("failures_total", host=host, kind=kind)
+                        raise Exception(f"Giving up on URL: {url} with params:{params} "
+                                        f"after {retries} retries ({kind}).") from e
+                    self.telemetry.inc("retries_total", host=host, kind=kind)
+                    await asyncio.sleep(policy.backoff(retries, e))
+                    retries += 1
+                else:
+                    latency = time.monotonic() - start
+                    if address:
+                        self.proxy_pool.report(address, True, latency, worker)
+                    self.telemetry.observe_request(url, r.status, latency, len(body))
+                    return body
+        finally:
+            if self.proxy_pool is not None:
+                self.proxy_pool.release(worker)
+
+    async def download(self, url: str, path: str, headers: Optional[Dict[str, str]] = None,
+                       reject_content_types: tuple = ()) -> int:
+        """
+        Stream the body of url into path and return its size.
+
+        The body is written to ``path + ".part"`` and renamed once complete, so an interrupted
+        download never leaves a truncated file behind. Raises on HTTP errors and on a
+        Content-Type listed in reject_content_types.
+        """
+        part_path = f"{path}.part"
+        size = 0
+        status = None
+        start = time.monotonic()
+        try:
+            async with self.semaphore:
+                start = time.monotonic()
+                async with self.session.get(url, headers=headers) as r:
+                    status = r.status
+                    r.raise_for_status()
+                    if r.content_type in reject_content_types:
+                        raise ValueError(f"Rejected Content-Type {r.content_type}")
+                    # Chunks are small, writing them from the event loop costs less than a thread hop
+                    with open(part_path, "wb") as file:
+                        async for chunk in r.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                            file.write(chunk)
+                            size += len(chunk)
+            os.replace(part_path, path)
+        except BaseException as e:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+            if isinstance(e, Exception):
+                self.telemetry.observe_request(url, status or self.retry_policy.classify(e), time.monotonic() - start)
+            raise
+        self.telemetry.observe_request(url, status, time.monotonic() - start, size)
+        return size
+
+    async def close(self) -> None:
+        if self.proxy_pool is not None:
+            # Joins the refill thread, keep the event loop running meanwhile
+            await asyncio.to_thread(self.proxy_pool.close)
+            self.proxy_pool = None
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
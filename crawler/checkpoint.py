@@ -0,0 +1,80 @@
+import json
+import os
+from typing import Any, Dict, Optional, Set
+
+__all__ = [
+            "CHECKPOINT_SUFFIX",
+            "checkpoint_path",
+            "CrawlCheckpoint"
+]
+
+CHECKPOINT_SUFFIX = ".crawl.json"
+
+
+def checkpoint_path(output_filename: str) -> str:
+    """Return the sidecar file that holds the crawl state of an output file."""
+    return f"{output_filename}{CHECKPOINT_SUFFIX}"
+
+
+class CrawlCheckpoint:
+    """
+    Progress of a paginated crawl, kept in a small JSON file next to its output.
+
+    Records the query, the pages already saved, the page count and the saver's row count
+    after the last saved page. A page is marked done only after its rows were flushed, so
+    a run interrupted at any point resumes with the first page that is not safely on disk.
+    ``verify`` checks the recorded row count against the output on resume: a run stopped
+    between flushing a page and marking it leaves extra rows, which the saver's key column
+    drops when that page is saved again; an output with fewer rows than recorded no longer
+    holds the saved pages, and the crawl starts over. State left by a different query is
+    discarded; ``finish`` removes the file once the crawl is complete.
+    """
+
+    def __init__(self, path: str, query: Dict[str, Any]):
+        self.path = path
+        self.query = query
+        self.completed: Set[int] = set()
+        self.max_page: Optional[int] = None
+        self.rows = 0
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as file:
+                state = json.load(file)
+            if state["query"] == query:
+                self.completed = set(state["completed"])
+                self.max_page = state["max_page"]
+                self.rows = state["rows"]
+
+    @property
+    def resumed(self) -> bool:
+        return bool(self.completed)
+
+    def reset(self) -> None:
+        self.completed = set()
+        self.max_page = None
+        self.rows = 0
+
+    def verify(self, rows: int) -> bool:
+        """Check the saver's current row count against the checkpoint; reset it and return False if rows are missing."""
+        if rows < self.rows:
+            self.reset()
+            return False
+        return True
+
+    def is_done(self, page: int) -> bool:
+        return page in self.completed
+
+    def mark_done(self, page: int, rows: int) -> None:
+        """Record page as saved, rows being the saver's row count after flushing it."""
+        self.completed.add(page)
+        self.rows = rows
+        self.save()
+
+    def save(self) -> None:
+        state = dict(query=self.query, completed=sorted(self.completed), max_page=self.max_page, rows=self.rows)
+        with open(f"{self.path}.tmp", "w", encoding="utf-8") as file:
+            json.dump(state, file, ensure_ascii=False)
+        os.replace(f"{self.path}.tmp", self.path)
+
+    def finish(self) -> None:
+        if os.path.exists(self.path):
+            os.remove(self.path)
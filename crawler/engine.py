@@ -0,0 +1,175 @@
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.hooks import dispatch_hook
+
+from crawler import *
+from crawler.httpcache import CachedResponse, ResponseCache, cache_key
+from crawler.proxypool import DEFAULT_PROXY_POOL_SIZE, ProxyPool
+from crawler.retry import OTHER, PROXY_ERRORS, RetryBudget, RetryPolicy
+from crawler.scheduler import HostScheduler
+from crawler.telemetry import Telemetry
+
+__all__ = [
+            "FetchEngine"
+]
+
+
+class FetchEngine:
+    """
+    Fetch engine shared by the spiders' worker threads.
+
+    One session is shared by all workers. Its HTTPAdapter keeps a keep-alive pool of
+    ``concurrency`` connections per host for up to ``pool_hosts`` hosts, and a worker waits
+    for a free connection instead of opening (and later discarding) an extra one. Every
+    request gets explicit (connect, read) timeouts.
+
+    With a ``proxy_url``, proxies come from a ProxyPool that is refilled in the background:
+    every worker keeps its own proxy, and a failing proxy only moves the worker that hit it
+    on to another one. Without a pooled proxy it uses ``proxy``.
+
+    ``fetch`` retries failed requests as ``retry_policy`` decides: with jittered exponential
+    backoff, never on a 4xx other than 408/429, and only while the engine's retry budget
+    lasts. Pass the same policy to several engines to share one budget across a crawl.
+    With a ``scheduler``, every attempt first waits for its host's rate and concurrency
+    limits, which adapt to the latencies and errors the attempts report back.
+
+    With a ``cache``, a fresh cached response is returned without a request, and a stale
+    one is revalidated with If-None-Match / If-Modified-Since.
+
+    Every attempt, retry, proxy swap and cache hit is recorded on ``telemetry``.
+    """
+
+    def __init__(self,
+                 *,
+                 headers: Optional[Dict[str, str]] = None,
+                 cookies: Optional[Dict[str, str]] = None,
+                 proxy: Optional[Dict[str, str]] = None,
+                 proxy_url: Optional[str] = None,
+                 concurrency: int = DEFAULT_CONCURRENCY,
+                 pool_hosts: int = DEFAULT_POOL_HOSTS,
+                 connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout: float = DEFAULT_READ_TIMEOUT,
+                 max_retries: int = DEFAULT_MAX_RETRIES,
+                 retry_policy: Optional[RetryPolicy] = None,
+                 scheduler: Optional[HostScheduler] = None,
+                 cache: Optional[ResponseCache] = None,
+                 telemetry: Optional[Telemetry] = None,
+                 proxy_pool_size: int = DEFAULT_PROXY_POOL_SIZE,
+                 proxy_retry_delay: float = 1,
+                 session_class: Callable[[], requests.Session] = requests.Session):
+        self.headers = headers
+        self.cookies = cookies
+        self.proxy = proxy
+        self.concurrency = concurrency
+        self.timeout: Tuple[float, float] = (connect_timeout, read_timeout)
+        self.retry_policy = retry_policy or RetryPolicy(max_retries, budget=RetryBudget())
+        self.scheduler = scheduler
+        self.cache = cache
+        self.telemetry = telemetry if telemetry is not None else Telemetry()
+        self.session = session_class()
+        adapter = HTTPAdapter(pool_connections=pool_hosts, pool_maxsize=concurrency, pool_block=True)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.proxy_pool: Optional[ProxyPool] = None
+        if proxy_url:
+            self.proxy_pool = ProxyPool(proxy_url, size=proxy_pool_size, refill_delay=proxy_retry_delay,
+                                        acquire_timeout=connect_timeout + read_timeout, timeout=read_timeout,
+                                        telemetry=self.telemetry)
+
+    def __enter__(self) -> "FetchEngine":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def get(self, url: str, **kwargs: Any) -> requests.Response:
+        """Plain GET through the pooled session, with the engine's timeouts unless given."""
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.get(url, **kwargs)
+
+    def _cached_response(self, entry: CachedResponse) -> requests.Response:
+        # Session hooks turn it into the session's response type, e.g. HTMLResponse
+        return dispatch_hook("response", self.session.hooks, entry.to_response())
+
+    def _make_request(self, url: str, proxies: Optional[Dict[str, str]], params: Optional[Dict[str, Any]],
+                      extra_headers: Optional[Dict[str, str]] = None) -> requests.Response:
+        limiter = self.scheduler.acquire(url) if self.scheduler else None
+        start = time.monotonic()
+        kind = OTHER
+        r = None
+        try:
+            headers = {**(self.headers or {}), **extra_headers} if extra_headers else self.headers
+            r = self.get(url, headers=headers, proxies=proxies, cookies=self.cookies, params=params)
+            r.raise_for_status()
+            kind = None
+            return r
+        except Exception as e:
+            kind = self.retry_policy.classify(e)
+            raise
+        finally:
+            latency = time.monotonic() - start
+            if limiter is not None:
+                limiter.release(latency, kind)
+            if r is not None:
+                self.telemetry.observe_request(url, r.status_code, latency, len(r.content))
+            else:
+                self.telemetry.observe_request(url, kind, latency)
+
+    def fetch(self, url: str, params: Optional[Dict[str, Any]] = None,
+              max_retries: Optional[int] = None) -> requests.Response:
+        """Makes an HTTP request and returns the response, retrying failures with backoff."""
+        key = entry = validators = None
+        if self.cache is not None:
+            key = cache_key(url, params)
+            entry = self.cache.get(key)
+            if entry is not None:
+                if self.cache.is_fresh(entry):
+                    self.telemetry.inc("cache_hits_total")
+                    return self._cached_response(entry)
+                validators = self.cache.conditional_headers(entry)
+        policy = self.retry_policy
+        policy.record_request()
+        retries = 0
+        while True:
+            address = self.proxy_pool.acquire() if self.proxy_pool is not None else None
+            proxies = proxy_dict(address) if address else self.proxy
+            start = time.monotonic()
+            try:
+                r = self._make_request(url, proxies, params, validators)
+            except Exception as e:
+                kind = policy.classify(e)
+                if address:
+                    # A failure moves this worker to another proxy unless the origin is to blame
+                    self.proxy_pool.report(address, kind not in PROXY_ERRORS, time.monotonic() - start)
+                    if kind in PROXY_ERRORS:
+                        self.telemetry.inc("proxy_swaps_total")
+                print(f"Error fetching {url} with params:{params} using {proxies}. Error: {e}")
+                host = urlsplit(url).netloc
+                if not policy.should_retry(kind, retries, max_retries):
+                    self.telemetry.inc("failures_total", host=host, kind=kind)
+                    raise Exception(f"Giving up on URL: {url} with params:{params} "
+                                    f"after {retries} retries ({kind}).") from e
+                self.telemetry.inc("retries_total", host=host, kind=kind)
+                time.sleep(policy.backoff(retries, e))
+                retries += 1
+            else:
+                if address:
+                    self.proxy_pool.report(address, True, time.monotonic() - start)
+                if self.cache is not None:
+                    if r.status_code == 304 and entry is not None:
+                        self.cache.renew(key)
+                        self.telemetry.inc("cache_revalidations_total")
+                        return self._cached_response(entry)
+                    self.cache.put(key, r)
+                return r
+
+    def close(self) -> None:
+        if self.cache is not None:
+            self.cache.close()
+        if self.proxy_pool is not None:
+            self.proxy_pool.close()
+        self.session.close()
@@ -0,0 +1,137 @@
+import math
+import sqlite3
+import threading
+from typing import Any, Dict, Optional, Set
+
+from crawler.httpcache import cache_key
+
+__all__ = [
+            "FRONTIER_FILENAME",
+            "DEFAULT_FRONTIER_CAPACITY",
+            "BloomFilter",
+            "UrlFrontier"
+]
+
+# Default file name of a frontier kept next to a spider's output
+FRONTIER_FILENAME = ".frontier.sqlite"
+DEFAULT_FRONTIER_CAPACITY = 1000000
+DEFAULT_FALSE_POSITIVE_RATE = 0.001
+# Fetched keys are inserted in batches of this size
+FRONTIER_COMMIT_EVERY = 1000
+
+
+class BloomFilter:
+    """
+    Bit-array Bloom filter over hex digests (e.g. from cache_key).
+
+    Sized for ``capacity`` keys at ``error_rate`` false positives; the k bit positions are
+    derived from two 64-bit slices of the digest, so adding a key costs no extra hashing.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = DEFAULT_FALSE_POSITIVE_RATE, bits: Optional[bytes] = None):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray(bits) if bits is not None else bytearray((self.size + 7) // 8)
+
+    def _positions(self, digest: str):
+        h1 = int(digest[:16], 16)
+        h2 = int(digest[16:32], 16) | 1
+        for i in range(self.hash_count):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, digest: str) -> None:
+        for position in self._positions(digest):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, digest: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(digest))
+
+
+class UrlFrontier:
+    """
+    Record of the URLs (with their params) already fetched, kept across runs.
+
+    Membership is answered by an in-memory BloomFilter; only keys it may contain are
+    looked up in the on-disk SQLite set at ``path``, so a new URL never costs a disk read.
+    ``claim`` also tracks the URLs being fetched in this run, so concurrent workers do not
+    fetch the same one twice. Call ``done`` once a URL was fetched and saved and
+    ``release`` when fetching it failed, so that a later run tries it again.
+    """
+
+    def __init__(self, path: str, capacity: int = DEFAULT_FRONTIER_CAPACITY,
+                 error_rate: float = DEFAULT_FALSE_POSITIVE_RATE):
+        self.path = path
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS fetched (key TEXT PRIMARY KEY)")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value)")
+        self.count = self.connection.execute("SELECT COUNT(*) FROM fetched").fetchone()[0]
+        self.claimed: Set[str] = set()
+        self.pending = 0
+        self.skipped_count = 0
+        self._lock = threading.Lock()
+        self.bloom = self._load_bloom(max(capacity, 2 * self.count), error_rate)
+
+    def _load_bloom(self, capacity: int, error_rate: float) -> BloomFilter:
+        meta = dict(self.connection.execute("SELECT name, value FROM meta").fetchall())
+        if (meta.get("count") == self.count and meta.get("error_rate") == error_rate
+                and meta.get("capacity", 0) >= capacity):
+            return BloomFilter(meta["capacity"], error_rate, meta["bits"])
+        # Missing or out of date (e.g. after a crash), rebuild it from the set
+        bloom = BloomFilter(capacity, error_rate)
+        for key, in self.connection.execute("SELECT key FROM fetched"):
+            bloom.add(key)
+        return bloom
+
+    def _is_fetched(self, key: str) -> bool:
+        if key not in self.bloom:
+            return False
+        return self.connection.execute("SELECT 1 FROM fetched WHERE key = ?", (key,)).fetchone() is not None
+
+    def __contains__(self, url: str) -> bool:
+        with self._lock:
+            return self._is_fetched(cache_key(url))
+
+    def claim(self, url: str, params: Optional[Dict[str, Any]] = None) -> bool:
+        """Return True if url should be fetched: not fetched in any run and not claimed in this one."""
+        key = cache_key(url, params)
+        with self._lock:
+            if key in self.claimed or self._is_fetched(key):
+                self.skipped_count += 1
+                return False
+            self.claimed.add(key)
+            return True
+
+    def done(self, url: str, params: Optional[Dict[str, Any]] = None) -> None:
+        key = cache_key(url, params)
+        with self._lock:
+            self.claimed.discard(key)
+            if self._is_fetched(key):
+                return
+            self.connection.execute("INSERT INTO fetched VALUES (?)", (key,))
+            self.bloom.add(key)
+            self.count += 1
+            self.pending += 1
+            if self.pending >= FRONTIER_COMMIT_EVERY:
+                self._commit()
+
+    def release(self, url: str, params: Optional[Dict[str, Any]] = None) -> None:
+        with self._lock:
+            self.claimed.discard(cache_key(url, params))
+
+    def _commit(self) -> None:
+        self.connection.commit()
+        self.pending = 0
+
+    def flush(self) -> None:
+        with self._lock:
+            self._commit()
+
+    def close(self) -> None:
+        with self._lock:
+            meta = dict(count=self.count, capacity=self.bloom.capacity, error_rate=self.bloom.error_rate,
+                        bits=bytes(self.bloom.bits))
+            self.connection.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)", meta.items())
+            self._commit()
+            self.connection.close()
@@ -0,0 +1,191 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Dict, NamedTuple, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+__all__ = [
+            "DEFAULT_CACHE_TTL",
+            "DEFAULT_CACHE_MAX_BYTES",
+            "cache_key",
+            "CachedResponse",
+            "ResponseCache"
+]
+
+DEFAULT_CACHE_TTL = 24 * 3600
+DEFAULT_CACHE_MAX_BYTES = 512 * 1024 * 1024
+# The body is stored decoded, so these no longer describe it
+_DROPPED_HEADERS = ("content-encoding", "content-length", "transfer-encoding")
+
+
+def cache_key(url: str, params: Optional[Dict[str, Any]] = None) -> str:
+    """Hash of the URL with params merged into its query string in sorted order."""
+    parts = urlsplit(url)
+    query = parse_qsl(parts.query, keep_blank_values=True)
+    if params:
+        query.extend((str(k), str(v)) for k, v in params.items() if v is not None)
+    normalized = urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path or "/",
+                             urlencode(sorted(query)), ""))
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+class CachedResponse(NamedTuple):
+    key: str
+    url: str
+    status: int
+    headers: Dict[str, str]
+    etag: Optional[str]
+    last_modified: Optional[str]
+    stored_at: float
+    body: bytes
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.stored_at
+
+    def to_response(self) -> requests.Response:
+        response = requests.Response()
+        response.status_code = self.status
+        response.reason = "OK"
+        response.url = self.url
+        response.headers = CaseInsensitiveDict(self.headers)
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response._content = self.body
+        response.from_cache = True
+        return response
+
+
+class ResponseCache:
+    """
+    On-disk cache of successful GET responses, shared by an engine's worker threads.
+
+    Bodies are zlib-compressed files under ``directory``; an SQLite index holds their
+    headers, validators and timestamps. An entry younger than ``ttl`` seconds is served
+    without touching the network; an older one that carries an ETag or Last-Modified is
+    revalidated with a conditional request, and a 304 renews it. Once the bodies exceed
+    ``max_bytes``, the least recently used entries are dropped.
+    """
+
+    INDEX_FILENAME = "index.sqlite"
+
+    def __init__(self, directory: str, ttl: Optional[float] = DEFAULT_CACHE_TTL,
+                 max_bytes: int = DEFAULT_CACHE_MAX_BYTES, compress_level: int = 6):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.compress_level = compress_level
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(os.path.join(directory, self.INDEX_FILENAME), check_same_thread=False)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, url TEXT, status INTEGER, headers TEXT, "
+            "etag TEXT, last_modified TEXT, stored_at REAL, accessed_at REAL, size INTEGER)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed_at)")
+        self.connection.commit()
+        self.total_bytes = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def _body_path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.z")
+
+    def is_fresh(self, entry: CachedResponse) -> bool:
+        return self.ttl is None or entry.age < self.ttl
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT url, status, headers, etag, last_modified, stored_at FROM entries WHERE key = ?",
+                (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            try:
+                with open(self._body_path(key), "rb") as file:
+                    body = zlib.decompress(file.read())
+            except (OSError, zlib.error):
+                # Body lost or truncated, forget the entry
+                self._delete(key)
+                self.connection.commit()
+                self.misses += 1
+                return None
+            self.connection.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (time.time(), key))
+            self.connection.commit()
+            url, status, headers, etag, last_modified, stored_at = row
+            entry = CachedResponse(key, url, status, json.loads(headers), etag, last_modified, stored_at, body)
+            if self.is_fresh(entry):
+                self.hits += 1
+            else:
+                self.misses += 1
+        return entry
+
+    def conditional_headers(self, entry: CachedResponse) -> Dict[str, str]:
+        headers = {}
+        if entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+        return headers
+
+    def put(self, key: str, response: requests.Response) -> None:
+        """Store a 200 response unless the server asked not to."""
+        if response.status_code != 200 or "no-store" in response.headers.get("Cache-Control", ""):
+            return
+        data = zlib.compress(response.content, self.compress_level)
+        headers = {k: v for k, v in response.headers.items() if k.lower() not in _DROPPED_HEADERS}
+        path = self._body_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Written aside and renamed, so a reader never sees a partial body
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as file:
+            file.write(data)
+        now = time.time()
+        with self._lock:
+            os.replace(temp_path, path)
+            old = self.connection.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            self.total_bytes += len(data) - (old[0] if old else 0)
+            self.connection.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, response.url, response.status_code, json.dumps(headers), response.headers.get("ETag"),
+                 response.headers.get("Last-Modified"), now, now, len(data)))
+            self._evict()
+            self.connection.commit()
+
+    def renew(self, key: str) -> None:
+        """Mark an entry fresh again after the server answered 304 Not Modified."""
+        now = time.time()
+        with self._lock:
+            self.revalidated += 1
+            self.connection.execute("UPDATE entries SET stored_at = ?, accessed_at = ? WHERE key = ?", (now, now, key))
+            self.connection.commit()
+
+    def _delete(self, key: str) -> None:
+        row = self.connection.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return
+        self.connection.execute("DELETE FROM entries WHERE key = ?", (key,))
+        self.total_bytes -= row[0]
+        try:
+            os.remove(self._body_path(key))
+        except OSError:
+            pass
+
+    def _evict(self) -> None:
+        if self.total_bytes <= self.max_bytes:
+            return
+        for key, in self.connection.execute("SELECT key FROM entries ORDER BY accessed_at").fetchall():
+            if self.total_bytes <= self.max_bytes:
+                break
+            self._delete(key)
+
+    def close(self) -> None:
+        with self._lock:
+            self.connection.close()
@@ -0,0 +1,207 @@
+import threading
+import time
+from typing import Dict, Hashable, List, Optional, Set
+
+import requests
+
+from crawler import *
+from crawler.telemetry import Telemetry
+
+__all__ = [
+            "DEFAULT_PROXY_POOL_SIZE",
+            "ProxyStats",
+            "ProxyPool"
+]
+
+# Proxies kept ready in the pool, one per worker is enough for the default concurrency
+DEFAULT_PROXY_POOL_SIZE = DEFAULT_CONCURRENCY
+# Weight of the latest request in the success rate and latency averages
+HEALTH_SMOOTHING = 0.3
+
+
+class ProxyStats:
+    """Health of one proxy: smoothed success rate and latency, and consecutive failures."""
+
+    __slots__ = ("address", "success_rate", "latency", "requests", "consecutive_failures", "assigned")
+
+    def __init__(self, address: str):
+        self.address = address
+        self.success_rate = 1.0
+        self.latency = 0.0
+        self.requests = 0
+        self.consecutive_failures = 0
+        # Workers currently using this proxy
+        self.assigned = 0
+
+    def record(self, success: bool, latency: float) -> None:
+        self.requests += 1
+        self.success_rate += HEALTH_SMOOTHING * (float(success) - self.success_rate)
+        if success:
+            self.consecutive_failures = 0
+            self.latency = latency if self.requests == 1 else self.latency + HEALTH_SMOOTHING * (latency - self.latency)
+        else:
+            self.consecutive_failures += 1
+
+    @property
+    def score(self) -> float:
+        """Higher is better: success rate discounted by latency in seconds."""
+        return self.success_rate / (1.0 + self.latency)
+
+
+class ProxyPool:
+    """
+    Pool of proxies pulled from ``proxy_url`` and shared by an engine's worker threads.
+
+    A background thread keeps ``size`` proxies ready, so a worker never waits on the proxy
+    API while the pool is stocked. Each worker sticks to the proxy it was assigned (the
+    healthiest, least shared one) until a request through it fails; then only that worker
+    moves on. Every request is reported back with its outcome and latency, and a proxy is
+    evicted after ``max_failures`` consecutive failures or once its smoothed success rate
+    drops below ``min_success_rate``; the background thread then refills the pool.
+    """
+
+    def __init__(self,
+                 proxy_url: str,
+                 *,
+                 size: int = DEFAULT_PROXY_POOL_SIZE,
+                 max_failures: int = 3,
+                 min_success_rate: float = 0.5,
+                 min_requests: int = 5,
+                 acquire_timeout: float = DEFAULT_CONNECT_TIMEOUT + DEFAULT_READ_TIMEOUT,
+                 refill_delay: float = 1,
+                 timeout: float = DEFAULT_READ_TIMEOUT,
+                 telemetry: Optional[Telemetry] = None):
+        self.proxy_url = proxy_url
+        self.size = size
+        self.max_failures = max_failures
+        self.min_success_rate = min_success_rate
+        self.min_requests = min_requests
+        self.acquire_timeout = acquire_timeout
+        self.refill_delay = refill_delay
+        self.timeout = timeout
+        self.telemetry = telemetry if telemetry is not None else Telemetry()
+        self.proxies: Dict[str, ProxyStats] = {}
+        self.assignments: Dict[Hashable, str] = {}
+        # Addresses evicted once are not taken back from the proxy API
+        self.evicted: Set[str] = set()
+        self.session = requests.Session()
+        self._condition = threading.Condition()
+        self._closed = False
+        self._refill_thread = threading.Thread(target=self._refill_loop, name="proxy-pool-refill", daemon=True)
+        self._refill_thread.start()
+
+    def __len__(self) -> int:
+        with self._condition:
+            return len(self.proxies)
+
+    def _fetch_addresses(self) -> List[str]:
+        response = self.session.get(self.proxy_url, timeout=self.timeout).json()
+        return [f'{entry["ip"]}:{entry["port"]}' for entry in response["RESULT"]]
+
+    def _refill_loop(self) -> None:
+        while True:
+            with self._condition:
+                while not self._closed and len(self.proxies) >= self.size:
+                    self._condition.wait()
+                if self._closed:
+                    return
+            try:
+                addresses = self._fetch_addresses()
+            except Exception as e:
+                print(f"Error fetching proxy. Error: {e}")
+                print("." * 30 + "Attempting to update proxy" + "." * 30)
+                addresses = []
+            with self._condition:
+                for address in addresses:
+                    if address not in self.proxies and address not in self.evicted and len(self.proxies) < self.size:
+                        self.proxies[address] = ProxyStats(address)
+                        self.telemetry.inc("proxy_refills_total")
+                if addresses:
+                    print("=" * 30 + f"Proxy pool refilled ({len(self.proxies)}/{self.size})" + "=" * 30)
+                    self._condition.notify_all()
+                    continue
+                # Back off before asking the proxy API again
+                self._condition.wait(self.refill_delay)
+
+    def acquire(self, worker: Optional[Hashable] = None, timeout: Optional[float] = None) -> Optional[str]:
+        """
+        Return the proxy address assigned to worker (the calling thread by default).
+
+        Waits up to timeout (acquire_timeout by default) for the pool to be refilled and
+        returns None if it is still empty, in which case the caller goes without a pooled proxy.
+        """
+        if worker is None:
+            worker = threading.get_ident()
+        with self._condition:
+            address = self.assignments.get(worker)
+            if address in self.proxies:
+                current = self.proxies[address]
+                least_shared = min(self.proxies.values(), key=lambda s: s.assigned)
+                # Spread workers over proxies that arrived after they were assigned
+                if current.assigned - least_shared.assigned <= 1:
+                    return address
+                current.assigned -= 1
+            deadline = time.monotonic() + (self.acquire_timeout if timeout is None else timeout)
+            while not self.proxies:
+                remaining = deadline - time.monotonic()
+                if self._closed or remaining <= 0:
+                    self.assignments.pop(worker, None)
+                    return None
+                self._condition.wait(remaining)
+            stats = min(self.proxies.values(), key=lambda s: (s.assigned, -s.score))
+            stats.assigned += 1
+            self.assignments[worker] = stats.address
+            return stats.address
+
+    def report(self, address: str, success: bool, latency: float, worker: Optional[Hashable] = None) -> None:
+        """Record the outcome of a request through address; a failure also unassigns it from worker."""
+        if worker is None:
+            worker = threading.get_ident()
+        with self._condition:
+            stats = self.proxies.get(address)
+            if stats is None:
+                # Already evicted after another worker's failures
+                if not success and self.assignments.get(worker) == address:
+                    del self.assignments[worker]
+                return
+            stats.record(success, latency)
+            if success:
+                return
+            if self.assignments.get(worker) == address:
+                del self.assignments[worker]
+                stats.assigned -= 1
+            if (stats.consecutive_failures >= self.max_failures
+                    or (stats.requests >= self.min_requests and stats.success_rate < self.min_success_rate)):
+                self._evict(stats)
+
+    def release(self, worker: Optional[Hashable] = None) -> None:
+        """Unassign worker's proxy, for workers that do not outlive their request (e.g. asyncio tasks)."""
+        if worker is None:
+            worker = threading.get_ident()
+        with self._condition:
+            address = self.assignments.pop(worker, None)
+            stats = self.proxies.get(address)
+            if stats is not None:
+                stats.assigned -= 1
+
+    def _evict(self, stats: ProxyStats) -> None:
+        del self.proxies[stats.address]
+        self.evicted.add(stats.address)
+        self.telemetry.inc("proxy_evictions_total")
+        print(f"Evicted proxy {stats.address} (success rate {stats.success_rate:.2f})")
+        # Wake the refill thread
+        self._condition.notify_all()
+
+    def snapshot(self) -> List[Dict[str, object]]:
+        """Per-proxy health, healthiest first."""
+        with self._condition:
+            stats = sorted(self.proxies.values(), key=lambda s: -s.score)
+            return [dict(address=s.address, success_rate=s.success_rate, latency=s.latency,
+                         requests=s.requests, assigned=s.assigned) for s in stats]
+
+    def close(self) -> None:
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._refill_thread.join(self.timeout)
+        self.session.close()
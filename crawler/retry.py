@@ -0,0 +1,170 @@
+import asyncio
+import email.utils
+import random
+import threading
+import time
+from typing import Any, Optional
+
+import requests
+
+from crawler import *
+
+__all__ = [
+            "TIMEOUT",
+            "CONNECTION",
+            "THROTTLED",
+            "SERVER_ERROR",
+            "CLIENT_ERROR",
+            "OTHER",
+            "PROXY_ERRORS",
+            "RetryBudget",
+            "RetryPolicy"
+]
+
+# Error classes returned by RetryPolicy.classify
+TIMEOUT = "timeout"
+CONNECTION = "connection"
+THROTTLED = "throttled"
+SERVER_ERROR = "server_error"
+CLIENT_ERROR = "client_error"
+OTHER = "other"
+
+# Errors that say something about the proxy rather than the origin; a 5xx or 404 came back
+# through a working proxy
+PROXY_ERRORS = frozenset((TIMEOUT, CONNECTION, THROTTLED))
+
+
+class RetryBudget:
+    """
+    Crawl-wide cap on retries, shared by every worker (and every engine) it is passed to.
+
+    Each first attempt deposits ``ratio`` of a retry and each retry withdraws a whole one,
+    so retries stay below about ``ratio`` of the traffic; ``min_per_second`` more are
+    allowed regardless, so a slow crawl can still retry. When the budget is spent, a
+    failing request gives up instead of adding load to an upstream that is already failing.
+    """
+
+    def __init__(self, ratio: float = 0.2, min_per_second: float = 1.0, max_balance: float = 100.0):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_balance = max_balance
+        self.balance = max_balance
+        self.requests = 0
+        self.retries = 0
+        self.denied = 0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, amount: float) -> None:
+        now = time.monotonic()
+        amount += (now - self._updated) * self.min_per_second
+        self._updated = now
+        self.balance = min(self.max_balance, self.balance + amount)
+
+    def record_request(self) -> None:
+        with self._lock:
+            self.requests += 1
+            self._refill(self.ratio)
+
+    def try_withdraw(self) -> bool:
+        """Take one retry from the budget; False if none is left."""
+        with self._lock:
+            self._refill(0.0)
+            if self.balance < 1.0:
+                self.denied += 1
+                return False
+            self.balance -= 1.0
+            self.retries += 1
+            return True
+
+
+class RetryPolicy:
+    """
+    Decides whether and when a failed request is retried.
+
+    Errors are classified as timeouts, connection errors, throttling (429), server errors
+    (5xx), client errors (other 4xx, never retried) and anything else. The n-th retry
+    waits a random time between 0 and ``base_delay * 2 ** n`` capped at ``max_delay``
+    ("full jitter"), so workers that failed together do not retry together; a
+    ``Retry-After`` header is honoured up to ``max_retry_after``. Retries also draw from
+    ``budget`` when one is given.
+    """
+
+    def __init__(self,
+                 max_retries: int = DEFAULT_MAX_RETRIES,
+                 base_delay: float = 0.5,
+                 max_delay: float = 30.0,
+                 max_retry_after: float = 120.0,
+                 budget: Optional[RetryBudget] = None):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+        self.budget = budget
+
+    @staticmethod
+    def _response(error: BaseException) -> Any:
+        return getattr(error, "response", None)
+
+    @staticmethod
+    def _status(error: BaseException) -> Optional[int]:
+        response = getattr(error, "response", None)
+        status = getattr(response, "status_code", None)
+        if status is None:
+            # aiohttp.ClientResponseError carries the status itself
+            status = getattr(error, "status", None)
+        return status
+
+    def classify(self, error: BaseException) -> str:
+        status = self._status(error)
+        if status is not None:
+            if status == 429:
+                return THROTTLED
+            if status >= 500:
+                return SERVER_ERROR
+            if status == 408:
+                return TIMEOUT
+            if status >= 400:
+                return CLIENT_ERROR
+        if isinstance(error, (requests.Timeout, asyncio.TimeoutError, TimeoutError)):
+            return TIMEOUT
+        if isinstance(error, (requests.ConnectionError, ConnectionError)):
+            return CONNECTION
+        if type(error).__name__ in ("ClientConnectionError", "ClientConnectorError", "ServerDisconnectedError",
+                                    "ClientProxyConnectionError", "ClientOSError"):
+            return CONNECTION
+        return OTHER
+
+    def retry_after(self, error: BaseException) -> Optional[float]:
+        """Seconds requested by a Retry-After header (delta-seconds or HTTP date), if any."""
+        headers = getattr(self._response(error), "headers", None) or getattr(error, "headers", None)
+        value = headers.get("Retry-After") if headers else None
+        if not value:
+            return None
+        try:
+            seconds = float(value)
+        except ValueError:
+            try:
+                seconds = email.utils.parsedate_to_datetime(value).timestamp() - time.time()
+            except (TypeError, ValueError):
+                return None
+        return min(max(seconds, 0.0), self.max_retry_after)
+
+    def should_retry(self, kind: str, retries: int, max_retries: Optional[int] = None) -> bool:
+        """retries is the number of retries already made for this request."""
+        if max_retries is None:
+            max_retries = self.max_retries
+        if kind == CLIENT_ERROR or retries >= max_retries:
+            return False
+        return self.budget is None or self.budget.try_withdraw()
+
+    def backoff(self, retries: int, error: Optional[BaseException] = None) -> float:
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** retries))
+        retry_after = self.retry_after(error) if error is not None else None
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    def record_request(self) -> None:
+        if self.budget is not None:
+            self.budget.record_request()
@@ -0,0 +1,157 @@
+import threading
+import time
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+from crawler import *
+from crawler.retry import SERVER_ERROR, THROTTLED, TIMEOUT
+
+__all__ = [
+            "DEFAULT_MAX_CONCURRENCY",
+            "DEFAULT_RATE",
+            "HostLimiter",
+            "HostScheduler"
+]
+
+# Upper bound for the adaptive concurrency, the spiders size their thread pools to it
+DEFAULT_MAX_CONCURRENCY = 32
+# Starting request rate per host, in requests per second
+DEFAULT_RATE = 10.0
+# Failures that mean the origin is overloaded or throttling us
+CONGESTION_ERRORS = frozenset((THROTTLED, TIMEOUT, SERVER_ERROR))
+
+
+class HostLimiter:
+    """
+    Token bucket and adaptive concurrency limit for the requests to one host.
+
+    ``acquire`` waits for a token (refilled at ``rate`` per second, at most ``burst`` saved)
+    and for one of ``limit`` concurrency slots. Both adapt with AIMD: every successful
+    request whose latency stays within ``latency_tolerance`` times the best recent latency
+    adds ``1 / limit`` to the limit, i.e. about one more request in flight per round trip,
+    and the rate grows by ``rate_step`` per round trip; a 429, timeout or 5xx multiplies
+    both by ``decrease``, at most once per round trip.
+    """
+
+    def __init__(self,
+                 concurrency: int = DEFAULT_CONCURRENCY,
+                 max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                 min_concurrency: int = 1,
+                 rate: float = DEFAULT_RATE,
+                 max_rate: float = 20 * DEFAULT_RATE,
+                 min_rate: float = 0.2,
+                 rate_step: float = 1.0,
+                 burst: Optional[float] = None,
+                 decrease: float = 0.5,
+                 latency_tolerance: float = 2.0):
+        self.limit = float(min(concurrency, max_concurrency))
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.rate = rate
+        self.max_rate = max_rate
+        self.min_rate = min_rate
+        self.rate_step = rate_step
+        self.burst = burst if burst is not None else float(concurrency)
+        self.decrease = decrease
+        self.latency_tolerance = latency_tolerance
+        self.tokens = self.burst
+        self.in_flight = 0
+        self.base_latency: Optional[float] = None
+        self.successes = 0
+        self.congestion_count = 0
+        self._refilled = time.monotonic()
+        self._last_decrease = 0.0
+        self._last_increase = 0.0
+        self._condition = threading.Condition()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self._refilled) * self.rate)
+        self._refilled = now
+
+    def acquire(self) -> None:
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if self.in_flight < int(self.limit) and self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                    self.in_flight += 1
+                    return
+                if self.in_flight >= int(self.limit):
+                    # Woken by release
+                    self._condition.wait()
+                else:
+                    self._condition.wait((1.0 - self.tokens) / self.rate)
+
+    def release(self, latency: float, kind: Optional[str] = None) -> None:
+        """Free the slot and adapt to the outcome; kind is None for a success, else a retry.py error class."""
+        with self._condition:
+            self.in_flight -= 1
+            if kind is None:
+                self._on_success(latency)
+            elif kind in CONGESTION_ERRORS:
+                self._on_congestion()
+            self._condition.notify_all()
+
+    def _on_success(self, latency: float) -> None:
+        self.successes += 1
+        if self.base_latency is None or latency < self.base_latency:
+            self.base_latency = latency
+        else:
+            # Let the baseline follow a slower network instead of holding the growth forever
+            self.base_latency += 0.01 * (latency - self.base_latency)
+        if latency <= self.base_latency * self.latency_tolerance:
+            self.limit = min(self.max_concurrency, self.limit + 1.0 / self.limit)
+            now = time.monotonic()
+            if now - self._last_increase >= self.base_latency:
+                self._last_increase = now
+                self.rate = min(self.max_rate, self.rate + self.rate_step)
+
+    def _on_congestion(self) -> None:
+        now = time.monotonic()
+        # Requests already in flight report the same congestion, cut once per round trip
+        if now - self._last_decrease < (self.base_latency or 1.0):
+            return
+        self._last_decrease = now
+        self.congestion_count += 1
+        self.limit = max(self.min_concurrency, self.limit * self.decrease)
+        self.rate = max(self.min_rate, self.rate * self.decrease)
+        self.tokens = min(self.tokens, 1.0)
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._condition:
+            return dict(limit=self.limit, rate=self.rate, in_flight=self.in_flight,
+                        successes=self.successes, congestion=self.congestion_count)
+
+
+class HostScheduler:
+    """
+    Gate between the spiders' workers and the network: one HostLimiter per host.
+
+    FetchEngine calls ``acquire(url)`` before every request and ``release`` on the returned
+    limiter afterwards. The thread pool can then be sized for ``max_concurrency`` while the
+    number of requests actually in flight follows what each host sustains.
+    """
+
+    def __init__(self, **limiter_options):
+        self.limiter_options = limiter_options
+        self.limiters: Dict[str, HostLimiter] = {}
+        self._lock = threading.Lock()
+
+    def limiter(self, url: str) -> HostLimiter:
+        host = urlsplit(url).netloc
+        with self._lock:
+            limiter = self.limiters.get(host)
+            if limiter is None:
+                limiter = self.limiters[host] = HostLimiter(**self.limiter_options)
+            return limiter
+
+    def acquire(self, url: str) -> HostLimiter:
+        limiter = self.limiter(url)
+        limiter.acquire()
+        return limiter
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            limiters = dict(self.limiters)
+        return {host: limiter.snapshot() for host, limiter in limiters.items()}
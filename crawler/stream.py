@@ -0,0 +1,56 @@
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, wait
+from typing import Any, Callable, Dict, Iterable, Iterator, Set, Tuple, TypeVar
+
+__all__ = [
+            "iter_completed"
+]
+
+T = TypeVar("T")
+
+
+def iter_completed(executor: Executor, fn: Callable[[T], Any], items: Iterable[T], window: int,
+                   ordered: bool = False) -> Iterator[Tuple[T, Any]]:
+    """
+    Run fn over items on executor and yield (item, result) pairs as the calls complete.
+
+    At most ``window`` items are submitted and not yet yielded at any time, so results do
+    not pile up in memory and items are only taken from ``items`` as the window allows.
+    With ordered=True results are yielded in the order of items; the window then also
+    bounds the finished results held back behind a slow one. An exception raised by fn is
+    re-raised here, and calls that have not started yet are cancelled.
+    """
+    items = iter(items)
+    pending: Set[Future] = set()
+    submitted: Dict[Future, Tuple[int, T]] = {}
+    finished: Dict[int, Tuple[T, Any]] = {}
+    next_index = 0
+    next_to_yield = 0
+    exhausted = False
+    try:
+        while True:
+            while not exhausted and len(pending) + len(finished) < window:
+                try:
+                    item = next(items)
+                except StopIteration:
+                    exhausted = True
+                    break
+                future = executor.submit(fn, item)
+                submitted[future] = (next_index, item)
+                pending.add(future)
+                next_index += 1
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, item = submitted.pop(future)
+                result = future.result()
+                if not ordered:
+                    yield item, result
+                    continue
+                finished[index] = (item, result)
+            while next_to_yield in finished:
+                yield finished.pop(next_to_yield)
+                next_to_yield += 1
+    finally:
+        for future in pending:
+            future.cancel()
@@ -0,0 +1,161 @@
+import bisect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+__all__ = [
+            "LATENCY_BUCKETS",
+            "DEFAULT_EXPORT_SECONDS",
+            "Telemetry"
+]
+
+# Upper bounds in seconds of the histogram buckets, the last one catches everything else
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float("inf"))
+DEFAULT_EXPORT_SECONDS = 15.0
+METRIC_PREFIX = "crawler_"
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Telemetry:
+    """
+    Counters and latency histograms of a crawl, exported to a file while it runs.
+
+    The engines record every request (``request_duration_seconds`` by host and status,
+    ``response_bytes_total``), every retry (``retries_total`` by host and error class) and
+    proxy swaps and evictions; spiders time their parse and save stages with ``timer`` and
+    count ``rows_written_total``. With a ``path``, a background thread rewrites it every
+    ``export_seconds``: as a Prometheus textfile (for node_exporter's textfile collector)
+    when it ends in ``.prom``, as a JSON snapshot otherwise. Without a path nothing is
+    exported and the records only cost a lock.
+    """
+
+    def __init__(self, path: Optional[str] = None, export_seconds: float = DEFAULT_EXPORT_SECONDS,
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.path = path
+        self.export_seconds = export_seconds
+        self.buckets = buckets
+        self.counters: Dict[Tuple[str, Labels], float] = {}
+        # name, labels -> [per-bucket counts, sum, count]
+        self.histograms: Dict[Tuple[str, Labels], List[Any]] = {}
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._export_thread = None
+        if path is not None:
+            self._export_thread = threading.Thread(target=self._export_loop, name="telemetry-export", daemon=True)
+            self._export_thread.start()
+
+    @staticmethod
+    def _labels(labels: Dict[str, Any]) -> Labels:
+        return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    def inc(self, name: str, value: float = 1.0, **labels: Any) -> None:
+        key = (name, self._labels(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        key = (name, self._labels(labels))
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [[0] * len(self.buckets), 0.0, 0]
+            histogram[0][index] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    @contextmanager
+    def timer(self, stage: str) -> Iterator[None]:
+        """Time a block into stage_duration_seconds{stage=...}."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe("stage_duration_seconds", time.perf_counter() - start, stage=stage)
+
+    def observe_request(self, url: str, status: Any, latency: float, size: int = 0) -> None:
+        """Record one HTTP attempt; status is the response code or the error class of a failure."""
+        host = urlsplit(url).netloc
+        self.observe("request_duration_seconds", latency, host=host, status=status)
+        if size:
+            self.inc("response_bytes_total", size, host=host)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self.counters)
+            histograms = {key: (list(counts), total, count) for key, (counts, total, count) in self.histograms.items()}
+        return dict(
+            generated_at=time.time(),
+            uptime_seconds=time.time() - self.started,
+            counters=[dict(name=name, labels=dict(labels), value=value)
+                      for (name, labels), value in sorted(counters.items())],
+            histograms=[dict(name=name, labels=dict(labels), count=count, sum=total,
+                             mean=total / count if count else 0.0,
+                             buckets={"+Inf" if bound == float("inf") else repr(bound): n
+                                      for bound, n in zip(self.buckets, counts)})
+                        for (name, labels), (counts, total, count) in sorted(histograms.items())],
+        )
+
+    @staticmethod
+    def _format_labels(labels: Dict[str, str], **extra: str) -> str:
+        labels = {**labels, **extra}
+        if not labels:
+            return ""
+        escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for value in labels.values())
+        return "{" + ",".join(f'{key}="{value}"' for key, value in zip(labels, escaped)) + "}"
+
+    def to_prometheus(self) -> str:
+        snapshot = self.snapshot()
+        lines = []
+        typed = set()
+        for counter in snapshot["counters"]:
+            name = METRIC_PREFIX + counter["name"]
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name}{self._format_labels(counter['labels'])} {counter['value']:g}")
+        for histogram in snapshot["histograms"]:
+            name = METRIC_PREFIX + histogram["name"]
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} histogram")
+            cumulative = 0
+            for bound, count in histogram["buckets"].items():
+                cumulative += count
+                lines.append(f"{name}_bucket{self._format_labels(histogram['labels'], le=bound)} {cumulative}")
+            labels = self._format_labels(histogram["labels"])
+            lines.append(f"{name}_sum{labels} {histogram['sum']:g}")
+            lines.append(f"{name}_count{labels} {histogram['count']}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, path: Optional[str] = None) -> None:
+        """Write the current metrics to path (default self.path), replacing it atomically."""
+        path = path or self.path
+        if path.endswith(".prom"):
+            content = self.to_prometheus()
+        else:
+            content = json.dumps(self.snapshot(), ensure_ascii=False, indent=2)
+        with open(f"{path}.tmp", "w", encoding="utf-8") as file:
+            file.write(content)
+        os.replace(f"{path}.tmp", path)
+
+    def _export_loop(self) -> None:
+        while not self._stop.wait(self.export_seconds):
+            try:
+                self.export()
+            except OSError as e:
+                print(f"Error exporting telemetry to {self.path}. Error: {e}")
+
+    def close(self) -> None:
+        """Stop the export thread and write the final metrics."""
+        if self._export_thread is not None:
+            self._stop.set()
+            self._export_thread.join()
+            self._export_thread = None
+            self.export()
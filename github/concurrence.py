@@ -1,143 +1,97 @@
-import time
 import traceback
 
 from requests_html import HTMLSession
-from saveexcel.saveitem import ExcelSaver
+from crawler import DEFAULT_CONCURRENCY
+from crawler.engine import FetchEngine
+from crawler.frontier import UrlFrontier
+from crawler.httpcache import ResponseCache
+from crawler.scheduler import DEFAULT_MAX_CONCURRENCY, HostScheduler
+from crawler.stream import iter_completed
+from crawler.telemetry import Telemetry
+from github.searchpage import SearchPageParser, load_selectors
+from saveexcel.progress import WriteProgress, print_progress
+from saveexcel.sinks import open_saver
 from concurrent.futures import ThreadPoolExecutor
 
 
 class Spider:
-    def __init__(self, base_url, *, headers=None, proxy=None, cookies=None, proxy_url=None):
+    def __init__(self, base_url, *, headers=None, proxy=None, cookies=None, proxy_url=None, output_suffix=".xlsx",
+                 concurrency=DEFAULT_CONCURRENCY, max_concurrency=DEFAULT_MAX_CONCURRENCY, cache_dir=None,
+                 ordered=False, frontier_path=None, telemetry_path=None, selectors_path=None):
         self.base_url = base_url
-        self.session = HTMLSession()
-        self.headers = headers
-        self.initial_proxy = proxy
-        self.proxy = proxy
-        self.cookies = cookies
-        self.proxy_url = proxy_url
+        # Selectors of the result page; a JSON file in selectors_path overrides them when GitHub changes its markup
+        self.parser = SearchPageParser(load_selectors(selectors_path))
+        # Exported every few seconds when telemetry_path is given (.prom or .json)
+        self.telemetry = Telemetry(telemetry_path)
+        # With a frontier, result pages fetched by any earlier run are skipped
+        self.frontier = UrlFrontier(frontier_path) if frontier_path else None
+        self.max_concurrency = max_concurrency
+        # Pages are written as they complete; ordered=True keeps them in page order instead
+        self.ordered = ordered
+        # GitHub search enforces abuse limits, start slow and let the scheduler find the sustainable rate
+        scheduler = HostScheduler(concurrency=concurrency, max_concurrency=max_concurrency, rate=2.0)
+        self.engine = FetchEngine(headers=headers, cookies=cookies, proxy=proxy, proxy_url=proxy_url,
+                                  concurrency=max_concurrency, max_retries=3, proxy_retry_delay=5,
+                                  session_class=HTMLSession, scheduler=scheduler,
+                                  cache=ResponseCache(cache_dir) if cache_dir else None,
+                                  telemetry=self.telemetry)
         self.max_page = 100
         self.excel_headers = ["项目名称", "项目地址", "项目描述", "项目标签", "项目语言", "项目stars", "项目更新时间"]
+        # The extension picks the saver: .xlsx/.xls, .csv, .jsonl, .db or .parquet
+        self.output_suffix = output_suffix
         self.excel_saver = None
 
-    def fetch(self, url, max_outer_retries=3, params=None):
-        """Makes an HTTP request and returns the HTML response."""
-
-        def _make_request(proxies):
-            """Helper function to make a request using provided proxy settings."""
-            try:
-                r = self.session.get(
-                    url,
-                    headers=self.headers,
-                    proxies=proxies,
-                    cookies=self.cookies,
-                    params=params,
-                    timeout=6
-                )
-                r.raise_for_status()
-                return r
-            except Exception as e:
-                print(f"Error fetching {url} with params:{params} using {self.proxy}. Error: {e}")
-                return None
-
-        outer_retry_count = 0
-
-        while outer_retry_count <= max_outer_retries:
-            # Try fetching with the current proxy
-            response = _make_request(self.proxy)
-            if response:
-                return response
-
-            # If failed, try updating the proxy and fetching the response 5 times
-            for _ in range(1):
-                print(f"Error fetching {url} with params:{params} using {self.proxy}.")
-                if self.proxy_url:
-                    self._update_proxy()
-                response = _make_request(self.proxy)
-                if response:
-                    return response
-
-            # If all 5 tries failed, revert to the initial proxy
-            self.proxy = self.initial_proxy
-            print("Reverting to initial proxy")
-            outer_retry_count += 1
-
-        raise Exception(f"Reached maximum retry attempts for URL: {url} with params:{params}.")
-
     def parse_first(self, response):
-        max_page = int(response.html.xpath('''//div[@class='application-main']//nav[@aria-label="Pagination"]//a[last()-1]/text()''')[0])
-        self.max_page = max_page
-        data = self.parse(response)
-        return data
+        tree = self.parser.tree(response.content, response.encoding)
+        self.max_page = self.parser.page_count(tree)
+        return self.parser.parse(tree)
 
-    @staticmethod
-    def parse(response):
-        data = []
-        for div in response.html.xpath("//div[@data-testid='results-list']/div"):
-            title = "".join(div.xpath(".//h3//a//text()"))
-            site = "https://github.com" + div.xpath(".//h3//a/@href")[0]
-            description = div.xpath('.//div[@class="Box-sc-g0xbh4-0 LjnbQ"]//text()')
-            description = [d.strip() for d in description]
-            description = "".join(description)
-            topics = div.xpath(".//div[@class = 'Box-sc-g0xbh4-0 frRVAS']//text()")
-            topics = [topic.strip() for topic in topics]
-            topics = str(topics) if topics else "无"
-            language = div.xpath(".//ul/li[last()-2]//text()")
-            language = language[0] if language else "无"
-            stars = div.xpath(".//ul/li[last()-1]//text()")[0]
-            update = div.xpath(".//ul/li[last()]//text()")
-            update = [u.strip() for u in update]
-            update = ' '.join(update)
-            data.append([title, site, description, topics, language, stars, update])
-        return data
-
-    def _update_proxy(self):
-        count = 0
-        while count <= 2:
-            try:
-                response = self.session.get(self.proxy_url).json()
-                print(response)
-                ip = response['RESULT'][0]['ip']
-                port = response['RESULT'][0]['port']
-            except Exception as e:
-                print(f"Error fetching proxy. Error: {e}")
-                print("." * 30 + "Attempting to update proxy" + "." * 30)
-                time.sleep(5)
-                count += 1
-            else:
-                self.proxy = dict(http=f"http://{ip}:{port}", https=f"http://{ip}:{port}")
-                print("=" * 30 + "Proxy updated" + "=" * 30)
-                break
+    def parse(self, response):
+        return self.parser.parse(self.parser.tree(response.content, response.encoding))
 
     def task(self, query):
-        response = self.fetch(self.base_url, params=query)
-        data = self.parse(response)
+        if self.frontier is not None and not self.frontier.claim(self.base_url, query):
+            return []
+        response = self.engine.fetch(self.base_url, params=query)
+        with self.telemetry.timer("parse"):
+            data = self.parse(response)
         return data
 
+    def save(self, data):
+        with self.telemetry.timer("save"):
+            self.excel_saver.save_data_item(data)
+        self.telemetry.inc("rows_written_total", len(data))
+
     def run(self):
         key = input("请输入要搜索的项目关键字：")
         s = input("请输入排序方式:\n输入stars按照stars排序,输入forks按照forks排序，输入updated按照更新时间排序：")
-        file_name = f"{key}项目.xlsx"
-        self.excel_saver = ExcelSaver(column_headers=self.excel_headers, output_filename=file_name,
-                                      max_rows_per_sheet=5000)
+        file_name = f"{key}项目{self.output_suffix}"
+        self.excel_saver = open_saver(self.excel_headers, file_name, max_rows_per_sheet=5000, background=True,
+                                      progress=WriteProgress(print_progress))
         query = dict(q=key, s=s, o="desc")
-        response = self.fetch(self.base_url, params=query)
-        data = self.parse_first(response)
-        self.excel_saver.save_data_item(data)
-        futures = []
         try:
-            with ThreadPoolExecutor(max_workers=10) as executor:
-                for page in range(2, self.max_page + 1):
-                    query = dict(q=key, s=s, o="desc", p=page)
-                    future = executor.submit(self.task, query)
-                    futures.append(future)
-                for future in futures:
-                    data = future.result()
-                    self.excel_saver.save_data_item(data)
+            # The first page sets max_page; a failure here must still close the saver, engine and telemetry
+            response = self.engine.fetch(self.base_url, params=query)
+            with self.telemetry.timer("parse"):
+                data = self.parse_first(response)
+            self.save(data)
+            with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+                queries = (dict(q=key, s=s, o="desc", p=page) for page in range(2, self.max_page + 1))
+                # Only a bounded window of pages is in flight or waiting to be written
+                results = iter_completed(executor, self.task, queries, 2 * self.max_concurrency, self.ordered)
+                for query, data in results:
+                    self.save(data)
+                    if data and self.frontier is not None:
+                        self.frontier.done(self.base_url, query)
         except Exception as e:
             print(e)
-            print(traceback.print_exc())
+            traceback.print_exc()
         finally:
             self.excel_saver.close()
+            self.engine.close()
+            if self.frontier is not None:
+                self.frontier.close()
+            self.telemetry.close()
 
 
 if __name__ == "__main__":
@@ -1,67 +1,32 @@
-import time
 import re
 import traceback
-from requests import session
-from saveexcel.saveitem import ExcelSaver
+from crawler.checkpoint import CrawlCheckpoint, checkpoint_path
+from crawler.engine import FetchEngine
+from crawler.frontier import UrlFrontier
+from crawler.httpcache import ResponseCache
+from crawler.telemetry import Telemetry
+from github.records import MISSING, Repository
+from saveexcel.progress import WriteProgress, print_progress
+from saveexcel.sinks import open_saver
 
 
 class Spider:
-    def __init__(self, base_url, *, headers=None, proxy=None, cookies=None, proxy_url=None):
+    def __init__(self, base_url, *, headers=None, proxy=None, cookies=None, proxy_url=None, output_suffix=".xlsx",
+                 cache_dir=None, frontier_path=None, telemetry_path=None):
         self.base_url = base_url
-        self.session = session()
-        self.headers = headers
-        self.initial_proxy = proxy
-        self.proxy = proxy
-        self.cookies = cookies
-        self.proxy_url = proxy_url
+        # Exported every few seconds when telemetry_path is given (.prom or .json)
+        self.telemetry = Telemetry(telemetry_path)
+        # With a frontier, result pages fetched by any earlier run are skipped
+        self.frontier = UrlFrontier(frontier_path) if frontier_path else None
+        # Pages are fetched one after another, a single keep-alive connection is enough
+        self.engine = FetchEngine(headers=headers, cookies=cookies, proxy=proxy, proxy_url=proxy_url,
+                                  concurrency=1, proxy_retry_delay=5,
+                                  cache=ResponseCache(cache_dir) if cache_dir else None,
+                                  telemetry=self.telemetry)
         self.max_page = 100
         self.excel_headers = ["id", "项目名称", "项目地址", "项目描述", "项目标签", "项目语言", "项目stars"]
-
-    def fetch(self, url, max_outer_retries=10, params=None):
-        """Makes an HTTP request and returns the HTML response."""
-
-        def _make_request(proxies):
-            """Helper function to make a request using provided proxy settings."""
-            try:
-                r = self.session.get(
-                    url,
-                    headers=self.headers,
-                    proxies=proxies,
-                    cookies=self.cookies,
-                    params=params,
-                    timeout=6
-                )
-                r.raise_for_status()
-                return r
-            except Exception as e:
-                print(f"Error fetching {url} with params:{params} using {self.proxy}. Error: {e}")
-                return None
-
-        outer_retry_count = 0
-
-        while outer_retry_count <= max_outer_retries:
-            # Try fetching with the current proxy
-            response = _make_request(self.proxy)
-            if response:
-                return response
-
-            # If failed, try updating the proxy and fetching the response 5 times
-            for _ in range(1):
-                print(f"Error fetching {url} with params:{params} using {self.proxy}.")
-                print("ip失效，正在拉取代理ip")
-                if self.proxy_url:
-                    self._update_proxy()
-                response = _make_request(self.proxy)
-                if response:
-                    return response
-
-            # If all 5 tries failed, revert to the initial proxy
-            self.proxy = self.initial_proxy
-            print("Reverting to initial proxy")
-            print("代理ip失效，回退到电脑本机ip")
-            outer_retry_count += 1
-
-        raise Exception(f"Reached maximum retry attempts for URL: {url} with params:{params}.")
+        # The extension picks the saver: .xlsx/.xls, .csv, .jsonl, .db or .parquet
+        self.output_suffix = output_suffix
 
     def parse_first(self, response):
         r = response.json()
@@ -77,57 +42,73 @@ class Spider:
             id = item["id"]
             name = re.sub(r'<.*?>|-', '', item["hl_name"])
             site = "https://github.com/" + name
-            description = re.sub(r'<.*?>', '', item["hl_trunc_description"]) if item["hl_trunc_description"] else "无"
-            topics = str(item["topics"]) if item["topics"] else "无"
-            language = item["language"] if item["language"] else "无"
+            description = re.sub(r'<.*?>', '', item["hl_trunc_description"]) if item["hl_trunc_description"] else MISSING
+            topics = str(item["topics"]) if item["topics"] else MISSING
+            language = item["language"] if item["language"] else MISSING
             stars = item["followers"]
-            data.append([id, name, site, description, topics, language, stars])
+            data.append(Repository(id, name, site, description, topics, language, stars))
         return data
 
-    def _update_proxy(self):
-        while True:
-            try:
-                response = self.session.get(self.proxy_url).json()
-                print(response)
-                ip = response['RESULT'][0]['ip']
-                port = response['RESULT'][0]['port']
-            except Exception as e:
-                print(f"Error fetching proxy. Error: {e}")
-                traceback.print_exc()
-                print("代理ip获取失败，5秒后重试")
-                time.sleep(5)
-            else:
-                self.proxy = dict(http=f"http://{ip}:{port}", https=f"http://{ip}:{port}")
-                print("代理ip获取成功")
-                break
+    def save_page(self, excel_saver, checkpoint, page, data, query):
+        with self.telemetry.timer("save"):
+            excel_saver.save_data_item(data)
+            # The page only counts as done once its rows are on disk
+            excel_saver.flush()
+        self.telemetry.inc("rows_written_total", len(data))
+        checkpoint.mark_done(page, excel_saver.item_count)
+        if self.frontier is not None:
+            self.frontier.done(self.base_url, query)
 
     def run(self):
         key = input("请输入要搜索的项目关键字：")
         s = int(input("请输入排序方式:\n1.默认排序\n2.stars\n3.forks\n"))
         guides = ["stars", "forks"]
-        file_name = f"{key}项目.xlsx"
-        excel_saver = ExcelSaver(self.excel_headers, output_filename=file_name, max_rows_per_sheet=5000)
+        file_name = f"{key}项目{self.output_suffix}"
+        excel_saver = open_saver(self.excel_headers, file_name, max_rows_per_sheet=5000, append=True,
+                                 key_column="id", on_duplicate="update",
+                                 progress=WriteProgress(print_progress))
         if s == 1:
             query = dict(q=key)
         else:
             query = dict(q=key, s=guides[s - 2], o="desc")
+        # An interrupted crawl of the same query resumes after the last saved page
+        checkpoint = CrawlCheckpoint(checkpoint_path(file_name), dict(query))
+        if checkpoint.resumed and not checkpoint.verify(excel_saver.item_count):
+            print(f"{file_name}只有{excel_saver.item_count}条数据, 少于断点记录, 从第1页重新下载")
+        elif checkpoint.resumed:
+            print(f"从第{max(checkpoint.completed)}页后继续下载, 已完成{len(checkpoint.completed)}页, "
+                  f"已保存{checkpoint.rows}条")
         try:
-            response = self.fetch(self.base_url, params=query)
-            data = self.parse_first(response)
-            excel_saver.save_data_item(data)
+            if checkpoint.is_done(1):
+                self.max_page = checkpoint.max_page
+            else:
+                response = self.engine.fetch(self.base_url, params=query)
+                with self.telemetry.timer("parse"):
+                    data = self.parse_first(response)
+                checkpoint.max_page = self.max_page
+                self.save_page(excel_saver, checkpoint, 1, data, query)
             for page in range(2, self.max_page + 1):
                 query["p"] = page
-                response = self.fetch(self.base_url, params=query)
-                data = self.parse(response)
-                excel_saver.save_data_item(data)
+                if checkpoint.is_done(page) or (self.frontier is not None
+                                                and not self.frontier.claim(self.base_url, query)):
+                    continue
+                response = self.engine.fetch(self.base_url, params=query)
+                with self.telemetry.timer("parse"):
+                    data = self.parse(response)
+                self.save_page(excel_saver, checkpoint, page, data, query)
         except Exception as e:
             print(f"异常: {e}")
             traceback.print_exc()
-            print("代理更换次数已达上限,下载中止")
+            print("代理更换次数已达上限,下载中止, 再次运行将从中断处继续")
         else:
             print("下载完成")
+            checkpoint.finish()
         finally:
             excel_saver.close()
+            self.engine.close()
+            if self.frontier is not None:
+                self.frontier.close()
+            self.telemetry.close()
             input("按任意键退出")
 
 
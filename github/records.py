@@ -0,0 +1,32 @@
+from typing import Any, NamedTuple
+
+__all__ = [
+            "MISSING",
+            "SearchResult",
+            "Repository"
+]
+
+# Written for a field the page or payload leaves empty
+MISSING = "无"
+
+
+class SearchResult(NamedTuple):
+    """One repository of a search result page (concurrence.Spider), in output column order."""
+    title: str
+    site: str
+    description: str
+    topics: str
+    language: str
+    stars: str
+    update: str
+
+
+class Repository(NamedTuple):
+    """One repository of the JSON search payload (github.Spider), in output column order."""
+    id: Any
+    name: str
+    site: str
+    description: str
+    topics: str
+    language: str
+    stars: Any
@@ -0,0 +1,90 @@
+import json
+from typing import Any, Dict, List, Optional, Union
+
+from lxml import etree, html
+
+from github.records import MISSING, SearchResult
+
+__all__ = [
+            "SEARCH_SELECTORS",
+            "load_selectors",
+            "SearchPageParser"
+]
+
+# Every selector of the search result page, GitHub's hashed class names included. Override
+# them with a JSON file (see load_selectors) when the page changes instead of editing code.
+SEARCH_SELECTORS = dict(
+    # Evaluated on the page
+    page_count="//div[@class='application-main']//nav[@aria-label='Pagination']//a[last()-1]/text()",
+    results="//div[@data-testid='results-list']/div",
+    # Evaluated on one result
+    title=".//h3//a//text()",
+    href="(.//h3//a/@href)[1]",
+    description=".//div[@class='Box-sc-g0xbh4-0 LjnbQ']//text()",
+    topics=".//div[@class='Box-sc-g0xbh4-0 frRVAS']//text()",
+    # The last three items of the result's metadata list; as in the original li[last()-n]
+    # expressions, positions count within each list rather than over all items of the result
+    language=".//ul/li[last()-2]//text()",
+    stars=".//ul/li[last()-1]//text()",
+    update=".//ul/li[last()]//text()",
+)
+
+
+def load_selectors(path: Optional[str] = None) -> Dict[str, str]:
+    """SEARCH_SELECTORS, with the entries of the JSON object in path (if given) replacing them."""
+    selectors = dict(SEARCH_SELECTORS)
+    if path is not None:
+        with open(path, "r", encoding="utf-8") as file:
+            selectors.update(json.load(file))
+    return selectors
+
+
+class SearchPageParser:
+    """
+    Parse GitHub repository search pages with lxml and precompiled XPath selectors.
+
+    The page is parsed into one lxml tree, and each result is read in a single pass with
+    one compiled expression per field, instead of a requests_html/pyquery wrapper call and
+    an XPath compilation per field.
+    """
+
+    def __init__(self, selectors: Optional[Dict[str, str]] = None):
+        self.selectors = selectors if selectors is not None else dict(SEARCH_SELECTORS)
+        # Plain strings: lxml's smart strings keep their element, and with it the whole page, alive
+        self.xpaths = {name: etree.XPath(expression, smart_strings=False)
+                       for name, expression in self.selectors.items()}
+        self.parsers: Dict[str, Any] = {}
+
+    def tree(self, content: Union[bytes, str], encoding: Optional[str] = None) -> Any:
+        """Parse a page; bytes are decoded as encoding (the response's), UTF-8 if it is unknown."""
+        if isinstance(content, str):
+            return html.fromstring(content)
+        # Without a <meta charset> lxml would guess latin-1
+        encoding = encoding or "utf-8"
+        parser = self.parsers.get(encoding)
+        if parser is None:
+            parser = self.parsers[encoding] = html.HTMLParser(encoding=encoding)
+        return html.fromstring(content, parser=parser)
+
+    def page_count(self, tree: Any) -> int:
+        return int(self.xpaths["page_count"](tree)[0])
+
+    def parse(self, tree: Any) -> List[SearchResult]:
+        """One SearchResult row per result."""
+        xpaths = self.xpaths
+        title_of, href_of = xpaths["title"], xpaths["href"]
+        description_of, topics_of = xpaths["description"], xpaths["topics"]
+        language_of, stars_of, update_of = xpaths["language"], xpaths["stars"], xpaths["update"]
+        data = []
+        for div in xpaths["results"](tree):
+            title = "".join(title_of(div))
+            site = "https://github.com" + href_of(div)[0]
+            description = "".join(d.strip() for d in description_of(div))
+            topics = [topic.strip() for topic in topics_of(div)]
+            topics = str(topics) if topics else MISSING
+            language = language_of(div)
+            language = language[0] if language else MISSING
+            stars = stars_of(div)[0]
+            update = " ".join(u.strip() for u in update_of(div))
+            data.append(SearchResult(title, site, description, topics, language, stars, update))
+        return data
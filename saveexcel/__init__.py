@@ -1,19 +1,28 @@
-from typing import List, Optional
-import win32com.client as win32
+import re
+from typing import Any, Iterable, List, Optional, Sequence, Union
 from pathlib import Path
 
 import xlwt
 
+from saveexcel.streamxlsx import XLSX_MAX_ROWS, StreamingSheet, StreamingWorkbook
+
 __all__ = [
             "DEFAULT_OUTPUT_FILENAME",
             "DEFAULT_HEADER_STYLE",
             "DEFAULT_DATA_STYLE",
             "DEFAULT_MAX_ROWS_PER_SHEET",
             "DEFAULT_BASE_SHEET_NAME",
+            "DEFAULT_WRITER_QUEUE_SIZE",
+            "WRITE_CHUNK_SIZE",
             "EXTRA_SPACE",
             "MAX_CELL_WIDTH",
+            "XLS_MAX_ROWS",
+            "XLSX_MAX_ROWS",
             "get_adjusted_length",
             "initialize_sheet",
+            "write_block",
+            "new_workbook",
+            "resolve_max_rows",
             "convert_xls_to_xlsx"
 ]
 
@@ -22,11 +31,44 @@ DEFAULT_HEADER_STYLE = xlwt.easyxf('font: name 宋体, bold on; align: horiz cen
 DEFAULT_DATA_STYLE = xlwt.easyxf('font: name 微软雅黑; align: horiz center, vert center')
 DEFAULT_MAX_ROWS_PER_SHEET = 100
 DEFAULT_BASE_SHEET_NAME = "data"
+DEFAULT_WRITER_QUEUE_SIZE = 1000
+# Rows pulled from an iterable per block by the bulk write APIs
+WRITE_CHUNK_SIZE = 1000
 EXTRA_SPACE = 6
 MAX_CELL_WIDTH = 255
+XLS_MAX_ROWS = 65536
+
+_WIDE_CHARS = re.compile("[\u4e00-\u9fff]")
+
 
+def new_workbook(output_filename: str) -> Union[xlwt.Workbook, StreamingWorkbook]:
+    """
+    Create the workbook matching the output file's format.
+
+    .xlsx files are streamed natively by StreamingWorkbook; everything else is written
+    as .xls with xlwt.
+    """
+    if output_filename.endswith(".xlsx"):
+        return StreamingWorkbook(output_filename)
+    return xlwt.Workbook(encoding="utf-8")
+
+
+def resolve_max_rows(output_filename: str, max_rows_per_sheet: Optional[int]) -> int:
+    """
+    Clamp the requested rows per sheet (header row included) to the format's limit.
+
+    None means "as many rows as the format allows". The header takes one row, so a sheet
+    needs at least two to hold any data.
+    """
+    limit = XLSX_MAX_ROWS if output_filename.endswith(".xlsx") else XLS_MAX_ROWS
+    if max_rows_per_sheet is None:
+        return limit
+    if max_rows_per_sheet < 2:
+        raise ValueError(f"max_rows_per_sheet must be at least 2 (header row included), got {max_rows_per_sheet}")
+    return min(max_rows_per_sheet, limit)
 
-def initialize_sheet(wb: xlwt.Workbook,
+
+def initialize_sheet(wb: Union[xlwt.Workbook, StreamingWorkbook],
                      sheet_name: str,
                      headers: List[str],
                      header_styling: Optional[xlwt.XFStyle]) -> xlwt.Worksheet:
@@ -51,6 +93,27 @@ def initialize_sheet(wb: xlwt.Workbook,
     return sheet
 
 
+def write_block(sheet: Union[xlwt.Worksheet, StreamingSheet],
+                first_row_index: int,
+                rows: Iterable[Sequence[Any]],
+                style: Optional[xlwt.XFStyle]) -> int:
+    """
+    Write a block of rows starting at first_row_index with one style; return the number of rows.
+
+    Streaming sheets serialize the block in one go, xlwt sheets still take cell by cell
+    but without any per-cell lookups besides the write itself.
+    """
+    if isinstance(sheet, StreamingSheet):
+        return sheet.write_rows(first_row_index, rows, style)
+    write = sheet.write
+    row_index = first_row_index
+    for row in rows:
+        for col_index, cell_value in enumerate(row):
+            write(row_index, col_index, cell_value, style)
+        row_index += 1
+    return row_index - first_row_index
+
+
 def get_adjusted_length(cell_str: str) -> int:
 
     """
@@ -58,10 +121,20 @@ def get_adjusted_length(cell_str: str) -> int:
     considering Chinese characters as double the width of English characters.
     """
 
-    return sum(2 if '\u4e00' <= char <= '\u9fff' else 1 for char in cell_str)
+    if cell_str.isascii():
+        return len(cell_str)
+    # Counting the matches of a character class runs in C instead of a per-char generator
+    return len(cell_str) + len(_WIDE_CHARS.findall(cell_str))
 
 
 def convert_xls_to_xlsx(path: str) -> None:
+    """
+    Convert an .xls file to .xlsx through Excel COM automation (Windows + Excel only).
+
+    The savers no longer need this, .xlsx output is written natively.
+    """
+    import win32com.client as win32
+
     path = Path(path)
     excel = win32.gencache.EnsureDispatch('Excel.Application')
     wb = excel.Workbooks.Open(path.absolute())
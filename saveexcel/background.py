@@ -0,0 +1,72 @@
+import queue
+import threading
+from typing import Any, Callable, Optional
+
+from saveexcel import DEFAULT_WRITER_QUEUE_SIZE
+
+__all__ = [
+            "BackgroundWriter"
+]
+
+
+class BackgroundWriter:
+    """
+    Mixin that runs a saver's writes on a dedicated thread.
+
+    Writes are put on a bounded queue as (write, batch) pairs, so producers block once
+    queue_size batches are waiting. The first failure is kept and raised by
+    check_writer_thread; later batches are dropped. The saver provides output_filename.
+    """
+
+    writer_queue: Optional[queue.Queue] = None
+    writer_thread: Optional[threading.Thread] = None
+    writer_error: Optional[BaseException] = None
+
+    def start_writer_thread(self, queue_size: int = DEFAULT_WRITER_QUEUE_SIZE):
+        self.writer_queue = queue.Queue(maxsize=queue_size)
+        self.writer_thread = threading.Thread(target=self.writer_loop, name=f"{type(self).__name__}-writer",
+                                              daemon=True)
+        self.writer_thread.start()
+
+    def submit(self, write: Callable[[Any], None], batch: Any) -> None:
+        """Run write(batch) on the writer thread if there is one, else right away."""
+        if self.writer_queue is None:
+            write(batch)
+            return
+        self.check_writer_thread()
+        # Blocks while the queue is full, which throttles the producers
+        self.writer_queue.put((write, batch))
+
+    def writer_loop(self):
+        """Body of the writer thread: run queued (write, batch) pairs until the None sentinel arrives."""
+        while True:
+            task = self.writer_queue.get()
+            try:
+                if task is None:
+                    return
+                if self.writer_error is None:
+                    write, batch = task
+                    write(batch)
+            except Exception as e:
+                self.writer_error = e
+            finally:
+                self.writer_queue.task_done()
+
+    def check_writer_thread(self):
+        if self.writer_error is not None:
+            raise RuntimeError(f"Background writer for {self.output_filename} failed") from self.writer_error
+
+    def join_writer_thread(self):
+        """Wait until every queued batch is written."""
+        if self.writer_queue is not None:
+            self.writer_queue.join()
+            self.check_writer_thread()
+
+    def stop_writer_thread(self):
+        """Write everything still queued and join the writer thread."""
+        if self.writer_thread is None:
+            return
+        self.writer_queue.put(None)
+        self.writer_thread.join()
+        self.writer_thread = None
+        self.writer_queue = None
@@ -0,0 +1,108 @@
+import json
+import os
+from typing import Any, Iterable, Iterator, List
+
+import xlrd
+
+from saveexcel.streamxlsx import iter_xlsx_rows
+
+__all__ = [
+            "JOURNAL_SUFFIX",
+            "journal_path",
+            "read_data_rows",
+            "RowJournal"
+]
+
+JOURNAL_SUFFIX = ".journal"
+
+
+def journal_path(output_filename: str) -> str:
+    """Return the sidecar directory that holds the append journal of an output file."""
+    return f"{output_filename}{JOURNAL_SUFFIX}"
+
+
+def read_data_rows(filename: str) -> Iterator[List[Any]]:
+    """
+    Yield the data rows of an existing workbook, skipping the header row of every sheet.
+
+    Used once to import an output file written without a journal.
+    """
+    if filename.endswith(".xlsx"):
+        current_sheet = None
+        for sheet_name, values in iter_xlsx_rows(filename):
+            if sheet_name != current_sheet:
+                current_sheet = sheet_name
+                continue
+            yield values
+    else:
+        rb = xlrd.open_workbook(filename, on_demand=True)
+        for sheet in rb.sheets():
+            for row_index in range(1, sheet.nrows):
+                yield sheet.row_values(row_index)
+        rb.release_resources()
+
+
+class RowJournal:
+    """
+    Append-only JSON-lines journal of data rows, kept in a sidecar directory.
+
+    Appending only touches the end of the journal, so its cost does not depend on how many
+    rows were written before. ``checkpoint`` records how much of the journal is complete;
+    anything after that (e.g. left by a crashed run) is discarded when the journal is reopened.
+    """
+
+    STATE_FILENAME = "state.json"
+    ROWS_FILENAME = "rows.jsonl"
+
+    def __init__(self, journal_dir: str):
+        self.journal_dir = journal_dir
+        os.makedirs(journal_dir, exist_ok=True)
+        self.size = 0
+        self.row_count = 0
+        state_path = os.path.join(journal_dir, self.STATE_FILENAME)
+        if os.path.exists(state_path):
+            with open(state_path, "r", encoding="utf-8") as file:
+                state = json.load(file)
+            self.size = state["size"]
+            self.row_count = state["rows"]
+        rows_path = os.path.join(journal_dir, self.ROWS_FILENAME)
+        self._file = open(rows_path, "r+b" if os.path.exists(rows_path) else "w+b")
+        self._file.truncate(self.size)
+        self._file.seek(self.size)
+
+    def __len__(self) -> int:
+        return self.row_count
+
+    def append(self, rows: Iterable[List[Any]]) -> None:
+        lines = [json.dumps(row, ensure_ascii=False, default=str) for row in rows]
+        if lines:
+            self._file.write(("\n".join(lines) + "\n").encode("utf-8"))
+            self.row_count += len(lines)
+
+    def clear(self) -> None:
+        """Drop every row, e.g. before the journal is rewritten from a key index."""
+        self._file.seek(0)
+        self._file.truncate()
+        self.row_count = 0
+
+    def checkpoint(self) -> None:
+        self._file.flush()
+        self.size = self._file.tell()
+        state_path = os.path.join(self.journal_dir, self.STATE_FILENAME)
+        with open(f"{state_path}.tmp", "w", encoding="utf-8") as file:
+            json.dump(dict(size=self.size, rows=self.row_count), file)
+        os.replace(f"{state_path}.tmp", state_path)
+
+    def __iter__(self) -> Iterator[List[Any]]:
+        self._file.flush()
+        end = self._file.tell()
+        with open(os.path.join(self.journal_dir, self.ROWS_FILENAME), "rb") as file:
+            while file.tell() < end:
+                line = file.readline()
+                if not line:
+                    break
+                yield json.loads(line)
+
+    def close(self) -> None:
+        self.checkpoint()
+        self._file.close()
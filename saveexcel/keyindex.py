@@ -0,0 +1,121 @@
+import json
+import os
+import sqlite3
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Sequence, Tuple
+
+__all__ = [
+            "KEY_INDEX_FILENAME",
+            "KeyIndex",
+            "normalize_key"
+]
+
+KEY_INDEX_FILENAME = "keys.sqlite"
+# SQLite allows 999 host parameters per statement on older builds
+_LOOKUP_BATCH = 900
+
+
+def normalize_key(value: Any) -> str:
+    """Turn a key cell into text; 123, 123.0 (as read back by xlrd) and "123" are the same key."""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value)
+
+
+class KeyIndex:
+    """
+    SQLite index of the rows written so far, keyed by one column.
+
+    Every row is stored with its key in insertion order, so the index can also rebuild
+    the output: after a row was updated in place or duplicates were found in an existing
+    file, ``dirty`` is set and the saver rewrites its rows from the index. Changes only
+    become durable on ``commit``. ":memory:" keeps the index for one run only.
+    """
+
+    def __init__(self, path: str = ":memory:"):
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # The background writer thread of ExcelSaver uses the connection, one thread at a time
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS rows (key TEXT PRIMARY KEY, row TEXT NOT NULL)")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+        self.connection.commit()
+        self.row_count = self.connection.execute("SELECT COUNT(*) FROM rows").fetchone()[0]
+
+    def __len__(self) -> int:
+        return self.row_count
+
+    def _lookup(self, keys: List[str]) -> Dict[str, str]:
+        found = {}
+        for start in range(0, len(keys), _LOOKUP_BATCH):
+            batch = keys[start:start + _LOOKUP_BATCH]
+            found.update(self.connection.execute(
+                f"SELECT key, row FROM rows WHERE key IN ({', '.join('?' * len(batch))})", batch))
+        return found
+
+    def merge(self, rows: Sequence[Sequence[Any]], key_position: int,
+              update: bool = False) -> Tuple[List[Sequence[Any]], int]:
+        """
+        Record rows and return (rows with a new key, number of rows updated in place).
+
+        Rows whose key is already indexed are dropped; with update=True a row whose content
+        changed replaces the stored one and the index is marked dirty.
+        """
+        encoded: Dict[str, Tuple[Sequence[Any], str]] = {}
+        for row in rows:
+            key = normalize_key(row[key_position])
+            # The last version of a key wins within a batch as well
+            if update or key not in encoded:
+                encoded[key] = (row, json.dumps(list(row), ensure_ascii=False, default=str))
+        existing = self._lookup(list(encoded))
+        new_rows = [row for key, (row, _) in encoded.items() if key not in existing]
+        changed = [(text, key) for key, (_, text) in encoded.items()
+                   if update and key in existing and existing[key] != text]
+        if new_rows:
+            self.connection.executemany("INSERT INTO rows (key, row) VALUES (?, ?)",
+                                        [(key, text) for key, (_, text) in encoded.items() if key not in existing])
+            self.row_count += len(new_rows)
+        if changed:
+            self.connection.executemany("UPDATE rows SET row = ? WHERE key = ?", changed)
+            self.mark_dirty()
+        return new_rows, len(changed)
+
+    def seed(self, rows: Iterable[Sequence[Any]], key_position: int) -> None:
+        """Index rows that are already in the output; duplicates among them mark the index dirty."""
+        rows = iter(rows)
+        while True:
+            chunk = list(islice(rows, _LOOKUP_BATCH))
+            if not chunk:
+                break
+            new_rows, _ = self.merge(chunk, key_position)
+            if len(new_rows) < len(chunk):
+                self.mark_dirty()
+
+    def clear(self) -> None:
+        self.connection.execute("DELETE FROM rows")
+        self.connection.execute("DELETE FROM meta")
+        self.row_count = 0
+
+    def __iter__(self) -> Iterator[List[Any]]:
+        for (text,) in self.connection.execute("SELECT row FROM rows ORDER BY rowid"):
+            yield json.loads(text)
+
+    @property
+    def dirty(self) -> bool:
+        return self.connection.execute("SELECT value FROM meta WHERE name = 'dirty'").fetchone() is not None
+
+    def mark_dirty(self) -> None:
+        self.connection.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('dirty', '1')")
+
+    def clear_dirty(self) -> None:
+        self.connection.execute("DELETE FROM meta WHERE name = 'dirty'")
+
+    def commit(self) -> None:
+        self.connection.commit()
+
+    def close(self) -> None:
+        self.commit()
+        self.connection.close()
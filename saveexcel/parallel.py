@@ -0,0 +1,222 @@
+import json
+import os
+import shutil
+import tempfile
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from itertools import islice
+from typing import Any, Deque, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import xlwt
+
+from saveexcel import *
+from saveexcel.progress import WriteProgress
+from saveexcel.streamxlsx import StreamingWorkbook, rows_xml
+from saveexcel.widths import ColumnWidthTracker
+
+__all__ = [
+            "MANIFEST_SUFFIX",
+            "ParallelExcelWriter",
+            "shard_filename",
+            "read_manifest"
+]
+
+MANIFEST_SUFFIX = ".manifest.json"
+
+
+def shard_filename(output_filename: str, shard_index: int) -> str:
+    """Return the file name of a shard, e.g. data.xlsx -> data.part0001.xlsx."""
+    stem, suffix = os.path.splitext(output_filename)
+    return f"{stem}.part{shard_index:04d}{suffix}"
+
+
+def read_manifest(output_filename: str) -> Dict[str, Any]:
+    """Load the manifest written next to the shards of output_filename."""
+    with open(os.path.splitext(output_filename)[0] + MANIFEST_SUFFIX, "r", encoding="utf-8") as file:
+        return json.load(file)
+
+
+def _render_sheet(segment_path: str, column_headers: List[str], header_style_index: int,
+                  rows: List[Sequence[Any]], data_style_index: int,
+                  extra_space: Optional[int]) -> Tuple[int, List[int]]:
+    """Worker: serialize the header and data rows of one .xlsx sheet into segment_path."""
+    _, header = rows_xml(0, [column_headers], header_style_index)
+    count, data = rows_xml(1, rows, data_style_index)
+    with open(segment_path, "wb") as file:
+        file.write(header)
+        file.write(data)
+    lengths = []
+    if extra_space is not None:
+        column_widths = ColumnWidthTracker(extra_space)
+        column_widths.observe_rows(rows)
+        lengths = column_widths.lengths
+    return count, lengths
+
+
+def _write_shard(shard_path: str, sheet_name: str, column_headers: List[str],
+                 header_style: Optional[xlwt.XFStyle], data_style: Optional[xlwt.XFStyle],
+                 rows: List[Sequence[Any]], extra_space: Optional[int]) -> Tuple[int, List[int]]:
+    """Worker: write one sheet of rows as a complete workbook of its own."""
+    workbook = new_workbook(shard_path)
+    sheet = initialize_sheet(workbook, sheet_name, column_headers, header_style)
+    count = write_block(sheet, 1, rows, data_style)
+    if extra_space is not None:
+        column_widths = ColumnWidthTracker(extra_space)
+        column_widths.observe_rows(rows)
+        column_widths.apply(sheet)
+    workbook.save(shard_path)
+    return count, []
+
+
+class ParallelExcelWriter:
+    """
+    ExcelWriter counterpart that serializes sheets in a process pool.
+
+    Incoming rows are cut into sheet-sized chunks (max_rows_per_sheet - 1 data rows) and
+    every chunk is serialized by a worker process, so a multi-million-row export keeps
+    all cores busy instead of one. At most ``workers`` chunks are in flight, which bounds
+    memory to about workers + 1 sheets of rows.
+
+    .xlsx sheets are stitched back into one workbook in order. With sharded=True (the
+    only option for .xls, whose workbooks cannot be stitched) every sheet becomes a file
+    of its own, data.part0001.xlsx, data.part0002.xlsx..., listed in data.manifest.json.
+    """
+
+    def __init__(self,
+                 column_headers: List[str],
+                 header_style: Optional[xlwt.XFStyle] = DEFAULT_HEADER_STYLE,
+                 data_style: Optional[xlwt.XFStyle] = DEFAULT_DATA_STYLE,
+                 max_rows_per_sheet: Optional[int] = DEFAULT_MAX_ROWS_PER_SHEET,
+                 output_filename: str = DEFAULT_OUTPUT_FILENAME,
+                 base_sheet_name: str = DEFAULT_BASE_SHEET_NAME,
+                 workers: Optional[int] = None,
+                 sharded: bool = False,
+                 autosize: bool = True,
+                 progress: Optional[WriteProgress] = None):
+        if not sharded and not output_filename.endswith(".xlsx"):
+            raise ValueError(f"{output_filename} cannot be stitched from parallel sheets, "
+                             f"use an .xlsx output or sharded=True")
+        self.sharded = sharded
+        self.output_filename = output_filename
+        self.column_headers = column_headers
+        self.header_style = header_style
+        self.data_style = data_style
+        self.max_rows_per_sheet = resolve_max_rows(output_filename, max_rows_per_sheet)
+        self.base_sheet_name = base_sheet_name
+        self.workers = workers or os.cpu_count() or 1
+        self.extra_space = EXTRA_SPACE if autosize else None
+        self.progress = progress if progress is not None else WriteProgress()
+        self.sheet_count = 0
+        self.count = 0
+        self.shards: List[Dict[str, Any]] = []
+        self.workbook: Optional[StreamingWorkbook] = None
+        self.segment_dir: Optional[str] = None
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.pending: Deque[Tuple[Future, str, str]] = deque()
+        self.buffer: List[Sequence[Any]] = []
+
+    def _start(self) -> None:
+        self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        if not self.sharded:
+            self.workbook = StreamingWorkbook(self.output_filename)
+            self.segment_dir = tempfile.mkdtemp(prefix=".segments-",
+                                                dir=os.path.dirname(os.path.abspath(self.output_filename)))
+
+    def _submit(self, rows: List[Sequence[Any]]) -> None:
+        if self.executor is None:
+            self._start()
+        while len(self.pending) >= self.workers:
+            self._collect()
+        self.sheet_count += 1
+        sheet_name = f"{self.base_sheet_name}_{self.sheet_count}"
+        if self.sharded:
+            path = shard_filename(self.output_filename, self.sheet_count)
+            future = self.executor.submit(_write_shard, path, sheet_name, self.column_headers,
+                                          self.header_style, self.data_style, rows, self.extra_space)
+        else:
+            path = os.path.join(self.segment_dir, f"sheet{self.sheet_count}.xml.seg")
+            # Styles are registered here so that every worker uses the same cellXfs indexes
+            future = self.executor.submit(_render_sheet, path, self.column_headers,
+                                          self.workbook.style_index(self.header_style), rows,
+                                          self.workbook.style_index(self.data_style), self.extra_space)
+        self.pending.append((future, sheet_name, path))
+
+    def _collect(self) -> None:
+        """Wait for the oldest chunk and add it to the output, keeping the sheet order."""
+        future, sheet_name, path = self.pending.popleft()
+        count, lengths = future.result()
+        if self.sharded:
+            self.shards.append(dict(filename=os.path.basename(path), sheet=sheet_name, rows=count))
+        else:
+            sheet = self.workbook.attach_sheet(sheet_name, path, count)
+            for coi_index, header in enumerate(self.column_headers):
+                sheet.col(coi_index).width = 257 * (get_adjusted_length(header) + EXTRA_SPACE)
+            if self.extra_space is not None:
+                column_widths = ColumnWidthTracker(self.extra_space)
+                column_widths.lengths = lengths
+                column_widths.apply(sheet)
+        self.count += count
+        self.progress.add_sheet()
+        self.progress.add_rows(count)
+
+    def write_rows(self, rows: Iterable[Sequence[Any]]) -> int:
+        """Queue rows (any iterable) for serialization and return how many were taken."""
+        sheet_rows = self.max_rows_per_sheet - 1
+        written = 0
+        rows = iter(rows)
+        while True:
+            block = list(islice(rows, sheet_rows - len(self.buffer)))
+            if not block:
+                break
+            self.buffer.extend(block)
+            written += len(block)
+            if len(self.buffer) == sheet_rows:
+                self._submit(self.buffer)
+                self.buffer = []
+        return written
+
+    def write_columns(self, columns: Dict[str, Sequence[Any]]) -> int:
+        """Write column arrays keyed by header; headers missing from columns are left empty."""
+        length = max((len(values) for values in columns.values()), default=0)
+        empty = [None] * length
+        return self.write_rows(zip(*(columns.get(header, empty) for header in self.column_headers)))
+
+    def save(self) -> None:
+        """Serialize the remaining rows, wait for every worker and write the workbook or the manifest."""
+        if self.buffer or self.sheet_count == 0:
+            self._submit(self.buffer)
+            self.buffer = []
+        try:
+            while self.pending:
+                self._collect()
+        finally:
+            self.executor.shutdown()
+            self.executor = None
+        if self.sharded:
+            manifest_path = os.path.splitext(self.output_filename)[0] + MANIFEST_SUFFIX
+            with open(manifest_path, "w", encoding="utf-8") as file:
+                json.dump(dict(column_headers=self.column_headers, rows=self.count, shards=self.shards),
+                          file, ensure_ascii=False, indent=2)
+            for shard in self.shards:
+                path = os.path.join(os.path.dirname(self.output_filename), shard["filename"])
+                self.progress.add_bytes(os.path.getsize(path))
+        else:
+            try:
+                self.workbook.save()
+            finally:
+                shutil.rmtree(self.segment_dir, ignore_errors=True)
+            self.progress.add_bytes(os.path.getsize(self.output_filename))
+        self.progress.finish()
+
+    def save_data(self, data_list: Iterable[Sequence[Any]]) -> None:
+        self.write_rows(data_list)
+        self.save()
+
+
+# Class usage:
+# if __name__ == '__main__':
+#     with open('sample_items.json', "r", encoding="utf-8") as file:
+#         p_data_list = json.load(file)
+#     p_headers = [item for item in p_data_list[0]]
+#     writer = ParallelExcelWriter(p_headers, output_filename="sample_items.xlsx", max_rows_per_sheet=100000)
+#     writer.save_data(list(item.values()) for item in p_data_list)
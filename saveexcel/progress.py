@@ -0,0 +1,85 @@
+import logging
+import time
+from typing import Any, Callable, Dict, Optional
+
+__all__ = [
+            "DEFAULT_PROGRESS_ROWS",
+            "DEFAULT_PROGRESS_SECONDS",
+            "WriteProgress",
+            "print_progress"
+]
+
+DEFAULT_PROGRESS_ROWS = 10000
+DEFAULT_PROGRESS_SECONDS = 5.0
+
+
+class WriteProgress:
+    """
+    Counters shared by the writers, with a rate-limited report hook.
+
+    The writers only bump counters; ``callback(snapshot)`` and the optional logger are
+    invoked at most once per ``every_rows`` rows or ``every_seconds`` seconds, whichever
+    comes first, and once more by ``finish``. Without a callback or logger nothing is
+    reported and the counters can simply be read.
+    """
+
+    def __init__(self,
+                 callback: Optional[Callable[[Dict[str, Any]], None]] = None,
+                 every_rows: int = DEFAULT_PROGRESS_ROWS,
+                 every_seconds: float = DEFAULT_PROGRESS_SECONDS,
+                 logger: Optional[logging.Logger] = None):
+        self.callback = callback
+        self.every_rows = every_rows
+        self.every_seconds = every_seconds
+        self.logger = logger
+        self.rows_written = 0
+        self.sheets_created = 0
+        self.bytes_flushed = 0
+        self.started_at = time.monotonic()
+        self._next_rows = every_rows
+        self._next_time = self.started_at + every_seconds
+        self._reporting = callback is not None or logger is not None
+
+    def add_rows(self, count: int) -> None:
+        self.rows_written += count
+        if self._reporting and (self.rows_written >= self._next_rows or time.monotonic() >= self._next_time):
+            self.report()
+
+    def add_sheet(self) -> None:
+        self.sheets_created += 1
+
+    def add_bytes(self, count: int) -> None:
+        self.bytes_flushed += count
+
+    @property
+    def rows_per_second(self) -> float:
+        elapsed = time.monotonic() - self.started_at
+        return self.rows_written / elapsed if elapsed > 0 else 0.0
+
+    def snapshot(self) -> Dict[str, Any]:
+        return dict(rows_written=self.rows_written,
+                    rows_per_second=round(self.rows_per_second, 1),
+                    sheets_created=self.sheets_created,
+                    bytes_flushed=self.bytes_flushed,
+                    elapsed=round(time.monotonic() - self.started_at, 3))
+
+    def report(self) -> None:
+        snapshot = self.snapshot()
+        self._next_rows = self.rows_written + self.every_rows
+        self._next_time = time.monotonic() + self.every_seconds
+        if self.callback is not None:
+            self.callback(snapshot)
+        if self.logger is not None:
+            self.logger.info("%(rows_written)d rows written (%(rows_per_second).0f rows/s), "
+                             "%(sheets_created)d sheets, %(bytes_flushed)d bytes flushed", snapshot)
+
+    def finish(self) -> None:
+        """Report the final counters, regardless of the rate limit."""
+        if self._reporting:
+            self.report()
+
+
+def print_progress(snapshot: Dict[str, Any]) -> None:
+    """Progress callback printing the savers' classic banner."""
+    print(f"{'=' * 30} {snapshot['rows_written']} data items saved "
+          f"({snapshot['rows_per_second']:.0f} rows/s) {'=' * 30}")
@@ -1,11 +1,18 @@
 import json
 import time
-from typing import List, Optional, Union
+import os
+from itertools import chain, islice
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Union
 import xlwt
 import xlrd
 from xlutils.copy import copy
-import os
 from saveexcel import *
+from saveexcel.background import BackgroundWriter
+from saveexcel.journal import RowJournal, journal_path, read_data_rows
+from saveexcel.keyindex import KEY_INDEX_FILENAME, KeyIndex
+from saveexcel.progress import WriteProgress
+from saveexcel.streamxlsx import StreamingWorkbook
+from saveexcel.widths import ColumnWidthTracker
 
 
 def save_to_excel(
@@ -14,18 +21,51 @@ def save_to_excel(
         output_filename: str = DEFAULT_OUTPUT_FILENAME,
         header_style: Optional[xlwt.XFStyle] = DEFAULT_HEADER_STYLE,
         data_style: Optional[xlwt.XFStyle] = DEFAULT_DATA_STYLE,
-        max_rows_per_sheet: int = DEFAULT_MAX_ROWS_PER_SHEET,
+        max_rows_per_sheet: Optional[int] = DEFAULT_MAX_ROWS_PER_SHEET,
         base_sheet_name: str = DEFAULT_BASE_SHEET_NAME,
-        extra_space: int = EXTRA_SPACE
+        extra_space: int = EXTRA_SPACE,
+        append: bool = False,
+        materialize: bool = True,
+        autosize: bool = True,
+        progress: Optional[WriteProgress] = None
 ) -> None:
-    """Save data to an Excel file, potentially across multiple sheets."""
+    """
+    Save data to an Excel file, potentially across multiple sheets.
+
+    Without append the existing file is re-read and rewritten on every call (.xlsx files
+    through ExcelSaver's streaming workbook, anything else as .xls with xlwt). With
+    append=True the rows go to the sidecar journal of ExcelSaver instead; pass
+    materialize=False on all but the last call to only build the workbook once.
+    progress (a WriteProgress) counts the rows, sheets and bytes written.
+    """
+    progress = progress if progress is not None else WriteProgress()
+
+    if append:
+        saver = ExcelSaver(column_headers, header_style, data_style, output_filename,
+                           max_rows_per_sheet, base_sheet_name, extra_space, append=True, autosize=autosize,
+                           progress=progress)
+        saver.save_data_item(data_item)
+        saver.close(materialize=materialize)
+        return
 
-    # Ensure data_items is a list of lists
-    if not isinstance(data_item[0], list):
+    # Ensure data_items is a list of rows; tuples (record types included) are rows too
+    if not isinstance(data_item[0], (list, tuple)):
         data_items = [data_item]
     else:
         data_items = data_item
 
+    if output_filename.endswith(".xlsx"):
+        # xlutils only copies .xls workbooks: the rows already in the file are streamed into a
+        # new workbook (written to a .part file, so the old one stays readable) before the new rows
+        saver = ExcelSaver(column_headers, header_style, data_style, output_filename,
+                           max_rows_per_sheet, base_sheet_name, extra_space, autosize=autosize, progress=progress)
+        existing_rows = read_data_rows(output_filename) if os.path.exists(output_filename) else []
+        saver.write_rows(chain(existing_rows, data_items))
+        saver.close()
+        return
+
+    max_rows_per_sheet = resolve_max_rows(output_filename, max_rows_per_sheet)
+
     # Check if the file already exists
     try:
         rb = xlrd.open_workbook(output_filename, formatting_info=True)
@@ -38,35 +78,42 @@ def save_to_excel(
     except FileNotFoundError:
         main_workbook = xlwt.Workbook(encoding="utf-8")
         initialize_sheet(main_workbook, f"{base_sheet_name}_1", column_headers, header_style)
+        progress.add_sheet()
         current_row_index = 1
         sheet_count = 1
+    column_widths = ColumnWidthTracker(extra_space) if autosize else None
 
     # Write data to the Excel sheet
     for item in data_items:
 
         if current_row_index == max_rows_per_sheet:
+            if column_widths is not None:
+                column_widths.apply(main_workbook.get_sheet(-1))
+                column_widths.reset()
             sheet_count += 1
             initialize_sheet(main_workbook, f"{base_sheet_name}_{sheet_count}", column_headers, header_style)
+            progress.add_sheet()
             current_row_index = 1
 
         current_sheet = main_workbook.get_sheet(-1)
+        if column_widths is not None:
+            column_widths.observe(item)
 
         for idx, cell_value in enumerate(item):
-            adjusted_length = get_adjusted_length(str(cell_value))
-            calculated_width = 257 * min(adjusted_length + extra_space, MAX_CELL_WIDTH)
-            if current_sheet.col(idx).width < calculated_width:
-                current_sheet.col(idx).width = min(calculated_width, MAX_CELL_WIDTH * 257)
             current_sheet.write(current_row_index, idx, cell_value, data_style)
 
         current_row_index += 1
-        count = (max_rows_per_sheet - 1) * (sheet_count - 1) + current_row_index - 1
-        print(f"{'=' * 30} Data item number {count} saved successfully {'=' * 30}")
+        progress.add_rows(1)
 
     # Save the workbook
+    if column_widths is not None:
+        column_widths.apply(main_workbook.get_sheet(-1))
     main_workbook.save(output_filename)
+    progress.add_bytes(os.path.getsize(output_filename))
+    progress.finish()
 
 
-class ExcelSaver:
+class ExcelSaver(BackgroundWriter):
     """
     Class to save data to Excel in an object-oriented manner.
     """
@@ -76,23 +123,78 @@ class ExcelSaver:
                  header_style: Optional[xlwt.XFStyle] = DEFAULT_HEADER_STYLE,
                  data_style: Optional[xlwt.XFStyle] = DEFAULT_DATA_STYLE,
                  output_filename: str = DEFAULT_OUTPUT_FILENAME,
-                 max_rows_per_sheet: int = DEFAULT_MAX_ROWS_PER_SHEET,
+                 max_rows_per_sheet: Optional[int] = DEFAULT_MAX_ROWS_PER_SHEET,
                  base_sheet_name: str = DEFAULT_BASE_SHEET_NAME,
-                 extra_space: int = EXTRA_SPACE):
+                 extra_space: int = EXTRA_SPACE,
+                 append: bool = False,
+                 autosize: bool = True,
+                 sample_every: int = 1,
+                 background: bool = False,
+                 queue_size: int = DEFAULT_WRITER_QUEUE_SIZE,
+                 progress: Optional[WriteProgress] = None,
+                 key_column: Optional[str] = None,
+                 on_duplicate: str = "skip"):
+        """
+        Write rows to an .xlsx (streamed, always a new workbook) or .xls file, splitting
+        them over sheets of max_rows_per_sheet rows. In append mode a later run continues
+        after the rows of the earlier ones.
+
+        Args:
+        - column_headers: List of column headers.
+        - header_style, data_style: Styles for the headers and the data cells.
+        - output_filename: .xlsx, or .xls for any other name.
+        - max_rows_per_sheet: Maximum number of rows per sheet, None for the format's limit.
+        - base_sheet_name: Base name for the sheets.
+        - append: Keep the rows of an existing output and add to them.
+        - autosize: Widen columns to fit the data; False keeps the header-based widths.
+        - sample_every: Only measure every N-th row when autosizing.
+        - background: Write on a dedicated thread behind a queue of queue_size batches.
+        - progress: Counts rows, sheets and bytes written and reports them at a bounded rate.
+        - key_column: Skip rows whose key was already written, or replace them with
+          on_duplicate="update".
+        """
+        if on_duplicate not in ("skip", "update"):
+            raise ValueError(f"on_duplicate must be 'skip' or 'update', got {on_duplicate!r}")
+        if key_column is not None and key_column not in column_headers:
+            raise ValueError(f"Key column {key_column!r} is not one of the column headers")
         self.sheet_count = None
         self.output_filename = output_filename
         self.column_headers = column_headers
         self.header_style = header_style
         self.data_style = data_style
-        self.max_rows_per_sheet = max_rows_per_sheet
+        self.max_rows_per_sheet = resolve_max_rows(output_filename, max_rows_per_sheet)
         self.base_sheet_name = base_sheet_name
         self.item_count = 0
         self.extra_space = extra_space
         self.current_row_index = 0
         self.main_workbook = None
+        self.append = append
+        self.journal = None
+        self.column_widths = ColumnWidthTracker(extra_space, sample_every) if autosize else None
+        self.progress = progress if progress is not None else WriteProgress()
+        self.key_position = column_headers.index(key_column) if key_column is not None else None
+        self.on_duplicate = on_duplicate
+        self.key_index = None
+        self.skipped_count = 0
+        self.updated_count = 0
+        self.writer_queue = None
+        self.writer_thread = None
+        self.writer_error = None
         self.initialize_workbook()
+        if background:
+            # save_data_item only queues the rows, so fetching and writing overlap; callers
+            # block once queue_size batches are waiting and close() drains the queue
+            self.start_writer_thread(queue_size)
 
     def initialize_workbook(self):
+        if self.append:
+            self.initialize_journal()
+            return
+        if self.key_position is not None:
+            self.key_index = KeyIndex()
+        if self.output_filename.endswith(".xlsx"):
+            self.start_new_workbook()
+            return
         try:
             rb = xlrd.open_workbook(self.output_filename, formatting_info=True)
             self.main_workbook = copy(rb)
@@ -100,55 +202,271 @@ class ExcelSaver:
             self.current_row_index = last_sheet_rb.nrows
             self.sheet_count = rb.nsheets
         except FileNotFoundError:
-            self.main_workbook = xlwt.Workbook(encoding="utf-8")
-            self.initialize_sheet(f"{self.base_sheet_name}_1")
-            self.current_row_index = 1
-            self.sheet_count = 1
+            self.start_new_workbook()
+        else:
+            if self.key_index is not None:
+                self.seed_key_index(read_data_rows(self.output_filename))
+
+    def initialize_journal(self):
+        """Open (or create) the append journal, importing an existing output file once."""
+        journal_dir = journal_path(self.output_filename)
+        import_existing = os.path.exists(self.output_filename) and not os.path.exists(journal_dir)
+        if self.output_filename.endswith(".xlsx"):
+            # Sheets are kept as serialized segments, closing only has to copy them
+            self.main_workbook = StreamingWorkbook(self.output_filename, segment_dir=journal_dir)
+            sheets = self.main_workbook.sheets
+            if sheets:
+                self.sheet_count = len(sheets)
+                self.current_row_index = sheets[-1].last_row_index + 1
+                self.item_count = sum(sheet.last_row_index for sheet in sheets)
+            else:
+                self.initialize_sheet(f"{self.base_sheet_name}_1")
+                self.current_row_index = 1
+                self.sheet_count = 1
+        else:
+            # xlwt cannot extend a workbook, rows are journaled and replayed on close, so a
+            # batch costs the same however large the output already is
+            self.journal = RowJournal(journal_dir)
+            self.item_count = len(self.journal)
+        if self.key_position is not None:
+            self.initialize_key_index(os.path.join(journal_dir, KEY_INDEX_FILENAME))
+        if import_existing:
+            # Goes through the key index as well, so duplicates of an old output are dropped
+            self.write_rows(read_data_rows(self.output_filename))
+            self.flush()
+
+    def initialize_key_index(self, index_path: str):
+        """Open the persistent key index of an append output and check it against the rows written."""
+        self.key_index = KeyIndex(index_path)
+        if len(self.key_index) == 0 and self.item_count:
+            # The output was started without a key column, index what it holds so far
+            if self.journal is not None:
+                rows = iter(self.journal)
+            else:
+                self.apply_column_widths()
+                self.main_workbook.save(self.output_filename)
+                rows = read_data_rows(self.output_filename)
+            self.seed_key_index(rows)
+        elif len(self.key_index) != self.item_count:
+            # The index is committed before the rows, a crash in between is repaired on close
+            self.key_index.mark_dirty()
+        self.key_index.commit()
+
+    def seed_key_index(self, rows: Iterable[Sequence[Any]]):
+        """Index rows that are already in the output; duplicates among them get the output rebuilt."""
+        self.key_index.seed(rows, self.key_position)
+
+    def start_new_workbook(self):
+        self.main_workbook = new_workbook(self.output_filename)
+        self.initialize_sheet(f"{self.base_sheet_name}_1")
+        self.current_row_index = 1
+        self.sheet_count = 1
 
     def initialize_sheet(self, sheet_name):
         """Initialize a new sheet and set headers."""
+        self.apply_column_widths()
         sheet = self.main_workbook.add_sheet(sheet_name, cell_overwrite_ok=True)
+        self.progress.add_sheet()
         for idx, header in enumerate(self.column_headers):
             adjusted_length = get_adjusted_length(header)
             sheet.col(idx).width = 257 * min(adjusted_length + self.extra_space, MAX_CELL_WIDTH)
             sheet.write(0, idx, header, self.header_style)
         return sheet
 
+    def apply_column_widths(self):
+        """Apply the tracked column widths to the current sheet and start tracking afresh."""
+        if self.column_widths is None or self.journal is not None or self.sheet_count is None:
+            return
+        self.column_widths.apply(self.main_workbook.get_sheet(-1))
+        self.column_widths.reset()
+
+    def write_row(self, item: List[str]) -> None:
+        """Write one row to the workbook (or the row journal), starting a new sheet when full."""
+        if self.journal is not None:
+            self.journal.append([item])
+            return
+
+        if self.current_row_index >= self.max_rows_per_sheet:
+            self.initialize_sheet(f"{self.base_sheet_name}_{self.sheet_count + 1}")
+            self.current_row_index = 1
+            self.sheet_count += 1
+
+        current_sheet = self.main_workbook.get_sheet(-1)
+        if self.column_widths is not None:
+            self.column_widths.observe(item)
+
+        for idx, cell_value in enumerate(item):
+            current_sheet.write(self.current_row_index, idx, cell_value, self.data_style)
+
+        self.current_row_index += 1
+
     def save_data_item(self, data_item: Union[List[str], List[List[str]]]) -> None:
         """Save a single data item to the Excel file."""
+        if not data_item:
+            return
 
-        # Ensure data_items is a list of lists
-        if not isinstance(data_item[0], list):
+        # Ensure data_items is a list of rows; tuples (record types included) are rows too
+        if not isinstance(data_item[0], (list, tuple)):
             data_items = [data_item]
         else:
             data_items = data_item
 
+        self.submit(self.save_data_items, data_items)
+
+    def save_data_items(self, data_items: List[List[str]]) -> None:
+        data_items = self.filter_keys(data_items)
         for item in data_items:
+            self.write_row(item)
+        self.item_count += len(data_items)
+        self.progress.add_rows(len(data_items))
+
+    def write_rows(self, rows: Iterable[Sequence[Any]]) -> int:
+        """
+        Write a block of rows and return how many were written.
+
+        rows can be any iterable of tuples or lists (a generator included); it is consumed
+        WRITE_CHUNK_SIZE rows at a time, so the full data set never has to be materialised.
+        Rows are written block-wise with the data style resolved once per block.
+        """
+        written = 0
+        iterator = iter(rows)
+        while True:
+            chunk = list(islice(iterator, WRITE_CHUNK_SIZE))
+            if not chunk:
+                break
+            self.submit(self.write_chunk, chunk)
+            written += len(chunk)
+        return written
 
+    def write_columns(self, columns: Dict[str, Sequence[Any]]) -> int:
+        """Write column arrays keyed by header; headers missing from columns are left empty."""
+        length = max((len(values) for values in columns.values()), default=0)
+        empty = [None] * length
+        return self.write_rows(zip(*(columns.get(header, empty) for header in self.column_headers)))
+
+    def write_chunk(self, chunk: List[Sequence[Any]]) -> None:
+        """Write rows in blocks that fit in the current sheet, rolling over to new sheets."""
+        chunk = self.filter_keys(chunk)
+        if self.journal is not None:
+            self.journal.append(chunk)
+            self.item_count += len(chunk)
+            self.progress.add_rows(len(chunk))
+            return
+        self.write_sheet_rows(chunk)
+        self.progress.add_rows(len(chunk))
+
+    def write_sheet_rows(self, chunk: List[Sequence[Any]]) -> None:
+        start = 0
+        while start < len(chunk):
             if self.current_row_index >= self.max_rows_per_sheet:
                 self.initialize_sheet(f"{self.base_sheet_name}_{self.sheet_count + 1}")
                 self.current_row_index = 1
                 self.sheet_count += 1
+            block = chunk[start:start + self.max_rows_per_sheet - self.current_row_index]
+            if self.column_widths is not None:
+                self.column_widths.observe_rows(block)
+            self.current_row_index += write_block(self.main_workbook.get_sheet(-1), self.current_row_index,
+                                                  block, self.data_style)
+            self.item_count += len(block)
+            start += len(block)
+
+    def filter_keys(self, rows: List[Sequence[Any]]) -> List[Sequence[Any]]:
+        """Return the rows with a new key, recording them (and any updated rows) in the key index."""
+        if self.key_index is None:
+            return rows
+        new_rows, updated = self.key_index.merge(rows, self.key_position, self.on_duplicate == "update")
+        self.updated_count += updated
+        self.skipped_count += len(rows) - len(new_rows) - updated
+        return new_rows
 
-            current_sheet = self.main_workbook.get_sheet(-1)
+    def rebuild_from_index(self):
+        """Rewrite the journal or the workbook from the key index after rows were updated in place."""
+        if self.journal is not None:
+            self.journal.clear()
+            rows = iter(self.key_index)
+            while True:
+                chunk = list(islice(rows, WRITE_CHUNK_SIZE))
+                if not chunk:
+                    break
+                self.journal.append(chunk)
+            self.item_count = len(self.journal)
+            return
+        if self.append:
+            self.main_workbook.clear_segments()
+            self.sheet_count = None
+            self.initialize_sheet(f"{self.base_sheet_name}_1")
+            self.current_row_index = 1
+            self.sheet_count = 1
+        else:
+            self.sheet_count = None
+            self.start_new_workbook()
+        if self.column_widths is not None:
+            self.column_widths.reset()
+        self.item_count = 0
+        rows = iter(self.key_index)
+        while True:
+            chunk = list(islice(rows, WRITE_CHUNK_SIZE))
+            if not chunk:
+                break
+            self.write_sheet_rows(chunk)
 
-            for idx, cell_value in enumerate(item):
-                adjusted_length = get_adjusted_length(str(cell_value))
-                calculated_width = 257 * min(adjusted_length + self.extra_space, MAX_CELL_WIDTH)
-                if current_sheet.col(idx).width < calculated_width:
-                    current_sheet.col(idx).width = min(calculated_width, MAX_CELL_WIDTH * 257)
-                current_sheet.write(self.current_row_index, idx, cell_value, self.data_style)
+    def flush(self):
+        """Persist the append journal without materialising the workbook (append mode only)."""
+        self.join_writer_thread()
+        if self.key_index is not None:
+            self.key_index.commit()
+        if self.journal is not None:
+            self.journal.checkpoint()
+        elif self.append:
+            self.apply_column_widths()
+            self.main_workbook.checkpoint()
 
-            self.current_row_index += 1
-            self.item_count += 1
-            print(f"{'=' * 30} Data item number {self.item_count} saved successfully {'=' * 30}")
+    def materialize(self):
+        """Build the .xls workbook from the row journal."""
+        self.journal.checkpoint()
+        journal, self.journal = self.journal, None
+        self.start_new_workbook()
+        for item in journal:
+            self.write_row(item)
+        self.journal = journal
 
-    def close(self):
-        output_filenames = self.output_filename[:-1] if self.output_filename.endswith(".xlsx") else self.output_filename
-        self.main_workbook.save(output_filenames)
-        if self.output_filename.endswith(".xlsx"):
-            convert_xls_to_xlsx(output_filenames)
-            os.remove(output_filenames)
+    def close(self, materialize: bool = True):
+        """
+        Save the workbook. In append mode, materialize=False only persists the journal so
+        that many short-lived savers can add rows before a final close builds the file.
+        """
+        self.stop_writer_thread()
+        # Rows updated with on_duplicate="update" are only current in the key index
+        rebuild = materialize and self.key_index is not None and self.key_index.dirty
+        if self.key_index is not None:
+            self.key_index.commit()
+        if rebuild:
+            self.rebuild_from_index()
+        if not self.append:
+            self.apply_column_widths()
+            self.main_workbook.save(self.output_filename)
+        elif self.journal is not None:
+            if materialize:
+                self.materialize()
+                self.apply_column_widths()
+                self.main_workbook.save(self.output_filename)
+            self.journal.close()
+        elif materialize:
+            self.apply_column_widths()
+            self.main_workbook.save(self.output_filename)
+        else:
+            self.apply_column_widths()
+            self.main_workbook.checkpoint()
+            self.main_workbook.get_sheet(-1).finish()
+        if self.key_index is not None:
+            if rebuild:
+                self.key_index.clear_dirty()
+            self.key_index.close()
+        if materialize and os.path.exists(self.output_filename):
+            self.progress.add_bytes(os.path.getsize(self.output_filename))
+        self.progress.finish()
+        # The rows written before the failure are saved, but the caller must still learn about it
+        self.check_writer_thread()
 
 # Function usage:
 # if __name__ == '__main__':
@@ -158,8 +476,8 @@ class ExcelSaver:
 #     p_headers = [item for item in p_data_list[0]]
 #     start = time.time()
 #     for item in data_list1:
-#         save_to_excel(item, p_headers, output_filename="sample_itemws12.xls")
-#     convert_xls_to_xlsx("sample_itemws12.xls")
+#         save_to_excel(item, p_headers, output_filename="sample_itemws12.xlsx", append=True, materialize=False)
+#     ExcelSaver(p_headers, output_filename="sample_itemws12.xlsx", append=True).close()
 #     end = time.time()
 #     print(end - start)
 
@@ -1,75 +1,82 @@
 
+import os
 import xlwt
-from typing import List, Optional, Any
+from itertools import islice
+from typing import Dict, Iterable, List, Optional, Any, Sequence
 import json
 from saveexcel import *
-import os
+from saveexcel.progress import WriteProgress
+from saveexcel.widths import ColumnWidthTracker
 
 
-def save_to_excel(data_list: List[List[Any]],
+def save_to_excel(data_list: Iterable[Sequence[Any]],
                   column_headers: List[str],
                   header_style: Optional[xlwt.XFStyle] = DEFAULT_HEADER_STYLE,
                   data_style: Optional[xlwt.XFStyle] = DEFAULT_DATA_STYLE,
                   output_filename: str = DEFAULT_OUTPUT_FILENAME,
-                  max_rows_per_sheet: int = DEFAULT_MAX_ROWS_PER_SHEET,
-                  base_sheet_name: str = DEFAULT_BASE_SHEET_NAME, ) -> None:
+                  max_rows_per_sheet: Optional[int] = DEFAULT_MAX_ROWS_PER_SHEET,
+                  base_sheet_name: str = DEFAULT_BASE_SHEET_NAME,
+                  autosize: bool = True,
+                  sample_every: int = 1,
+                  progress: Optional[WriteProgress] = None) -> None:
     """
     Save data to an Excel file with specified headers and styles.
 
     Args:
-    - data_list: List of data rows to be saved.
+    - data_list: Data rows to be saved, any iterable (a generator is consumed lazily).
     - output_filename: Name of the output Excel file.
     - column_headers: List of column headers.
     - header_style: Style for the headers.
     - data_style: Style for the data cells.
-    - max_rows_per_sheet: Maximum number of rows per sheet.
+    - max_rows_per_sheet: Maximum number of rows per sheet, None for the format's limit.
     - base_sheet_name: Base name for the sheets.
+    - autosize: Widen columns to fit the data; False keeps the header-based widths.
+    - sample_every: Only measure every N-th row when autosizing.
+    - progress: Counts rows, sheets and bytes written and reports them at a bounded rate.
 
     Returns:
     None
     """
 
     # Initialize workbook and settings
-    main_workbook = xlwt.Workbook(encoding="utf-8")
+    main_workbook = new_workbook(output_filename)
+    max_rows_per_sheet = resolve_max_rows(output_filename, max_rows_per_sheet)
     current_sheet = initialize_sheet(main_workbook, f"{base_sheet_name}_{1}", column_headers, header_style)
-    max_column_lengths = [get_adjusted_length(header) for header in column_headers]
+    progress = progress if progress is not None else WriteProgress()
+    progress.add_sheet()
+    column_widths = ColumnWidthTracker(sample_every=sample_every) if autosize else None
 
     sheet_count = 1
     current_row_index = 1
-    count = 0
-    # Write data to the Excel sheets
-    for data_row in data_list:
+    rows = iter(data_list)
+    # Write data to the Excel sheets, one block of rows at a time
+    while True:
 
         if current_row_index == max_rows_per_sheet:
+            if column_widths is not None:
+                column_widths.apply(current_sheet)
+                column_widths.reset()
             sheet_count += 1
             current_sheet = initialize_sheet(main_workbook, f"{base_sheet_name}_{sheet_count}",
                                              column_headers, header_style)
+            progress.add_sheet()
             current_row_index = 1
-            max_column_lengths = [get_adjusted_length(header) for header in column_headers]
-
-        for idx, cell_value in enumerate(data_row):
-            cell = str(cell_value)
-
-            # Adjust column width if current data length is bigger
-            adjusted_length = get_adjusted_length(cell)
-            if adjusted_length > max_column_lengths[idx]:
-                max_column_lengths[idx] = adjusted_length
-                calculated_width = 257 * (max_column_lengths[idx] + EXTRA_SPACE)
-                # Ensure the width does not exceed the maximum allowable width
-                current_sheet.col(idx).width = min(calculated_width, 65535)
-            current_sheet.write(current_row_index, idx, cell_value, data_style)
-        count += 1
-        current_row_index += 1
-        print(f"{'=' * 30} Data item number {count} saved successfully {'=' * 30}")
 
-    # Save the workbook and display a success message
+        block = list(islice(rows, min(WRITE_CHUNK_SIZE, max_rows_per_sheet - current_row_index)))
+        if not block:
+            break
+        # Column widths are only measured here and applied once per sheet
+        if column_widths is not None:
+            column_widths.observe_rows(block)
+        current_row_index += write_block(current_sheet, current_row_index, block, data_style)
+        progress.add_rows(len(block))
 
-    output_filenames = output_filename[:-1] if output_filename.endswith(".xlsx") else output_filename
-    main_workbook.save(output_filenames)
-    if output_filename.endswith(".xlsx"):
-        convert_xls_to_xlsx(output_filenames)
-        os.remove(output_filenames)
-    print(f"{'=' * 30} Total {len(data_list)} records saved successfully {'=' * 30}")
+    # Save the workbook and report the totals
+    if column_widths is not None:
+        column_widths.apply(current_sheet)
+    main_workbook.save(output_filename)
+    progress.add_bytes(os.path.getsize(output_filename))
+    progress.finish()
 
 
 class ExcelWriter:
@@ -77,57 +84,85 @@ class ExcelWriter:
                  column_headers: List[str],
                  header_style: Optional[xlwt.XFStyle] = DEFAULT_HEADER_STYLE,
                  data_style: Optional[xlwt.XFStyle] = DEFAULT_DATA_STYLE,
-                 max_rows_per_sheet: int = DEFAULT_MAX_ROWS_PER_SHEET,
+                 max_rows_per_sheet: Optional[int] = DEFAULT_MAX_ROWS_PER_SHEET,
                  output_filename: str = DEFAULT_OUTPUT_FILENAME,
-                 base_sheet_name: str = DEFAULT_BASE_SHEET_NAME):
+                 base_sheet_name: str = DEFAULT_BASE_SHEET_NAME,
+                 autosize: bool = True,
+                 sample_every: int = 1,
+                 progress: Optional[WriteProgress] = None):
         self.output_filename = output_filename
         self.column_headers = column_headers
         self.header_style = header_style
         self.data_style = data_style
-        self.max_rows_per_sheet = max_rows_per_sheet
+        self.max_rows_per_sheet = resolve_max_rows(output_filename, max_rows_per_sheet)
         self.base_sheet_name = base_sheet_name
-        self.workbook = xlwt.Workbook(encoding="utf-8")
+        self.workbook = new_workbook(output_filename)
         self.current_sheet = None
         self.sheet_count = 1
         self.current_row_index = 1
         self.count = 0
-        self.max_column_lengths = [get_adjusted_length(header) for header in column_headers]
+        self.column_widths = ColumnWidthTracker(sample_every=sample_every) if autosize else None
+        self.progress = progress if progress is not None else WriteProgress()
+
+    def _apply_column_widths(self) -> None:
+        if self.column_widths is not None and self.current_sheet is not None:
+            self.column_widths.apply(self.current_sheet)
+            self.column_widths.reset()
 
     def _initialize_sheet(self) -> None:
+        self._apply_column_widths()
         self.current_sheet = self.workbook.add_sheet(f"{self.base_sheet_name}_{self.sheet_count}",
                                                      cell_overwrite_ok=True)
         for coi_index, header in enumerate(self.column_headers):
             adjusted_header_length = get_adjusted_length(header)
             self.current_sheet.col(coi_index).width = 257 * (adjusted_header_length + EXTRA_SPACE)
             self.current_sheet.write(0, coi_index, header, self.header_style)
-
-    def save_data(self, data_list: List[List[Any]]) -> None:
-        self._initialize_sheet()
-
-        for data_row in data_list:
+        self.progress.add_sheet()
+
+    def write_rows(self, rows: Iterable[Sequence[Any]]) -> int:
+        """
+        Write rows (tuples, lists, a generator...) block by block and return how many were written.
+
+        The iterable is consumed WRITE_CHUNK_SIZE rows at a time and never materialised as a whole.
+        """
+        if self.current_sheet is None:
+            self._initialize_sheet()
+        written = 0
+        rows = iter(rows)
+        while True:
             if self.current_row_index == self.max_rows_per_sheet:
                 self.sheet_count += 1
                 self._initialize_sheet()
                 self.current_row_index = 1
-                self.max_column_lengths = [get_adjusted_length(header) for header in self.column_headers]
-
-            for idx, cell_value in enumerate(data_row):
-                cell = str(cell_value)
-                adjusted_length = get_adjusted_length(cell)
-                if adjusted_length > self.max_column_lengths[idx]:
-                    self.max_column_lengths[idx] = adjusted_length
-                    calculated_width = 257 * (self.max_column_lengths[idx] + EXTRA_SPACE)
-                    self.current_sheet.col(idx).width = min(calculated_width, 65535)
-                self.current_sheet.write(self.current_row_index, idx, cell_value, self.data_style)
-            self.count += 1
-            self.current_row_index += 1
-            print(f"{'=' * 30} Data item number {self.count} written successfully {'=' * 30}")
-        output_filename = self.output_filename[:-1] if self.output_filename.endswith(".xlsx") else self.output_filename
-        self.workbook.save(output_filename)
-        if self.output_filename.endswith(".xlsx"):
-            convert_xls_to_xlsx(output_filename)
-            os.remove(output_filename)
-        print(f"{'=' * 30} Total {len(data_list)} records saved successfully {'=' * 30}")
+
+            block = list(islice(rows, min(WRITE_CHUNK_SIZE, self.max_rows_per_sheet - self.current_row_index)))
+            if not block:
+                break
+            if self.column_widths is not None:
+                self.column_widths.observe_rows(block)
+            self.current_row_index += write_block(self.current_sheet, self.current_row_index, block, self.data_style)
+            self.count += len(block)
+            written += len(block)
+            self.progress.add_rows(len(block))
+        return written
+
+    def write_columns(self, columns: Dict[str, Sequence[Any]]) -> int:
+        """Write column arrays keyed by header; headers missing from columns are left empty."""
+        length = max((len(values) for values in columns.values()), default=0)
+        empty = [None] * length
+        return self.write_rows(zip(*(columns.get(header, empty) for header in self.column_headers)))
+
+    def save(self) -> None:
+        if self.current_sheet is None:
+            self._initialize_sheet()
+        self._apply_column_widths()
+        self.workbook.save(self.output_filename)
+        self.progress.add_bytes(os.path.getsize(self.output_filename))
+        self.progress.finish()
+
+    def save_data(self, data_list: Iterable[Sequence[Any]]) -> None:
+        self.write_rows(data_list)
+        self.save()
 
 
 # Function usage:
@@ -0,0 +1,497 @@
+import csv
+import inspect
+import json
+import os
+import sqlite3
+import warnings
+from abc import ABC, abstractmethod
+from itertools import islice
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Optional, Sequence, Union
+
+from saveexcel import DEFAULT_OUTPUT_FILENAME, DEFAULT_WRITER_QUEUE_SIZE, WRITE_CHUNK_SIZE
+from saveexcel.background import BackgroundWriter
+from saveexcel.keyindex import KeyIndex
+from saveexcel.progress import WriteProgress
+from saveexcel.saveitem import ExcelSaver
+
+__all__ = [
+            "DEFAULT_SINK_BATCH_SIZE",
+            "SINK_BUFFER_SIZE",
+            "KEY_INDEX_SUFFIX",
+            "key_index_path",
+            "RowSink",
+            "CsvSaver",
+            "JsonLinesSaver",
+            "SqliteSaver",
+            "ParquetSaver",
+            "SAVERS_BY_SUFFIX",
+            "open_saver"
+]
+
+DEFAULT_SINK_BATCH_SIZE = 1000
+SINK_BUFFER_SIZE = 1024 * 1024
+KEY_INDEX_SUFFIX = ".keys.sqlite"
+
+
+def key_index_path(output_filename: str) -> str:
+    """Return the sidecar file that holds the key index of an appended sink output."""
+    return f"{output_filename}{KEY_INDEX_SUFFIX}"
+
+
+class RowSink(BackgroundWriter, ABC):
+    """
+    Base class for the non-Excel savers.
+
+    Implements the ExcelSaver contract: save_data_item takes one row or a list of rows,
+    flush pushes them to the output, close flushes and releases the output. Subclasses implement write_batch,
+    read_rows, count_rows and close_output (and flush_output if they buffer); rows and bytes
+    written are counted on progress. With background=True the rows are written by a writer
+    thread behind a queue of queue_size batches, as with ExcelSaver.
+
+    key_column and on_duplicate work as for ExcelSaver: rows whose key was already written
+    are skipped, or with on_duplicate="update" replace the stored row and the output is
+    rewritten from the key index on close. In append mode the index persists in
+    ``<output_filename>.keys.sqlite``; when it does not match the rows of the output (it is
+    new, or a run stopped between writing rows and committing it) it is rebuilt from them.
+
+    Like ExcelSaver's, item_count includes the rows of earlier runs in append mode. They are
+    counted by count_rows the first time item_count is read, not on every open.
+    """
+
+    def __init__(self, column_headers: List[str], output_filename: str = DEFAULT_OUTPUT_FILENAME,
+                 append: bool = False, progress: Optional[WriteProgress] = None,
+                 key_column: Optional[str] = None, on_duplicate: str = "skip",
+                 background: bool = False, queue_size: int = DEFAULT_WRITER_QUEUE_SIZE):
+        if on_duplicate not in ("skip", "update"):
+            raise ValueError(f"on_duplicate must be 'skip' or 'update', got {on_duplicate!r}")
+        if key_column is not None and key_column not in column_headers:
+            raise ValueError(f"Key column {key_column!r} is not one of the column headers")
+        self.column_headers = column_headers
+        self.output_filename = output_filename
+        self.append = append
+        # Rows written by this saver; the rows already in the output are counted on demand
+        self.written_count = 0
+        self.existing_count: Optional[int] = 0
+        self.existing_size = 0
+        self.progress = progress if progress is not None else WriteProgress()
+        self.key_position = column_headers.index(key_column) if key_column is not None else None
+        self.on_duplicate = on_duplicate
+        self.key_index = None
+        self.skipped_count = 0
+        self.updated_count = 0
+        if append and os.path.exists(output_filename):
+            self.existing_count = None
+            self.existing_size = os.path.getsize(output_filename)
+        if self.key_position is not None:
+            self.initialize_key_index()
+        if background:
+            self.start_writer_thread(queue_size)
+
+    @property
+    def item_count(self) -> int:
+        if self.existing_count is None:
+            self.existing_count = self.count_rows()
+        return self.existing_count + self.written_count
+
+    def initialize_key_index(self) -> None:
+        if not self.append:
+            # The output starts empty, the index only has to cover this run
+            self.key_index = KeyIndex()
+            return
+        self.key_index = KeyIndex(key_index_path(self.output_filename))
+        if len(self.key_index) != self.item_count:
+            # The output is authoritative, index what it holds
+            self.key_index.clear()
+            if self.item_count:
+                self.key_index.seed(self.read_rows(), self.key_position)
+        self.key_index.commit()
+
+    def filter_keys(self, rows: List[Sequence[Any]]) -> List[Sequence[Any]]:
+        """Return the rows with a new key, recording them (and any updated rows) in the key index."""
+        if self.key_index is None:
+            return rows
+        new_rows, updated = self.key_index.merge(rows, self.key_position, self.on_duplicate == "update")
+        self.updated_count += updated
+        self.skipped_count += len(rows) - len(new_rows) - updated
+        return new_rows
+
+    def save_data_item(self, data_item: Union[List[Any], List[List[Any]]]) -> None:
+        """Save a single data item (or a list of them)."""
+        if not data_item:
+            return
+        # Ensure data_items is a list of lists
+        if not isinstance(data_item[0], (list, tuple)):
+            data_items = [data_item]
+        else:
+            data_items = data_item
+        self.submit(self.write_chunk, data_items)
+
+    def write_rows(self, rows: Iterable[Sequence[Any]]) -> int:
+        """Write any iterable of rows WRITE_CHUNK_SIZE rows at a time; return how many it held."""
+        taken = 0
+        rows = iter(rows)
+        while True:
+            chunk = list(islice(rows, WRITE_CHUNK_SIZE))
+            if not chunk:
+                break
+            self.submit(self.write_chunk, chunk)
+            taken += len(chunk)
+        return taken
+
+    def write_chunk(self, rows: List[Sequence[Any]]) -> None:
+        """Write the rows with a new key (all of them without a key column) to the output."""
+        rows = self.filter_keys(rows)
+        if not rows:
+            return
+        self.write_batch(rows)
+        self.written_count += len(rows)
+        self.progress.add_rows(len(rows))
+
+    def write_columns(self, columns: Dict[str, Sequence[Any]]) -> int:
+        """Write column arrays keyed by header; headers missing from columns are left empty."""
+        length = max((len(values) for values in columns.values()), default=0)
+        empty = [None] * length
+        return self.write_rows(zip(*(columns.get(header, empty) for header in self.column_headers)))
+
+    @abstractmethod
+    def write_batch(self, rows: List[Sequence[Any]]) -> None:
+        """Write rows that passed the key index to the output."""
+
+    @abstractmethod
+    def read_rows(self) -> Iterator[List[Any]]:
+        """Yield the data rows of the existing output file, in column order."""
+
+    @abstractmethod
+    def count_rows(self) -> int:
+        """Count the data rows the output file held when it was opened, without decoding them."""
+
+    def existing_lines(self, file: BinaryIO) -> Iterator[bytes]:
+        """Yield the lines of file that were there when the output was opened."""
+        remaining = self.existing_size
+        for line in file:
+            remaining -= len(line)
+            if remaining < 0:
+                return
+            yield line
+
+    def output_options(self) -> Dict[str, Any]:
+        """Constructor arguments besides headers and filename, used to rewrite the output."""
+        return {}
+
+    def flush_output(self) -> None:
+        pass
+
+    def flush(self) -> None:
+        """Push the rows written so far to the output file."""
+        self.join_writer_thread()
+        self.flush_output()
+        # Committed after the rows, so the index never holds keys the output lacks
+        if self.key_index is not None:
+            self.key_index.commit()
+
+    @abstractmethod
+    def close_output(self) -> None:
+        """Write what is still buffered and release the output file."""
+
+    def rewrite_output(self, rows: Iterable[Sequence[Any]]) -> None:
+        """Replace the output with rows, written to a temporary file first."""
+        temp_filename = f"{self.output_filename}.tmp"
+        sink = type(self)(self.column_headers, temp_filename, **self.output_options())
+        sink.write_rows(rows)
+        sink.close_output()
+        os.replace(temp_filename, self.output_filename)
+
+    def close(self) -> None:
+        self.stop_writer_thread()
+        self.close_output()
+        if self.key_index is not None:
+            self.key_index.commit()
+            if self.key_index.dirty:
+                # Rows were updated in place, the output still holds their old versions
+                self.rewrite_output(iter(self.key_index))
+                self.key_index.clear_dirty()
+            self.key_index.close()
+        if os.path.exists(self.output_filename):
+            self.progress.add_bytes(os.path.getsize(self.output_filename))
+        self.progress.finish()
+        # The rows written before the failure are saved, but the caller must still learn about it
+        self.check_writer_thread()
+
+
+class CsvSaver(RowSink):
+    """Write rows to a UTF-8 (with BOM, so Excel detects it) CSV file through a large buffer."""
+
+    def __init__(self, column_headers: List[str], output_filename: str = DEFAULT_OUTPUT_FILENAME,
+                 append: bool = False, progress: Optional[WriteProgress] = None,
+                 key_column: Optional[str] = None, on_duplicate: str = "skip",
+                 background: bool = False, queue_size: int = DEFAULT_WRITER_QUEUE_SIZE):
+        super().__init__(column_headers, output_filename, append, progress, key_column, on_duplicate,
+                         background, queue_size)
+        write_header = not (append and os.path.exists(output_filename) and os.path.getsize(output_filename))
+        self.file = open(output_filename, "a" if append else "w", newline="",
+                         encoding="utf-8" if not write_header else "utf-8-sig", buffering=SINK_BUFFER_SIZE)
+        self.writer = csv.writer(self.file)
+        if write_header:
+            self.writer.writerow(column_headers)
+
+    def write_batch(self, rows: List[Sequence[Any]]) -> None:
+        self.writer.writerows(rows)
+
+    def read_rows(self) -> Iterator[List[Any]]:
+        with open(self.output_filename, "r", newline="", encoding="utf-8-sig") as file:
+            reader = csv.reader(file)
+            next(reader, None)
+            yield from reader
+
+    def count_rows(self) -> int:
+        # Rows appended since the file was opened lie past existing_size; the header is not a row
+        with open(self.output_filename, "rb") as file:
+            lines = (line.decode("utf-8") for line in self.existing_lines(file))
+            return max(sum(1 for _ in csv.reader(lines)) - 1, 0)
+
+    def flush_output(self) -> None:
+        self.file.flush()
+
+    def close_output(self) -> None:
+        self.file.close()
+
+
+class JsonLinesSaver(RowSink):
+    """Write one JSON object per row, keyed by the column headers."""
+
+    def __init__(self, column_headers: List[str], output_filename: str = DEFAULT_OUTPUT_FILENAME,
+                 append: bool = False, progress: Optional[WriteProgress] = None,
+                 key_column: Optional[str] = None, on_duplicate: str = "skip",
+                 background: bool = False, queue_size: int = DEFAULT_WRITER_QUEUE_SIZE):
+        super().__init__(column_headers, output_filename, append, progress, key_column, on_duplicate,
+                         background, queue_size)
+        self.file = open(output_filename, "a" if append else "w", encoding="utf-8", buffering=SINK_BUFFER_SIZE)
+
+    def write_batch(self, rows: List[Sequence[Any]]) -> None:
+        headers = self.column_headers
+        self.file.write("".join(json.dumps(dict(zip(headers, row)), ensure_ascii=False, default=str) + "\n"
+                                for row in rows))
+
+    def read_rows(self) -> Iterator[List[Any]]:
+        headers = self.column_headers
+        with open(self.output_filename, "r", encoding="utf-8") as file:
+            for line in file:
+                if line.strip():
+                    item = json.loads(line)
+                    yield [item.get(header) for header in headers]
+
+    def count_rows(self) -> int:
+        with open(self.output_filename, "rb") as file:
+            return sum(1 for line in self.existing_lines(file) if line.strip())
+
+    def flush_output(self) -> None:
+        self.file.flush()
+
+    def close_output(self) -> None:
+        self.file.close()
+
+
+class SqliteSaver(RowSink):
+    """
+    Insert rows into a SQLite table with batched executemany calls.
+
+    Rows are buffered and inserted batch_size at a time, each batch in one transaction.
+    """
+
+    def __init__(self, column_headers: List[str], output_filename: str = DEFAULT_OUTPUT_FILENAME,
+                 append: bool = False, table_name: str = "data", batch_size: int = DEFAULT_SINK_BATCH_SIZE,
+                 progress: Optional[WriteProgress] = None, key_column: Optional[str] = None,
+                 on_duplicate: str = "skip", background: bool = False,
+                 queue_size: int = DEFAULT_WRITER_QUEUE_SIZE):
+        self.table_name = table_name
+        self.batch_size = batch_size
+        self.pending: List[List[Any]] = []
+        self.connection = sqlite3.connect(output_filename, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.table = self.quote(table_name)
+        self.columns = ", ".join(self.quote(header) for header in column_headers)
+        with self.connection:
+            if not append:
+                self.connection.execute(f"DROP TABLE IF EXISTS {self.table}")
+            self.connection.execute(f"CREATE TABLE IF NOT EXISTS {self.table} ({self.columns})")
+        self.insert_sql = (f"INSERT INTO {self.table} ({self.columns}) "
+                           f"VALUES ({', '.join('?' * len(column_headers))})")
+        # The table exists now, so the key index can be checked against it
+        super().__init__(column_headers, output_filename, append, progress, key_column, on_duplicate,
+                         background, queue_size)
+        if self.existing_count is None:
+            # Later COUNT(*)s would include this run's rows, take it while the table holds only earlier ones
+            self.existing_count = self.count_rows()
+
+    @staticmethod
+    def quote(identifier: str) -> str:
+        return '"' + identifier.replace('"', '""') + '"'
+
+    def write_batch(self, rows: List[Sequence[Any]]) -> None:
+        self.pending.extend(rows)
+        if len(self.pending) >= self.batch_size:
+            self.flush_output()
+
+    def prepare_rows(self, rows: Iterable[Sequence[Any]]) -> List[List[Any]]:
+        width = len(self.column_headers)
+        # SQLite only stores str/int/float/bytes/None, anything else is kept as text
+        return [[value if value is None or isinstance(value, (str, int, float, bytes)) else str(value)
+                 for value in row[:width]] + [None] * (width - len(row))
+                for row in rows]
+
+    def read_rows(self) -> Iterator[List[Any]]:
+        yield from (list(row) for row in self.connection.execute(f"SELECT {self.columns} FROM {self.table}"))
+
+    def count_rows(self) -> int:
+        return self.connection.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def flush_output(self) -> None:
+        if not self.pending:
+            return
+        with self.connection:
+            self.connection.executemany(self.insert_sql, self.prepare_rows(self.pending))
+        self.pending = []
+
+    def close_output(self) -> None:
+        self.flush_output()
+        self.connection.close()
+
+    def rewrite_output(self, rows: Iterable[Sequence[Any]]) -> None:
+        """Replace the rows of the table in one transaction; other tables of the database are kept."""
+        connection = sqlite3.connect(self.output_filename)
+        rows = iter(rows)
+        with connection:
+            connection.execute(f"DELETE FROM {self.table}")
+            while True:
+                chunk = list(islice(rows, self.batch_size))
+                if not chunk:
+                    break
+                connection.executemany(self.insert_sql, self.prepare_rows(chunk))
+        connection.close()
+
+
+class ParquetSaver(RowSink):
+    """
+    Write rows to a Parquet file in row groups of batch_size rows (requires pyarrow).
+
+    The schema comes from the headers: every column is a string column unless column_types
+    maps its header to a pyarrow type (e.g. ``{"stars": pyarrow.int64()}``), so a column
+    that starts out empty still gets a usable type. Parquet files cannot be extended in
+    place: with append=True the row groups of an existing file are copied into a new file
+    that replaces it on close.
+    """
+
+    def __init__(self, column_headers: List[str], output_filename: str = DEFAULT_OUTPUT_FILENAME,
+                 append: bool = False, batch_size: int = 100000, progress: Optional[WriteProgress] = None,
+                 key_column: Optional[str] = None, on_duplicate: str = "skip",
+                 background: bool = False, queue_size: int = DEFAULT_WRITER_QUEUE_SIZE,
+                 column_types: Optional[Dict[str, Any]] = None):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError as e:
+            raise ImportError("ParquetSaver requires pyarrow, install it with `pip install pyarrow`") from e
+        self.pa = pyarrow
+        self.pq = pyarrow.parquet
+        self.batch_size = batch_size
+        self.column_types = column_types or {}
+        unknown = set(self.column_types) - set(column_headers)
+        if unknown:
+            raise ValueError(f"column_types names columns that are not headers: {', '.join(sorted(unknown))}")
+        self.schema = pyarrow.schema([(header, self.column_types.get(header, pyarrow.string()))
+                                      for header in column_headers])
+        self.pending: List[List[Any]] = []
+        self.write_filename = output_filename
+        super().__init__(column_headers, output_filename, append, progress, key_column, on_duplicate,
+                         background, queue_size)
+        existing = None
+        if append and os.path.exists(output_filename):
+            existing = self.pq.ParquetFile(output_filename)
+            self.existing_count = existing.metadata.num_rows
+            self.write_filename = f"{output_filename}.tmp"
+        self.writer = self.pq.ParquetWriter(self.write_filename, self.schema)
+        if existing is not None:
+            for batch in existing.iter_batches(batch_size=batch_size, columns=column_headers):
+                # Also converts files written before the schema came from the headers
+                self.writer.write_table(self.pa.Table.from_batches([batch]).cast(self.schema))
+
+    def write_batch(self, rows: List[Sequence[Any]]) -> None:
+        self.pending.extend(rows)
+        if len(self.pending) >= self.batch_size:
+            self.flush_output()
+
+    def read_rows(self) -> Iterator[List[Any]]:
+        for batch in self.pq.ParquetFile(self.output_filename).iter_batches(columns=self.column_headers):
+            columns = batch.to_pydict()
+            yield from (list(row) for row in zip(*(columns[header] for header in self.column_headers)))
+
+    def count_rows(self) -> int:
+        # The file is only replaced on close, its footer still describes the rows of earlier runs
+        return self.pq.ParquetFile(self.output_filename).metadata.num_rows
+
+    def output_options(self) -> Dict[str, Any]:
+        return dict(batch_size=self.batch_size, column_types=self.column_types)
+
+    def column_array(self, values: Sequence[Any], field: Any) -> Any:
+        if self.pa.types.is_string(field.type):
+            # Like SqliteSaver, anything that is not already text is stored as its str()
+            values = [value if value is None or isinstance(value, str) else str(value) for value in values]
+        return self.pa.array(values, type=field.type)
+
+    def flush_output(self) -> None:
+        if not self.pending:
+            return
+        width = len(self.column_headers)
+        rows = [list(row[:width]) + [None] * (width - len(row)) for row in self.pending]
+        columns = zip(*rows)
+        table = self.pa.Table.from_arrays([self.column_array(column, field)
+                                           for column, field in zip(columns, self.schema)], schema=self.schema)
+        self.writer.write_table(table)
+        self.pending = []
+
+    def close_output(self) -> None:
+        self.flush_output()
+        self.writer.close()
+        if self.write_filename != self.output_filename:
+            os.replace(self.write_filename, self.output_filename)
+
+
+SAVERS_BY_SUFFIX = {
+    ".csv": CsvSaver,
+    ".jsonl": JsonLinesSaver,
+    ".ndjson": JsonLinesSaver,
+    ".db": SqliteSaver,
+    ".sqlite": SqliteSaver,
+    ".sqlite3": SqliteSaver,
+    ".parquet": ParquetSaver,
+}
+
+
+def open_saver(column_headers: List[str], output_filename: str = DEFAULT_OUTPUT_FILENAME,
+               append: bool = False, progress: Optional[WriteProgress] = None,
+               key_column: Optional[str] = None, on_duplicate: str = "skip",
+               **excel_options: Any) -> Union[ExcelSaver, RowSink]:
+    """
+    Create the saver matching the output file's extension.
+
+    .xls/.xlsx (and unknown extensions) go to ExcelSaver, which also receives excel_options
+    (max_rows_per_sheet, background, ...). .csv, .jsonl/.ndjson, .db/.sqlite/.sqlite3 and
+    .parquet select the corresponding sink, which gets the excel_options its constructor
+    takes (background and queue_size for all of them, or e.g. column_types for Parquet);
+    the others (sheet layout, styles, widths) do not apply to it and are dropped with a
+    warning. append, progress, key_column and on_duplicate are honoured by whichever saver
+    is chosen.
+    """
+    suffix = os.path.splitext(output_filename)[1].lower()
+    saver_class = SAVERS_BY_SUFFIX.get(suffix)
+    if saver_class is None:
+        return ExcelSaver(column_headers, output_filename=output_filename, append=append, progress=progress,
+                          key_column=key_column, on_duplicate=on_duplicate, **excel_options)
+    accepted = inspect.signature(saver_class).parameters
+    sink_options = {name: excel_options.pop(name) for name in list(excel_options) if name in accepted}
+    if excel_options:
+        warnings.warn(f"{saver_class.__name__} ignores the Excel options {', '.join(sorted(excel_options))}",
+                      stacklevel=2)
+    return saver_class(column_headers, output_filename, append=append, progress=progress,
+                       key_column=key_column, on_duplicate=on_duplicate, **sink_options)
@@ -0,0 +1,503 @@
+import json
+import math
+import os
+import re
+import shutil
+import tempfile
+import zipfile
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape, quoteattr
+
+import xlwt
+
+__all__ = [
+            "XLSX_MAX_ROWS",
+            "XLSX_MAX_COLUMNS",
+            "StreamingWorkbook",
+            "StreamingSheet",
+            "column_letter",
+            "iter_xlsx_rows",
+            "rows_xml"
+]
+
+XLSX_MAX_ROWS = 1048576
+XLSX_MAX_COLUMNS = 16384
+# xlwt's default column width, in 1/256 of a character
+DEFAULT_COLUMN_WIDTH = 0x0B6D
+
+_MAIN_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+_REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+_PKG_REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+_XML_DECLARATION = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+
+# Characters that are not allowed in XML 1.0 documents
+_ILLEGAL_XML_CHARS = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]")
+
+# xlwt.Alignment constants -> OOXML alignment attribute values
+_HORIZONTAL_ALIGNMENTS = {1: "left", 2: "center", 3: "right", 4: "fill",
+                          5: "justify", 6: "centerContinuous", 7: "distributed"}
+_VERTICAL_ALIGNMENTS = {0: "top", 1: "center", 3: "justify", 4: "distributed"}
+
+_column_letters: List[str] = []
+
+
+def column_letter(col_index: int) -> str:
+    """Return the spreadsheet column letter(s) for a 0-based column index."""
+    while len(_column_letters) <= col_index:
+        number = len(_column_letters) + 1
+        letters = ""
+        while number:
+            number, remainder = divmod(number - 1, 26)
+            letters = chr(65 + remainder) + letters
+        _column_letters.append(letters)
+    return _column_letters[col_index]
+
+
+def _column_index(cell_ref: str) -> int:
+    index = 0
+    for char in cell_ref:
+        if not char.isalpha():
+            break
+        index = index * 26 + ord(char.upper()) - 64
+    return index - 1
+
+
+def iter_xlsx_rows(path: str) -> Iterator[Tuple[str, List[Any]]]:
+    """
+    Yield (sheet_name, row_values) for every row of an .xlsx file, sheet by sheet.
+
+    Only values are read (shared and inline strings, numbers and booleans), which is
+    enough to import an existing output file into an append journal.
+    """
+    main = f"{{{_MAIN_NS}}}"
+    with zipfile.ZipFile(path) as archive:
+        shared_strings = []
+        if "xl/sharedStrings.xml" in archive.namelist():
+            with archive.open("xl/sharedStrings.xml") as part:
+                for _, element in ElementTree.iterparse(part):
+                    if element.tag == f"{main}si":
+                        shared_strings.append("".join(t.text or "" for t in element.iter(f"{main}t")))
+                        element.clear()
+        rels = ElementTree.fromstring(archive.read("xl/_rels/workbook.xml.rels"))
+        targets = {rel.get("Id"): rel.get("Target") for rel in rels}
+        workbook = ElementTree.fromstring(archive.read("xl/workbook.xml"))
+        for sheet in workbook.iter(f"{main}sheet"):
+            target = targets[sheet.get(f"{{{_REL_NS}}}id")].lstrip("/")
+            part_name = target if target.startswith("xl/") else f"xl/{target}"
+            with archive.open(part_name) as part:
+                for _, element in ElementTree.iterparse(part):
+                    if element.tag != f"{main}row":
+                        continue
+                    values: List[Any] = []
+                    for cell in element.iter(f"{main}c"):
+                        col_index = _column_index(cell.get("r", "")) if cell.get("r") else len(values)
+                        cell_type = cell.get("t", "n")
+                        raw = cell.findtext(f"{main}v")
+                        if cell_type == "inlineStr":
+                            value = "".join(t.text or "" for t in cell.iter(f"{main}t"))
+                        elif raw is None:
+                            value = None
+                        elif cell_type == "s":
+                            value = shared_strings[int(raw)]
+                        elif cell_type == "b":
+                            value = raw == "1"
+                        elif cell_type == "n":
+                            value = int(raw) if raw.lstrip("-").isdigit() else float(raw)
+                        else:
+                            value = raw
+                        values.extend([None] * (col_index - len(values)))
+                        values.append(value)
+                    element.clear()
+                    yield sheet.get("name"), values
+
+
+def _style_attr(style_index: int) -> str:
+    return f' s="{style_index}"' if style_index else ""
+
+
+def _cell_xml(ref: str, value: Any, style_attr: str) -> str:
+    if isinstance(value, bool):
+        return f'<c r="{ref}"{style_attr} t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, int) or (isinstance(value, float) and math.isfinite(value)):
+        return f'<c r="{ref}"{style_attr}><v>{value!r}</v></c>'
+    text = _ILLEGAL_XML_CHARS.sub("", str(value))
+    space = ' xml:space="preserve"' if text != text.strip() else ""
+    return f'<c r="{ref}"{style_attr} t="inlineStr"><is><t{space}>{escape(text)}</t></is></c>'
+
+
+def rows_xml(first_row_index: int, rows: Iterable[Sequence[Any]], style_index: int = 0) -> Tuple[int, bytes]:
+    """
+    Serialize rows starting at first_row_index into sheetData XML.
+
+    Returns the number of rows and the UTF-8 encoded <row> elements. The result does not
+    depend on any workbook state besides the cellXfs index, so it can be produced in
+    another process and spliced into a sheet.
+    """
+    style_attr = _style_attr(style_index)
+    letters = _column_letters
+    parts = []
+    row_number = first_row_index
+    for row in rows:
+        row_number += 1
+        if len(row) > len(letters):
+            column_letter(len(row) - 1)
+        cells = "".join(_cell_xml(f"{letters[col_index]}{row_number}", value, style_attr)
+                        for col_index, value in enumerate(row) if value is not None)
+        parts.append(f'<row r="{row_number}">{cells}</row>')
+    if row_number > XLSX_MAX_ROWS:
+        raise ValueError(f"Row {row_number - 1} exceeds the .xlsx limit of {XLSX_MAX_ROWS} rows per sheet")
+    return row_number - first_row_index, "".join(parts).encode("utf-8")
+
+
+class _Column:
+    __slots__ = ("width",)
+
+    def __init__(self):
+        self.width = DEFAULT_COLUMN_WIDTH
+
+
+class StreamingSheet:
+    """
+    Write-only worksheet with the subset of the xlwt.Worksheet API used by the savers.
+
+    Rows must be written in ascending order. Cells of the current row are buffered
+    until the next row starts, then serialized straight to the sheet's spool file.
+    The spool is a temporary file, or a persistent segment file when the workbook
+    keeps its sheets in a segment directory.
+    """
+
+    def __init__(self, workbook: "StreamingWorkbook", name: str, index: int,
+                 segment_path: Optional[str] = None, segment_size: int = 0, last_row_index: int = -1):
+        self.workbook = workbook
+        self.name = name
+        self.index = index
+        self.columns: Dict[int, _Column] = {}
+        self.last_row_index = last_row_index
+        self.segment_path = segment_path
+        self.segment_size = segment_size
+        self._pending_row_index = last_row_index
+        self._pending_cells: Dict[int, Tuple[Any, int]] = {}
+        self._spool = None
+
+    def col(self, col_index: int) -> _Column:
+        column = self.columns.get(col_index)
+        if column is None:
+            column = self.columns[col_index] = _Column()
+        return column
+
+    def write(self, row_index: int, col_index: int, label: Any = "", style: Optional[xlwt.XFStyle] = None) -> None:
+        if row_index != self._pending_row_index:
+            if row_index < self._pending_row_index:
+                raise ValueError(f"Rows must be written in ascending order, "
+                                 f"got row {row_index} after row {self._pending_row_index}")
+            if row_index >= XLSX_MAX_ROWS:
+                raise ValueError(f"Row {row_index} exceeds the .xlsx limit of {XLSX_MAX_ROWS} rows per sheet")
+            self.flush_row()
+            self._pending_row_index = row_index
+        if col_index >= XLSX_MAX_COLUMNS:
+            raise ValueError(f"Column {col_index} exceeds the .xlsx limit of {XLSX_MAX_COLUMNS} columns")
+        self._pending_cells[col_index] = (label, self.workbook.style_index(style))
+
+    def _open_spool(self):
+        if self._spool is None:
+            if self.segment_path is None:
+                self._spool = tempfile.TemporaryFile()
+            else:
+                # Drop anything written after the last checkpoint, e.g. by a crashed run
+                self._spool = open(self.segment_path, "r+b" if os.path.exists(self.segment_path) else "w+b")
+                self._spool.truncate(self.segment_size)
+                self._spool.seek(self.segment_size)
+        return self._spool
+
+    def flush_row(self) -> None:
+        """Serialize the buffered row into the sheet spool."""
+        if not self._pending_cells:
+            return
+        row_number = self._pending_row_index + 1
+        cells = "".join(_cell_xml(f"{column_letter(col_index)}{row_number}", value, _style_attr(style_index))
+                        for col_index, (value, style_index) in sorted(self._pending_cells.items())
+                        if value is not None)
+        self._open_spool().write(f'<row r="{row_number}">{cells}</row>'.encode("utf-8"))
+        self.last_row_index = self._pending_row_index
+        self._pending_cells = {}
+
+    def write_rows(self, first_row_index: int, rows: Iterable[Sequence[Any]],
+                   style: Optional[xlwt.XFStyle] = None) -> int:
+        """
+        Serialize a block of rows starting at first_row_index and return how many were written.
+
+        Unlike ``write`` nothing is buffered per cell and the style is resolved once for the block.
+        """
+        self.flush_row()
+        if first_row_index <= self._pending_row_index:
+            raise ValueError(f"Rows must be written in ascending order, "
+                             f"got row {first_row_index} after row {self._pending_row_index}")
+        count, data = rows_xml(first_row_index, rows, self.workbook.style_index(style))
+        if count:
+            self._open_spool().write(data)
+            self.last_row_index = self._pending_row_index = first_row_index + count - 1
+        return count
+
+    def checkpoint(self) -> None:
+        """Flush the spool so that ``segment_size`` covers every row written so far."""
+        self.flush_row()
+        if self._spool is not None:
+            self._spool.flush()
+            self.segment_size = self._spool.tell()
+
+    def finish(self) -> None:
+        """Release the spool of a persistent sheet once no more rows will be added."""
+        if self.segment_path is not None:
+            self.checkpoint()
+            if self._spool is not None:
+                self._spool.close()
+                self._spool = None
+
+    def write_part(self, archive: zipfile.ZipFile) -> None:
+        """Copy the spooled rows into the archive as xl/worksheets/sheetN.xml."""
+        self.checkpoint()
+        spool = self._spool
+        if spool is None and self.segment_path is not None and os.path.exists(self.segment_path):
+            spool = open(self.segment_path, "rb")
+        part_name = f"xl/worksheets/sheet{self.index}.xml"
+        with archive.open(part_name, "w", force_zip64=self.segment_size > 0x7FFFFFFF) as part:
+            part.write(f'{_XML_DECLARATION}<worksheet xmlns="{_MAIN_NS}">'.encode("utf-8"))
+            if self.columns:
+                cols = "".join(f'<col min="{idx + 1}" max="{idx + 1}" width="{column.width / 256:.2f}" customWidth="1"/>'
+                               for idx, column in sorted(self.columns.items()))
+                part.write(f"<cols>{cols}</cols>".encode("utf-8"))
+            part.write(b"<sheetData>")
+            if spool is not None:
+                spool.seek(0)
+                remaining = self.segment_size if self.segment_path is not None else None
+                while remaining is None or remaining > 0:
+                    chunk = spool.read(1024 * 1024 if remaining is None else min(remaining, 1024 * 1024))
+                    if not chunk:
+                        break
+                    part.write(chunk)
+                    if remaining is not None:
+                        remaining -= len(chunk)
+                spool.seek(0, os.SEEK_END)
+            part.write(b"</sheetData></worksheet>")
+        if spool is not None and spool is not self._spool:
+            spool.close()
+        elif self.segment_path is None and self._spool is not None:
+            self._spool.close()
+            self._spool = None
+
+    def to_state(self) -> Dict[str, Any]:
+        return dict(name=self.name, index=self.index, segment_size=self.segment_size,
+                    last_row_index=self.last_row_index,
+                    columns={str(idx): column.width for idx, column in self.columns.items()})
+
+
+class StreamingWorkbook:
+    """
+    Pure-Python .xlsx writer exposing the parts of the xlwt.Workbook API used by the savers.
+
+    By default finished sheets are streamed into a temporary zip next to the output file as
+    soon as the next sheet is added, so at most one sheet of rows is ever spooled. ``save``
+    adds the remaining package parts and moves the archive into place. No intermediate .xls
+    file, Excel installation or COM automation is involved.
+
+    With ``segment_dir`` the serialized rows of every sheet are kept as segment files in that
+    directory instead, together with a state file written by ``checkpoint``. Opening the same
+    directory again resumes after the last checkpointed row, so a later run only serializes
+    its own rows and ``save`` just copies the segments into a fresh package.
+    """
+
+    STATE_FILENAME = "state.json"
+
+    def __init__(self, output_filename: str, segment_dir: Optional[str] = None):
+        self.output_filename = output_filename
+        self.segment_dir = segment_dir
+        self.sheets: List[StreamingSheet] = []
+        self._archive_path = f"{output_filename}.part"
+        self._archive: Optional[zipfile.ZipFile] = None
+        self._fonts: List[Tuple[str, bool, bool, int]] = [("Calibri", False, False, 220)]
+        self._xfs: List[Tuple[int, str, str]] = [(0, "", "")]
+        self._style_cache: Dict[int, Tuple[xlwt.XFStyle, int]] = {}
+        if segment_dir is not None:
+            os.makedirs(segment_dir, exist_ok=True)
+            self._load_state()
+
+    def add_sheet(self, sheet_name: str, cell_overwrite_ok: bool = True) -> StreamingSheet:
+        if self.sheets:
+            self._write_finished_sheet(self.sheets[-1])
+        index = len(self.sheets) + 1
+        segment_path = None if self.segment_dir is None else os.path.join(self.segment_dir, f"sheet{index}.xml.seg")
+        sheet = StreamingSheet(self, sheet_name[:31], index, segment_path)
+        self.sheets.append(sheet)
+        return sheet
+
+    def attach_sheet(self, sheet_name: str, segment_path: str, last_row_index: int) -> StreamingSheet:
+        """
+        Add a sheet whose rows were already serialized (see ``rows_xml``) into segment_path.
+
+        The file is copied into the package as is and must stay in place until ``save``.
+        """
+        if self.sheets:
+            self._write_finished_sheet(self.sheets[-1])
+        sheet = StreamingSheet(self, sheet_name[:31], len(self.sheets) + 1, segment_path,
+                               os.path.getsize(segment_path), last_row_index)
+        self.sheets.append(sheet)
+        return sheet
+
+    def get_sheet(self, sheet_index: int) -> StreamingSheet:
+        return self.sheets[sheet_index]
+
+    def style_index(self, style: Optional[xlwt.XFStyle]) -> int:
+        """Return the cellXfs index for an xlwt style, registering it on first use."""
+        if style is None:
+            return 0
+        cached = self._style_cache.get(id(style))
+        if cached is not None:
+            return cached[1]
+        font = style.font
+        font_key = (font.name, bool(font.bold), bool(font.italic), font.height)
+        if font_key not in self._fonts:
+            self._fonts.append(font_key)
+        alignment = style.alignment
+        xf_key = (self._fonts.index(font_key),
+                  _HORIZONTAL_ALIGNMENTS.get(alignment.horz, ""),
+                  _VERTICAL_ALIGNMENTS.get(alignment.vert, ""))
+        if xf_key not in self._xfs:
+            self._xfs.append(xf_key)
+        index = self._xfs.index(xf_key)
+        # Keep a reference to the style so its id() cannot be reused by another object
+        self._style_cache[id(style)] = (style, index)
+        return index
+
+    def checkpoint(self) -> None:
+        """Persist the segment state so that a later run can resume after the rows written so far."""
+        if self.segment_dir is None:
+            return
+        for sheet in self.sheets:
+            sheet.checkpoint()
+        state = dict(sheets=[sheet.to_state() for sheet in self.sheets],
+                     fonts=self._fonts, xfs=self._xfs)
+        state_path = os.path.join(self.segment_dir, self.STATE_FILENAME)
+        with open(f"{state_path}.tmp", "w", encoding="utf-8") as file:
+            json.dump(state, file, ensure_ascii=False)
+        os.replace(f"{state_path}.tmp", state_path)
+
+    def clear_segments(self) -> None:
+        """Forget every sheet and delete its segment file, e.g. before the rows are rewritten."""
+        for sheet in self.sheets:
+            sheet.finish()
+            if sheet.segment_path is not None and os.path.exists(sheet.segment_path):
+                os.remove(sheet.segment_path)
+        self.sheets = []
+        self.checkpoint()
+
+    def _load_state(self) -> None:
+        state_path = os.path.join(self.segment_dir, self.STATE_FILENAME)
+        if not os.path.exists(state_path):
+            return
+        with open(state_path, "r", encoding="utf-8") as file:
+            state = json.load(file)
+        self._fonts = [tuple(font) for font in state["fonts"]]
+        self._xfs = [tuple(xf) for xf in state["xfs"]]
+        for sheet_state in state["sheets"]:
+            sheet = StreamingSheet(self, sheet_state["name"], sheet_state["index"],
+                                   os.path.join(self.segment_dir, f"sheet{sheet_state['index']}.xml.seg"),
+                                   sheet_state["segment_size"], sheet_state["last_row_index"])
+            for idx, width in sheet_state["columns"].items():
+                sheet.col(int(idx)).width = width
+            self.sheets.append(sheet)
+
+    def _open_archive(self) -> zipfile.ZipFile:
+        if self._archive is None:
+            self._archive = zipfile.ZipFile(self._archive_path, "w", zipfile.ZIP_DEFLATED)
+        return self._archive
+
+    def _write_finished_sheet(self, sheet: StreamingSheet) -> None:
+        if self.segment_dir is None:
+            sheet.write_part(self._open_archive())
+        else:
+            sheet.finish()
+
+    def save(self, filename: Optional[str] = None) -> None:
+        """Finish the package and move it to ``filename`` (defaults to the output filename)."""
+        if not self.sheets:
+            self.add_sheet("Sheet1")
+        self.checkpoint()
+        archive = self._open_archive()
+        if self.segment_dir is None:
+            self.sheets[-1].write_part(archive)
+        else:
+            for sheet in self.sheets:
+                sheet.write_part(archive)
+            self.sheets[-1].finish()
+        archive.writestr("[Content_Types].xml", self._content_types_xml())
+        archive.writestr("_rels/.rels", self._root_rels_xml())
+        archive.writestr("xl/workbook.xml", self._workbook_xml())
+        archive.writestr("xl/_rels/workbook.xml.rels", self._workbook_rels_xml())
+        archive.writestr("xl/styles.xml", self._styles_xml())
+        archive.close()
+        self._archive = None
+        target = filename or self.output_filename
+        if os.path.abspath(target) != os.path.abspath(self._archive_path):
+            shutil.move(self._archive_path, target)
+
+    def _content_types_xml(self) -> str:
+        sheet_overrides = "".join(
+            f'<Override PartName="/xl/worksheets/sheet{sheet.index}.xml" '
+            f'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+            for sheet in self.sheets)
+        return (f'{_XML_DECLARATION}<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+                '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+                '<Default Extension="xml" ContentType="application/xml"/>'
+                '<Override PartName="/xl/workbook.xml" '
+                'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+                '<Override PartName="/xl/styles.xml" '
+                'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+                f'{sheet_overrides}</Types>')
+
+    @staticmethod
+    def _root_rels_xml() -> str:
+        return (f'{_XML_DECLARATION}<Relationships xmlns="{_PKG_REL_NS}">'
+                '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/'
+                'relationships/officeDocument" Target="xl/workbook.xml"/></Relationships>')
+
+    def _workbook_xml(self) -> str:
+        sheets = "".join(f'<sheet name={quoteattr(sheet.name)} sheetId="{sheet.index}" r:id="rId{sheet.index}"/>'
+                         for sheet in self.sheets)
+        return (f'{_XML_DECLARATION}<workbook xmlns="{_MAIN_NS}" xmlns:r="{_REL_NS}">'
+                f'<sheets>{sheets}</sheets></workbook>')
+
+    def _workbook_rels_xml(self) -> str:
+        relationships = "".join(
+            f'<Relationship Id="rId{sheet.index}" Type="{_REL_NS}/worksheet" '
+            f'Target="worksheets/sheet{sheet.index}.xml"/>'
+            for sheet in self.sheets)
+        styles_id = len(self.sheets) + 1
+        return (f'{_XML_DECLARATION}<Relationships xmlns="{_PKG_REL_NS}">{relationships}'
+                f'<Relationship Id="rId{styles_id}" Type="{_REL_NS}/styles" Target="styles.xml"/>'
+                '</Relationships>')
+
+    def _styles_xml(self) -> str:
+        fonts = "".join(f'<font>{"<b/>" if bold else ""}{"<i/>" if italic else ""}'
+                        f'<sz val="{height / 20:g}"/><name val={quoteattr(name)}/></font>'
+                        for name, bold, italic, height in self._fonts)
+        xfs = []
+        for font_id, horizontal, vertical in self._xfs:
+            alignment = ""
+            if horizontal or vertical:
+                attrs = (f' horizontal="{horizontal}"' if horizontal else "") + \
+                        (f' vertical="{vertical}"' if vertical else "")
+                alignment = f"<alignment{attrs}/>"
+            apply_font = ' applyFont="1"' if font_id else ""
+            apply_alignment = ' applyAlignment="1"' if alignment else ""
+            xfs.append(f'<xf numFmtId="0" fontId="{font_id}" fillId="0" borderId="0" xfId="0"'
+                       f'{apply_font}{apply_alignment}>{alignment}</xf>')
+        return (f'{_XML_DECLARATION}<styleSheet xmlns="{_MAIN_NS}">'
+                f'<fonts count="{len(self._fonts)}">{fonts}</fonts>'
+                '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+                '<fill><patternFill patternType="gray125"/></fill></fills>'
+                '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+                '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+                f'<cellXfs count="{len(xfs)}">{"".join(xfs)}</cellXfs>'
+                '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+                '</styleSheet>')
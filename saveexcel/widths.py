@@ -0,0 +1,65 @@
+from typing import Any, List, Sequence
+
+from saveexcel import EXTRA_SPACE, MAX_CELL_WIDTH, get_adjusted_length
+
+__all__ = [
+            "ColumnWidthTracker"
+]
+
+
+class ColumnWidthTracker:
+    """
+    Track the widest cell of every column and apply the widths to a sheet in one go.
+
+    Rows are only measured, the sheet's columns are touched once per sheet by ``apply``.
+    A cell is skipped without measuring it when it cannot beat the current maximum
+    (a character is at most 2 wide) and columns stop being measured once they reach
+    MAX_CELL_WIDTH. With sample_every=N only every N-th row is measured.
+    """
+
+    def __init__(self, extra_space: int = EXTRA_SPACE, sample_every: int = 1):
+        self.extra_space = extra_space
+        self.sample_every = max(1, sample_every)
+        self.limit = MAX_CELL_WIDTH - extra_space
+        self.lengths: List[int] = []
+        self._row_count = 0
+
+    def observe(self, row: Sequence[Any]) -> None:
+        """Record the display width of the cells of one row."""
+        self._row_count += 1
+        if self.sample_every > 1 and (self._row_count - 1) % self.sample_every:
+            return
+        lengths = self.lengths
+        if len(row) > len(lengths):
+            lengths.extend([0] * (len(row) - len(lengths)))
+        limit = self.limit
+        for idx, cell_value in enumerate(row):
+            current = lengths[idx]
+            if current >= limit:
+                continue
+            text = cell_value if isinstance(cell_value, str) else str(cell_value)
+            if 2 * len(text) <= current:
+                continue
+            if len(text) >= limit:
+                lengths[idx] = limit
+                continue
+            adjusted_length = get_adjusted_length(text)
+            if adjusted_length > current:
+                lengths[idx] = adjusted_length
+
+    def observe_rows(self, rows: Sequence[Sequence[Any]]) -> None:
+        for row in rows:
+            self.observe(row)
+
+    def apply(self, sheet: Any) -> None:
+        """Widen the sheet's columns to fit the observed cells; never narrows a column."""
+        for idx, length in enumerate(self.lengths):
+            width = 257 * min(length + self.extra_space, MAX_CELL_WIDTH)
+            column = sheet.col(idx)
+            if column.width < width:
+                column.width = width
+
+    def reset(self) -> None:
+        """Forget the observed widths, e.g. when a new sheet starts."""
+        self.lengths = [0] * len(self.lengths)
+        self._row_count = 0
@@ -1,93 +1,92 @@
+import math
 import traceback
 from requests_html import HTMLSession
-from saveexcel.saveitem import ExcelSaver
+from crawler import DEFAULT_CONCURRENCY
+from crawler.engine import FetchEngine
+from crawler.frontier import UrlFrontier
+from crawler.httpcache import ResponseCache
+from crawler.scheduler import DEFAULT_MAX_CONCURRENCY, HostScheduler
+from crawler.stream import iter_completed
+from crawler.telemetry import Telemetry
+from saveexcel.progress import WriteProgress, print_progress
+from saveexcel.sinks import open_saver
 from concurrent.futures import ThreadPoolExecutor
+from tencentpost.postindex import PostIndex, normalize_update_time
+from tencentpost.records import TencentPost
+
+# Posts per request; larger pages mean fewer round trips for the same number of posts
+DEFAULT_PAGE_SIZE = 200
+# Pages in flight in incremental mode: one is prefetched while the previous one is checked against the watermark
+INCREMENTAL_WINDOW = 2
 
 
 class Spider:
     def __init__(
-        self, base_url, *, headers=None, proxy=None, cookies=None, proxy_url=None
+        self,
+        base_url,
+        *,
+        headers=None,
+        proxy=None,
+        cookies=None,
+        proxy_url=None,
+        output_filename="腾讯岗位数据.xlsx",
+        concurrency=DEFAULT_CONCURRENCY,
+        max_concurrency=DEFAULT_MAX_CONCURRENCY,
+        cache_dir=None,
+        ordered=False,
+        frontier_path=None,
+        telemetry_path=None,
+        page_size=DEFAULT_PAGE_SIZE,
+        post_index_path=None,
     ):
+        if frontier_path and post_index_path:
+            # The frontier would skip pages fetched on earlier days, and with them the posts changed since
+            raise ValueError("frontier_path cannot be combined with post_index_path, the incremental crawl "
+                             "has to fetch its first pages again on every run")
         self.base_url = base_url
-        self.session = HTMLSession()
-        self.headers = headers
-        self.initial_proxy = proxy
-        self.proxy = proxy
-        self.cookies = cookies
-        self.proxy_url = proxy_url
+        # Exported every few seconds when telemetry_path is given (.prom or .json)
+        self.telemetry = Telemetry(telemetry_path)
+        # With a frontier, result pages fetched by any earlier run are skipped
+        self.frontier = UrlFrontier(frontier_path) if frontier_path else None
+        # Starts at concurrency requests in flight and adapts up to max_concurrency
+        self.max_concurrency = max_concurrency
+        # Incremental mode: only new or changed posts are saved. While the pages list the most recently
+        # updated posts first, pagination stops at the first page older than the previous crawl
+        self.post_index = PostIndex(post_index_path) if post_index_path else None
+        # Update time of the last post seen, None once the pages turned out not to be in that order
+        self.last_update_time = "9999-12-31"
+        # Pages are written as they complete; ordered=True keeps them in page order instead
+        self.ordered = ordered or self.post_index is not None
+        self.engine = FetchEngine(
+            headers=headers,
+            cookies=cookies,
+            proxy=proxy,
+            proxy_url=proxy_url,
+            concurrency=max_concurrency,
+            session_class=HTMLSession,
+            scheduler=HostScheduler(concurrency=concurrency, max_concurrency=max_concurrency),
+            # Re-runs read unchanged pages from disk instead of the network
+            cache=ResponseCache(cache_dir) if cache_dir else None,
+            telemetry=self.telemetry,
+        )
+        self.page_size = page_size
+        # Replaced by the page count derived from the post count of the first response
         self.max_page = 20
-        self.excel_headers = [
-            "PostId",
-            "RecruitPostId",
-            "RecruitPostNam",
-            "CountryName",
-            "LocationName",
-            "CategoryName",
-            "Responsibility",
-            "LastUpdateTime",
-            "PostURL",
-            "SourceID",
-            "IsCollect",
-            "IsValid",
-        ]
+        self.post_count = None
+        # Posts are TencentPost tuples and go to the saver as they are, one column per field
+        self.excel_headers = list(TencentPost._fields)
+        # The extension picks the saver: .xlsx/.xls, .csv, .jsonl, .db or .parquet
+        self.output_filename = output_filename
         self.excel_saver = None
 
-    def fetch(self, url, max_outer_retries=10, params=None):
-        """Makes an HTTP request and returns the HTML response."""
-
-        def _make_request(proxies):
-            """Helper function to make a request using provided proxy settings."""
-            try:
-                r = self.session.get(
-                    url,
-                    headers=self.headers,
-                    proxies=proxies,
-                    cookies=self.cookies,
-                    params=params,
-                    timeout=6,
-                )
-                r.raise_for_status()
-                return r
-            except Exception as e:
-                print(
-                    f"Error fetching {url} with params:{params} using {self.proxy}. Error: {e}"
-                )
-                traceback.print_exc()
-                return None
-
-        outer_retry_count = 0
-
-        while outer_retry_count <= max_outer_retries:
-            # Try fetching with the current proxy
-            response = _make_request(self.proxy)
-            if response:
-                return response
-
-            # If failed, try updating the proxy and fetching the response 5 times
-            for _ in range(1):
-                print(f"Error fetching {url} with params:{params} using {self.proxy}.")
-                if self.proxy_url:
-                    self._update_proxy()
-                response = _make_request(self.proxy)
-                if response:
-                    return response
-
-            # If all 5 tries failed, revert to the initial proxy
-            self.proxy = self.initial_proxy
-            print("Reverting to initial proxy")
-            outer_retry_count += 1
-
-        raise Exception(
-            f"Reached maximum retry attempts for URL: {url} with params:{params}."
-        )
-
     def parse_first(self, response):
-        max_page = int(
-            response.html.xpath(
-                "//div[@class='application-main']//a[@href='#100']/text()"
-            )[0]
-        )
-        self.max_page = max_page
+        try:
+            self.post_count = int(response.json()["Data"]["Count"])
+        except (KeyError, TypeError, ValueError) as e:
+            print(f"No post count in the first page, crawling {self.max_page} pages. Error: {e!r}")
+        else:
+            self.max_page = math.ceil(self.post_count / self.page_size)
+            print(f"共{self.post_count}个岗位，{self.max_page}页")
         data = self.parse(response)
         return data
 
@@ -99,74 +98,101 @@ class Spider:
             if not posts:
                 return None  # 返回None作为特殊标记
             for job in posts:
-                post = dict(
-                    PostId=job["PostId"],
-                    RecruitPostId=job["RecruitPostId"],
-                    RecruitPostNam=job["RecruitPostName"],
-                    CountryName=job["CountryName"],
-                    LocationName=job["LocationName"],
-                    CategoryName=job["CategoryName"],
-                    Responsibility=job["Responsibility"],
-                    LastUpdateTime=job["LastUpdateTime"],
-                    PostURL=job["PostURL"],
-                    SourceID=job["SourceID"],
-                    IsCollect=job["IsCollect"],
-                    IsValid=job["IsValid"],
-                )
-                yield post
+                yield TencentPost.from_job(job)
         except TypeError:
             print("=" * 30 + "解析错误" + "=" * 30)
 
-    def _update_proxy(self):
-        count = 0
-        while count <= 2:
-            try:
-                response = self.session.get(self.proxy_url).json()
-                print(response)
-                ip = response["RESULT"][0]["ip"]
-                port = response["RESULT"][0]["port"]
-            except Exception as e:
-                print(f"Error fetching proxy. Error: {e}")
-                print("." * 30 + "Attempting to update proxy" + "." * 30)
-                traceback.print_exc()
-                count += 1
-            else:
-                self.proxy = dict(
-                    http=f"http://{ip}:{port}", https=f"http://{ip}:{port}"
-                )
-                print("=" * 30 + "Proxy updated" + "=" * 30)
-                break
+    def query(self, page):
+        return dict(pageSize=self.page_size, pageIndex=page)
 
     def task(self, query):
-        response = self.fetch(self.base_url, params=query)
+        if self.frontier is not None and not self.frontier.claim(self.base_url, query):
+            return None
+        response = self.engine.fetch(self.base_url, params=query)
         data = self.parse(response)
         return data
 
+    def save(self, query, datas):
+        """Save the new or changed posts of a page and return all of its posts."""
+        # parse is a generator, the posts are decoded here
+        with self.telemetry.timer("parse"):
+            posts = list(datas)
+        if self.post_index is None:
+            rows = posts
+        else:
+            rows = [post for post in posts if self.post_index.changed(post.PostId, post.LastUpdateTime)]
+            self.telemetry.inc("rows_unchanged_total", len(posts) - len(rows))
+        if rows:
+            # One batch per page, serialized by the saver's writer thread
+            with self.telemetry.timer("save"):
+                self.excel_saver.save_data_item(rows)
+            self.telemetry.inc("rows_written_total", len(rows))
+        if posts and self.frontier is not None:
+            self.frontier.done(self.base_url, query)
+        return posts
+
+    def is_stale(self, posts):
+        """
+        True in incremental mode once a page holds only posts older than the watermark.
+
+        Pages must be checked in order. If a page is not sorted by LastUpdateTime, newest
+        first, the watermark proves nothing and the crawl continues to the last page.
+        """
+        if self.post_index is None or self.last_update_time is None:
+            return False
+        times = [normalize_update_time(post.LastUpdateTime) for post in posts]
+        if any(earlier < later for earlier, later in zip([self.last_update_time] + times, times)):
+            print("岗位没有按更新时间排序，增量模式改为下载全部页面")
+            self.last_update_time = None
+            return False
+        if times:
+            self.last_update_time = times[-1]
+        return self.post_index.is_stale(posts)
+
     def run(self):
-        file_name = "腾讯岗位数据.xlsx"
-        self.excel_saver = ExcelSaver(
-            column_headers=self.excel_headers,
-            output_filename=file_name,
+        self.excel_saver = open_saver(
+            self.excel_headers,
+            self.output_filename,
             max_rows_per_sheet=5000,
+            background=True,
+            progress=WriteProgress(print_progress),
+            # Re-runs only add new posts and refresh changed ones instead of duplicating them
+            append=True,
+            key_column="PostId",
+            on_duplicate="update",
         )
-        futures = []
+        completed = False
         try:
-            with ThreadPoolExecutor(max_workers=10) as executor:
-                for page in range(1, self.max_page + 1):
-                    query = dict(pageSize=200, pageIndex=page)
-                    future = executor.submit(self.task, query)
-                    futures.append(future)
-                for future in futures:
-                    datas = future.result()
-                    if datas:
-                        for data in datas:
-                            data = list(data.values())
-                            self.excel_saver.save_data_item(data)
+            # The first page is always fetched, its post count decides how many pages follow
+            first_query = self.query(1)
+            posts = self.save(first_query, self.parse_first(self.engine.fetch(self.base_url, params=first_query)))
+            if not self.is_stale(posts):
+                with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+                    queries = (self.query(page) for page in range(2, self.max_page + 1))
+                    # Only a bounded window of pages is in flight or waiting to be written. An incremental
+                    # crawl usually stops after a few pages, so it does not request the ones behind them yet
+                    window = INCREMENTAL_WINDOW if self.post_index is not None else 2 * self.max_concurrency
+                    results = iter_completed(executor, self.task, queries, window, self.ordered)
+                    for query, datas in results:
+                        if datas and self.is_stale(self.save(query, datas)):
+                            print(f"第{query['pageIndex']}页没有新的岗位，停止翻页")
+                            # Cancels the pages queued behind it instead of waiting for them
+                            results.close()
+                            break
+            completed = True
         except Exception as e:
             print(e)
             traceback.print_exc()
         finally:
             self.excel_saver.close()
+            self.engine.close()
+            if self.frontier is not None:
+                self.frontier.close()
+            self.telemetry.close()
+            if self.post_index is not None:
+                # Only a complete crawl moves the watermark and keeps the recorded posts
+                self.post_index.close(commit=completed)
+                print(f"新增或更新{self.post_index.changed_count}个岗位，{self.post_index.unchanged_count}个未变化")
 
 
 if __name__ == "__main__":
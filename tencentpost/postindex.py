@@ -0,0 +1,76 @@
+import re
+import sqlite3
+from typing import Any, Iterable, Optional
+
+__all__ = [
+            "POST_INDEX_SUFFIX",
+            "post_index_path",
+            "normalize_update_time",
+            "PostIndex"
+]
+
+POST_INDEX_SUFFIX = ".posts.sqlite"
+
+
+def post_index_path(output_filename: str) -> str:
+    """Return the sidecar file that holds the post index of an output file."""
+    return f"{output_filename}{POST_INDEX_SUFFIX}"
+
+
+def normalize_update_time(value: Any) -> str:
+    """Turn a LastUpdateTime such as 2023年10月8日 into 2023-10-08, which sorts as text."""
+    parts = re.findall(r"\d+", str(value))
+    if len(parts) < 3:
+        return str(value)
+    return "{:0>4}-{:0>2}-{:0>2}".format(*parts[:3])
+
+
+class PostIndex:
+    """
+    PostId -> LastUpdateTime of every post saved so far, plus the crawl watermark.
+
+    ``changed`` tells whether a post is new or was updated since it was saved and records
+    its time. The watermark is the latest update time of the last complete crawl: once a
+    page holds only posts older than it (``is_stale``), the pages after it hold nothing
+    new. Records are kept in one transaction that ``close(commit=True)`` commits after a
+    successful crawl; an interrupted crawl leaves the index as it was, so its posts are
+    emitted again by the next run.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS posts (post_id TEXT PRIMARY KEY, last_update TEXT)")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value)")
+        self.connection.commit()
+        row = self.connection.execute("SELECT value FROM meta WHERE name = 'watermark'").fetchone()
+        self.watermark: Optional[str] = row[0] if row else None
+        self.latest = self.watermark
+        self.changed_count = 0
+        self.unchanged_count = 0
+
+    def changed(self, post_id: Any, last_update: Any) -> bool:
+        post_id, last_update = str(post_id), normalize_update_time(last_update)
+        if self.latest is None or last_update > self.latest:
+            self.latest = last_update
+        row = self.connection.execute("SELECT last_update FROM posts WHERE post_id = ?", (post_id,)).fetchone()
+        if row is not None and row[0] == last_update:
+            self.unchanged_count += 1
+            return False
+        self.connection.execute("INSERT OR REPLACE INTO posts VALUES (?, ?)", (post_id, last_update))
+        self.changed_count += 1
+        return True
+
+    def is_stale(self, posts: Iterable[Any]) -> bool:
+        """True if there is a watermark and every post of a page (TencentPost records) is older than it."""
+        if self.watermark is None:
+            return False
+        times = [normalize_update_time(post.LastUpdateTime) for post in posts]
+        return bool(times) and max(times) < self.watermark
+
+    def close(self, commit: bool = False) -> None:
+        if commit:
+            if self.latest is not None:
+                self.connection.execute("INSERT OR REPLACE INTO meta VALUES ('watermark', ?)", (self.latest,))
+            self.connection.commit()
+        self.connection.close()
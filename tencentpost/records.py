@@ -0,0 +1,27 @@
+from typing import Any, Dict, NamedTuple
+
+__all__ = [
+            "TencentPost"
+]
+
+
+class TencentPost(NamedTuple):
+    """One job posting of the careers API; the fields are the output columns, in order."""
+    PostId: str
+    RecruitPostId: int
+    RecruitPostNam: str
+    CountryName: str
+    LocationName: str
+    CategoryName: str
+    Responsibility: str
+    LastUpdateTime: str
+    PostURL: str
+    SourceID: int
+    IsCollect: bool
+    IsValid: bool
+
+    @classmethod
+    def from_job(cls, job: Dict[str, Any]) -> "TencentPost":
+        return cls(job["PostId"], job["RecruitPostId"], job["RecruitPostName"], job["CountryName"],
+                   job["LocationName"], job["CategoryName"], job["Responsibility"], job["LastUpdateTime"],
+                   job["PostURL"], job["SourceID"], job["IsCollect"], job["IsValid"])